@@ -1,70 +1,72 @@
 
 from botlib.build_queue import BuildQueue
-import random
+import argparse
+import logging
+import os
 
 import sc2
 from sc2 import run_game, maps, Race, Difficulty
 from sc2 import position
 from sc2.ids.ability_id import AbilityId
-from sc2.ids.unit_typeid import UnitTypeId
 from sc2.player import Bot, Computer
-from sc2.constants import COMMANDCENTER, BARRACKS, MARINE, SCV, \
-    REFINERY, FACTORY, HELLION, REAPER, ORBITALCOMMAND, STARPORT, MEDIVAC, SUPPLYDEPOT
-
+from sc2.unit import Unit
+from sc2.constants import BARRACKS, MARINE, REFINERY, FACTORY, HELLION, REAPER, STARPORT, MEDIVAC
+
+from botlib.engagement import EngagementEstimator, ENGAGE, HOLD, RETREAT
+from botlib.enemy_memory import positions_of
+from botlib.heal_scheduler import HealScheduler
+from botlib.step_scheduler import ALWAYS, BUILD, PRODUCTION, ECONOMY, SCOUTING
+from botlib.targeting import FocusFire
+from botlib.telemetry import ARMY, REPAIR
 from botlib.terran_bot import TerranBot
+from botlib.unit_events import DESTROYED
+from botlib.unit_snapshot import COMMAND_CENTERS, SUPPLY_DEPOTS
+
+BUILD_ORDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build_orders", "alpha_bot.txt")
+DEFENDED_RADIUS = 25  # cells around the rally point the army stays within while it holds
 
 
 class AlphaBot(TerranBot):
-    def __init__(self):
+    profiled_routines = TerranBot.profiled_routines + [
+        "resume_buildings", "call_down_mules",
+        "train_workers", "train_reaper", "train_marines", "train_hellions", "train_medivacs",
+        "move_reaper", "army_attack",
+    ]
+
+    def __init__(self, build_order: str = BUILD_ORDER):
         self.scout_target = None
+        self.scouted = []  # expansions the reaper went to, oldest first
         super().__init__()
+        self.focus_fire = FocusFire()
+        self.engagement = EngagementEstimator(self)
+        self.stance = HOLD
+        self.heal_scheduler = HealScheduler(self)
+        self.heal_scheduler.subscribe(self.unit_events)
 
         # Configure the Build Queue
-        self.build_queue = BuildQueue()
-
-        # https://lotv.spawningtool.com/build/111889/
-        self.build_queue.add_step(COMMANDCENTER, 1)
-        self.build_queue.add_step(BARRACKS, 1)
-        self.build_queue.add_step(REFINERY, 1)
-        self.build_queue.add_step(ORBITALCOMMAND, 1)
-        self.build_queue.add_step(COMMANDCENTER, 1)
-        self.build_queue.add_step(FACTORY, 1)
-        self.build_queue.add_step(REFINERY, 1)
-        self.build_queue.add_step(STARPORT, 1)
-        self.build_queue.add_step(ORBITALCOMMAND, 1)
-
-        # legacy win code
-        self.build_queue.add_step(FACTORY, 1)
-        self.build_queue.add_step(BARRACKS, 2)
-        self.build_queue.add_step(REFINERY, 2)
-        self.build_queue.add_step(FACTORY, 1)
-        self.build_queue.add_step(BARRACKS, 2)
+        self.build_queue = BuildQueue.load(build_order)
+        self.build_queue.subscribe(self.unit_events)
+
+        # Micro is never starved, economy and scouting can wait a few steps
+        self.scheduler.add("build_queue", lambda iteration: self.build_queue.on_step(self.building_constructor),
+                           ALWAYS)
+        self.schedule("army_attack", ALWAYS)
+        self.schedule_service("heal_scheduler", self.heal_scheduler, ALWAYS)
+        self.schedule("resume_buildings", BUILD, every=4, on=[DESTROYED])
+        for routine in ("train_workers", "train_reaper", "train_marines", "train_hellions", "train_medivacs"):
+            self.schedule(routine, PRODUCTION)
+        self.schedule("call_down_mules", ECONOMY, every=4)
+        self.schedule("move_reaper", SCOUTING, every=4)
 
     async def on_step(self, iteration):
-        # Configure all background services
-        await self.build_queue.on_step(self.units, self.building_constructor)
-
-        # Allow background services to do their thing
+        # Allow background services to do their thing, everything they queued is sent at the end
         await super().on_step(iteration)
+        self.collect_garbage()
 
-        await self.resume_buildings()
-        if self.units.of_type([COMMANDCENTER, ORBITALCOMMAND]):
-            await self.distribute_workers()  # in sc2/bot_ai.py
-            await self.call_down_mules()
-
-        # Plan out Operations
-        await self.train_workers()
-        await self.train_reaper()
-        await self.train_marines()
-        await self.train_hellions()
-        await self.train_medivacs()
-        # await self.repair_command_center()
-
-        await self.move_reaper()
-        await self.marines_attack()
-        await self.heal_marines()
-        if self.units(MARINE).amount >= 20:
-            await self.hellions_attack()
+    def enable_profiling(self, *args, **kwargs):
+        super().enable_profiling(*args, **kwargs)
+        self.profiler.instrument(self.build_queue, "on_step", "build_queue")
+        self.profiler.instrument(self.heal_scheduler, "on_step", "heal_scheduler")
 
     @property
     def command_center_target(self) -> int:
@@ -72,138 +74,204 @@ class AlphaBot(TerranBot):
 
     @property
     def orbital_command_target(self) -> int:
-        if self.units(FACTORY).ready:
+        if self.snapshot.ready(FACTORY):
             return 2
-        elif self.units(BARRACKS).ready:
+        elif self.snapshot.ready(BARRACKS):
             return 1
         return 0
 
     @property
     def barracks_target(self) -> int:
-        if not self.units.of_type([UnitTypeId.SUPPLYDEPOT, UnitTypeId.SUPPLYDEPOTLOWERED, UnitTypeId.SUPPLYDEPOTDROP]).ready:
+        if not self.snapshot.ready(SUPPLY_DEPOTS):
             return 0
-        elif self.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).amount == 1:
+        elif self.snapshot.amount(COMMAND_CENTERS) == 1:
             return 1
         return 5
 
     @property
     def refinery_target(self) -> int:
-        if not self.units(BARRACKS):
+        if not self.snapshot.amount(BARRACKS):
             return 0
-        elif not self.units(FACTORY) and self.already_pending(FACTORY) == 0:
+        elif not self.snapshot.amount(FACTORY) and self.snapshot.pending(FACTORY) == 0:
             return 1
 
-        target = 0
-        for cc in self.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).ready:
-            target += self.state.vespene_geyser.closer_than(25.0, cc).amount
-        return target
+        return self.resource_index.ready_geysers
 
     @property
     def factory_target(self) -> int:
-        if not self.units(BARRACKS).ready:
+        if not self.snapshot.ready(BARRACKS):
             return 0
 
-        return self.units(REFINERY).amount
+        return self.snapshot.amount(REFINERY)
 
     async def train_reaper(self):
-        if self.units(REAPER).amount + self.already_pending(REAPER) == 0:
-            idle_barracks = self.units(BARRACKS).ready.idle
+        if self.snapshot.amount(REAPER) + self.snapshot.pending(REAPER) == 0:
+            idle_barracks = self.snapshot.idle(BARRACKS)
             if idle_barracks and self.can_afford(REAPER):
                 barracks = idle_barracks.first
                 await self.do(barracks.train(REAPER))
 
     async def train_marines(self):
-        for barracks in self.units(BARRACKS).ready.idle:
+        for barracks in self.snapshot.idle(BARRACKS):
             if self.can_afford(MARINE):
                 await self.do(barracks.train(MARINE))
 
     async def train_hellions(self):
-        for factory in self.units(FACTORY).ready.idle:
+        for factory in self.snapshot.idle(FACTORY):
             if self.can_afford(HELLION):
                 await self.do(factory.train(HELLION))
 
     async def train_medivacs(self):
-        if self.units(MEDIVAC).amount + self.already_pending(MEDIVAC) < 5:
-            idle_starport = self.units(STARPORT).ready.idle
+        if self.snapshot.amount(MEDIVAC) + self.snapshot.pending(MEDIVAC) < 5:
+            idle_starport = self.snapshot.idle(STARPORT)
             if idle_starport and self.can_afford(MEDIVAC):
                 starport = idle_starport.first
                 await self.do(starport.train(MEDIVAC))
 
     async def move_reaper(self):
-        if self.units(REAPER):
-            reaper = self.units(REAPER).first
+        if self.snapshot.amount(REAPER):
+            reaper = self.snapshot.of_type(REAPER).first
             if self.scout_target is None or reaper.distance_to(p=self.scout_target) < 5:
-                self.scout_target = random.choice(
-                    list(self.expansion_locations))
-            await self.do(reaper.move(self.scout_target))
+                self.scout_target = self.next_scout_target(reaper)
+                await self.do(reaper.move(self.scout_target))
+            elif reaper.is_idle:
+                await self.do(reaper.move(self.scout_target))
         else:
             self.scout_target = None
 
-    # Attack with all Marines
-    async def marines_attack(self):
-        if self.known_enemy_structures:
-            target = self.known_enemy_structures.first
-        else:
-            target = self.enemy_start_locations[0]
-
-        for marine in self.units(MARINE).idle:
-            attackable_units = self.known_enemy_units.not_structure.visible.in_attack_range_of(
-                unit=marine, bonus_distance=20)
-            if attackable_units:
-                await self.do(marine.attack(attackable_units.sorted(lambda unit: unit.health).first))
-            elif self.units(MARINE).amount >= 20:
-                await self.do(marine.attack(target))
-
-    # Attack with all Hellions
-    async def hellions_attack(self):
-        if self.known_enemy_units.visible:
-            target = self.known_enemy_units.visible.first
-        else:
-            target = self.enemy_start_locations[0]
+    def next_scout_target(self, reaper) -> position.Point2:
+        """ The closest expansion by ground the reaper has not been to, starting over once it has seen them all """
+        if self.scout_target is not None:
+            self.scouted.append(self.scout_target)
+        unscouted = [location for location in self.expansion_locations if location not in self.scouted]
+        if not unscouted:
+            unscouted = [location for location in self.expansion_locations if location != self.scout_target]
+            self.scouted = []
+        # Walking distances from the reaper are the ones to where it stands, which is last target's field
+        here = self.scout_target or reaper.position
+        return min(unscouted, key=lambda location: self.pathing.distance(here, location))
+
+    # Focus fire with the whole army, moving out only when the fight looks winnable
+    async def army_attack(self):
+        army = self.snapshot.of_type([MARINE, HELLION])
+        # With no enemy army in sight the marines wait for numbers before moving out
+        unopposed = ENGAGE if self.snapshot.amount(MARINE) >= 20 else HOLD
+        stance = self.engagement.decide(army, self.snapshot.of_type(MEDIVAC), unopposed)
+        switched = stance != self.stance
+        if switched:
+            self.telemetry.record(logging.INFO, ARMY, stance, detail=len(army))
+            self.stance = stance
+
+        idle = self.snapshot.idle([MARINE, HELLION])
+        if stance == RETREAT:
+            await self.pull_back(army, 5)
+            # Whoever made it back still defends the rally point
+            idle = idle.closer_than(5, self.rally_point)
+        elif stance == HOLD and switched:
+            # Units sent out while engaging stop looking for a fight, whoever is close enough stays to defend
+            await self.pull_back(army, DEFENDED_RADIUS)
+
+        orders, unassigned = self.focus_fire.plan(idle, self.enemy_index.units, bonus_distance=20, busy=army)
+        for target, units in orders:
+            for unit in units:
+                await self.do(unit.attack(target))
+
+        if stance == ENGAGE:
+            hellions = [unit for unit in unassigned if unit.type_id == HELLION]
+            await self.advance(hellions, self.hellion_target)
+            await self.advance([unit for unit in unassigned if unit.type_id != HELLION], self.marine_target)
+
+    async def pull_back(self, army, radius: float):
+        """ Moves the units further than radius from the rally point back to it """
+        rally = self.rally_point
+        for unit in army:
+            if unit.distance_to(rally) > radius:
+                await self.do(unit.move(rally))
+
+    async def advance(self, units, target):
+        """ Attack-moves the units to the target along the ground, a few cells of the path at a time """
+        if not units:
+            return
+        if isinstance(target, Unit) and not target.is_structure:
+            # The fields are for places, not for chasing what moves
+            for unit in units:
+                await self.do(unit.attack(target))
+            return
 
-        for hellion in self.units(HELLION).idle:
-            await self.do(hellion.attack(target))
+        goal = target.position if isinstance(target, Unit) else target
+        for unit, waypoint in zip(units, self.pathing.waypoints(goal, positions_of(units))):
+            await self.do(unit.attack(target if waypoint is goal else waypoint))
 
-    async def heal_marines(self):
-        injured_marines = self.units(MARINE).filter(
-            lambda x: x.health < x.health_max and not self.units(MEDIVAC).filter(lambda m: m.order_target == x.tag))
-        if not injured_marines:
-            return
+    @property
+    def marine_target(self):
+        return self.enemy_memory.closest_structure(self.start_location) or self.enemy_start_locations[0]
 
-        for medivac in self.units(MEDIVAC).idle.filter(lambda x: not x.order_target):
-            if medivac.energy > 5 and injured_marines:
-                closest_marine = injured_marines.closest_to(medivac.position)
-                await self.do(medivac(AbilityId.MEDIVACHEAL_HEAL, closest_marine))
+    @property
+    def rally_point(self):
+        return self.main_base_ramp.top_center
+
+    @property
+    def hellion_target(self):
+        if self.enemy_index.units:
+            return self.enemy_index.units.first
+        return self.marine_target
 
     async def resume_buildings(self):
-        ''' Resume all incomplete buildings '''
-
-        # of_type([COMMANDCENTER, ORBITALCOMMAND, SUPPLYDEPOT]).
-        # TODO: Handle Refineries
-        incomplete_structures = self.units.structure.not_ready.filter(
-            lambda x: x.health < x.health_max and not x.type_id == REFINERY and not self.units(SCV).filter(lambda s: s.is_constructing_scv and s.order_target == x.position or s.order_target == x.tag))
-
-        for structure in incomplete_structures:
-            idle_scvs = self.units(SCV).idle
-            if idle_scvs:
-                print("Fix with idle", structure)
-                await self.repair_with_scv(idle_scvs, structure)
-                return
-
-            non_vespene_scvs = self.units(SCV).filter(
-                lambda x: not x.is_carrying_vespene and not x.is_carrying_minerals)
-            if non_vespene_scvs:
-                print("Fix with worker", structure)
-                await self.repair_with_scv(non_vespene_scvs, structure)
-                return
+        ''' Resume all incomplete buildings, refineries included '''
+        for structure, scv in self.construction_tracker.replacement_builders():
+            self.telemetry.record(logging.INFO, REPAIR, "resume_building", structure.type_id, detail=scv.tag)
+            await self.repair_with_scv(scv, structure)
 
     # Uses the "SMART" ability to resume construction
-    async def repair_with_scv(self, scvs, structure):
-        scv = scvs.closest_to(structure.position)
+    async def repair_with_scv(self, scv, structure):
         await self.do(scv(AbilityId.SMART, structure))
-
-
-run_game(maps.get("Simple64"), [
-    Bot(Race.Terran, AlphaBot()),
-    Computer(Race.Protoss, Difficulty.Easy)
-], realtime=False)
+        self.construction_tracker.assign(structure, scv)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play AlphaBot against the built-in AI")
+    parser.add_argument("--map", default="Simple64")
+    parser.add_argument("--race", default="Protoss", choices=[race.name for race in Race if race != Race.NoRace])
+    parser.add_argument("--difficulty", default="Easy", choices=[difficulty.name for difficulty in Difficulty])
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument("--build-order", metavar="FILE", default=BUILD_ORDER,
+                        help="one \"UNIT_TYPE increment\" step per line, see build_orders/alpha_bot.txt")
+    parser.add_argument("--profile", metavar="REPORT", default=os.environ.get("ALPHA_BOT_PROFILE"),
+                        help="time every step and routine, writing REPORT.json and REPORT.csv when the game ends")
+    parser.add_argument("--profile-allocations", action="store_true",
+                        help="with --profile, also report the memory each step and routine allocates")
+    parser.add_argument("--gc-tuning", action="store_true",
+                        help="freeze startup objects and collect garbage in the steps' spare time")
+    parser.add_argument("--record", metavar="DIR", help="save every observation to DIR for offline replays")
+    parser.add_argument("--step-budget", metavar="MS", type=float, default=44.6,
+                        help="wall clock time a step may take before low priority work is put off")
+    parser.add_argument("--compute-workers", metavar="N", type=int, default=0,
+                        help="work out pathing fields on N background threads instead of inside the step")
+    parser.add_argument("--compute-processes", action="store_true",
+                        help="with --compute-workers, use processes rather than threads")
+    parser.add_argument("--telemetry", metavar="FILE", help="append the bot's build and repair events to FILE")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    bot = AlphaBot(args.build_order)
+    bot.scheduler.budget = args.step_budget / 1000
+    if args.profile:
+        bot.enable_profiling(report_path=args.profile, allocations=args.profile_allocations)
+    if args.gc_tuning:
+        bot.enable_gc_tuning()
+    if args.compute_workers:
+        bot.enable_compute_pool(args.compute_workers, args.compute_processes)
+    if args.record:
+        bot.enable_recording(args.record)
+    if args.telemetry:
+        bot.enable_telemetry(args.telemetry, logging.getLevelName(args.log_level))
+
+    run_game(maps.get(args.map), [
+        Bot(Race.Terran, bot),
+        Computer(Race[args.race], Difficulty[args.difficulty])
+    ], realtime=args.realtime)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+""" Compares per-unit do() calls against the batched ActionBuffer
+
+Run from the repository root:
+
+    python -m benchmarks.bench_action_buffer --steps 200 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+from itertools import groupby
+
+from sc2.ids.ability_id import AbilityId
+from sc2.position import Point2
+
+from botlib.action_buffer import ActionBuffer
+
+
+class StandInCost:
+    minerals = 0
+    vespene = 0
+
+
+class StandInGameData:
+    def calculate_ability_cost(self, ability):
+        return StandInCost()
+
+
+class StandInClient:
+    """ Counts requests and pretends each one takes a round-trip to the game """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.round_trips = 0
+        self.commands = 0
+
+    async def actions(self, actions):
+        if not isinstance(actions, list):
+            actions = [actions]
+        self.round_trips += 1
+        self.commands += sum(1 for _ in groupby(actions, key=lambda a: a.combining_tuple))
+        await asyncio.sleep(self.latency)
+        return []
+
+
+class StandInGame:
+    def __init__(self, client: StandInClient) -> None:
+        self._client = client
+        self._game_data = StandInGameData()
+        self.minerals = 10000
+        self.vespene = 10000
+
+    async def do(self, action):
+        return await self._client.actions(action)
+
+    async def do_actions(self, actions):
+        return await self._client.actions(actions)
+
+
+class StandInUnit:
+    def __init__(self, tag: int) -> None:
+        self.tag = tag
+
+
+class StandInCommand:
+    def __init__(self, ability, unit, target=None, queue=False) -> None:
+        self.ability = ability
+        self.unit = unit
+        self.target = target
+        self.queue = queue
+
+    @property
+    def combining_tuple(self):
+        target = self.target.tag if isinstance(self.target, StandInUnit) else self.target
+        return (self.ability, target, self.queue)
+
+
+def step_actions() -> list:
+    """ A busy mid-game step: army attack, production, mining and depots """
+    tags = iter(range(1, 10000))
+    enemy = StandInUnit(next(tags))
+    patches = [StandInUnit(next(tags)) for _ in range(8)]
+
+    actions = []
+    actions += [StandInCommand(AbilityId.ATTACK, StandInUnit(next(tags)), enemy) for _ in range(40)]
+    actions += [StandInCommand(AbilityId.ATTACK, StandInUnit(next(tags)), Point2((50, 50))) for _ in range(12)]
+    actions += [StandInCommand(AbilityId.BARRACKSTRAIN_MARINE, StandInUnit(next(tags))) for _ in range(5)]
+    actions += [StandInCommand(AbilityId.HARVEST_GATHER, StandInUnit(next(tags)), patches[i % 8]) for i in range(24)]
+    actions += [StandInCommand(AbilityId.MORPH_SUPPLYDEPOT_LOWER, StandInUnit(next(tags))) for _ in range(6)]
+    return actions
+
+
+async def run_unbatched(steps: int, latency: float) -> StandInClient:
+    client = StandInClient(latency)
+    game = StandInGame(client)
+    for _ in range(steps):
+        for action in step_actions():
+            await game.do(action)
+    return client
+
+
+async def run_batched(steps: int, latency: float) -> StandInClient:
+    client = StandInClient(latency)
+    game = StandInGame(client)
+    action_buffer = ActionBuffer(game)
+    for _ in range(steps):
+        for action in step_actions():
+            action_buffer.queue(action)
+        await action_buffer.flush()
+    return client
+
+
+def report(name: str, client: StandInClient, steps: int, elapsed: float) -> None:
+    print("{:<10} {:>8.1f} round-trips/step {:>8.1f} commands/step {:>8.3f} ms/step".format(
+        name, client.round_trips / steps, client.commands / steps, elapsed * 1000 / steps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated round-trip in milliseconds")
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, runner in (("unbatched", run_unbatched), ("batched", run_batched)):
+        start = time.perf_counter()
+        client = loop.run_until_complete(runner(args.steps, args.latency / 1000))
+        report(name, client, args.steps, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+""" Times the cursor based build queue against the rescanning one it replaced, on long build orders
+
+Both queues follow the same simulated game, in which structures get built,
+command centers morph into orbitals and structures are sometimes lost, and
+their build targets are checked to agree on every step.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_build_queue --steps 100 200 400 --army 150
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, SUPPLYDEPOT, BARRACKS, FACTORY, STARPORT, \
+    REFINERY, ENGINEERINGBAY, MARINE
+
+from botlib.build_queue import BuildQueue, BuildStep
+from botlib.unit_events import UnitEvents
+
+TYPES = [COMMANDCENTER, ORBITALCOMMAND, SUPPLYDEPOT, BARRACKS, FACTORY, STARPORT, REFINERY, ENGINEERINGBAY]
+
+
+class StandInUnit:
+    def __init__(self, tag: int, type_id) -> None:
+        self.tag = tag
+        self.type_id = type_id
+        self.is_ready = True
+        self.health = 45.0
+        self.is_structure = type_id != MARINE
+
+
+class StandInSnapshot:
+    """ The parts of UnitSnapshot the build queues read, counts are indexed like the real one """
+
+    def __init__(self, units: list) -> None:
+        self.units = units
+        self._amounts = Counter(unit.type_id for unit in units)
+
+    def amount(self, unit_types) -> int:
+        if not isinstance(unit_types, tuple):
+            unit_types = (unit_types,)
+        return sum(self._amounts[t] for t in unit_types)
+
+
+class StandInConstructor:
+    def __init__(self) -> None:
+        self.target = None
+
+    def set_build_target(self, unit_type, target: int):
+        self.target = (unit_type, target)
+
+
+class RescanQueue:
+    """ The old approach, a walk from the first step with a count lookup per step """
+
+    def __init__(self) -> None:
+        self.build_steps = []
+
+    def add_step(self, unit_type, increment: int):
+        count = 0
+        for build_step in self.build_steps:
+            if build_step.unit_type == unit_type:
+                count = build_step.count
+        self.build_steps.append(BuildStep(unit_type, count + increment))
+
+    @staticmethod
+    def is_complete(step: BuildStep, snapshot) -> bool:
+        return snapshot.amount(BuildStep.TYPE_LOOKUP.get(step.unit_type, step.unit_type)) >= step.count
+
+    async def on_step(self, snapshot, building_constructor):
+        for step in self.build_steps:
+            if not self.is_complete(step, snapshot):
+                step.update_build_target(building_constructor)
+                return
+
+
+def build_order(steps: int, rng: random.Random) -> list:
+    return [(rng.choice(TYPES), rng.choice([1, 1, 1, 2])) for _ in range(steps)]
+
+
+def _run(coroutine):
+    """ Steps a coroutine which never awaits, without an event loop """
+    try:
+        coroutine.send(None)
+    except StopIteration:
+        pass
+
+
+def play(order: list, army: int, seed: int, loss_rate: float) -> dict:
+    rng = random.Random(seed)
+    rescan, cursor = RescanQueue(), BuildQueue()
+    events = UnitEvents()
+    cursor.subscribe(events)
+    start = time.perf_counter()
+    for unit_type, increment in order:
+        rescan.add_step(unit_type, increment)
+    add_rescan = time.perf_counter() - start
+    start = time.perf_counter()
+    for unit_type, increment in order:
+        cursor.add_step(unit_type, increment)
+    add_cursor = time.perf_counter() - start
+
+    units = [StandInUnit(tag, MARINE) for tag in range(army)]
+    next_tag = army
+    constructors = StandInConstructor(), StandInConstructor()
+    elapsed = [0.0, 0.0]
+    steps = 0
+    while True:
+        snapshot = StandInSnapshot(units)
+        started = time.perf_counter()
+        _run(rescan.on_step(snapshot, constructors[0]))
+        elapsed[0] += time.perf_counter() - started
+        # The cursor queue pays for the unit events it needs
+        started = time.perf_counter()
+        events.update(units)
+        _run(cursor.on_step(constructors[1]))
+        elapsed[1] += time.perf_counter() - started
+        assert constructors[0].target == constructors[1].target, "queues disagree on step {}".format(steps)
+        steps += 1
+        if cursor.current_step is None:
+            break
+
+        # Build what the queue asks for, now and then losing a structure
+        unit_type, _ = constructors[1].target
+        if unit_type == ORBITALCOMMAND and any(u.type_id == COMMANDCENTER for u in units):
+            cc = next(u for u in units if u.type_id == COMMANDCENTER)
+            units = [u for u in units if u is not cc] + [StandInUnit(cc.tag, ORBITALCOMMAND)]
+        elif rng.random() < 0.5:
+            units = units + [StandInUnit(next_tag, unit_type)]
+            next_tag += 1
+        if rng.random() < loss_rate:
+            structures = [u for u in units if u.type_id != MARINE]
+            if structures:
+                lost = rng.choice(structures)
+                units = [u for u in units if u is not lost]
+    return {"steps": steps, "add_rescan": add_rescan, "add_cursor": add_cursor,
+            "rescan": elapsed[0] / steps, "cursor": elapsed[1] / steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[100, 200, 400], help="build order lengths")
+    parser.add_argument("--army", type=int, default=150, help="other units on the field, which the events diff")
+    parser.add_argument("--loss-rate", type=float, default=0.02, help="chance of losing a structure each step")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>6} {:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        "steps", "played", "rescan add ms", "cursor add ms", "rescan us", "cursor us"))
+    for steps in args.steps:
+        order = build_order(steps, random.Random(args.seed))
+        result = play(order, args.army, args.seed, args.loss_rate)
+        print("{:>6} {:>8} {:>14.2f} {:>14.2f} {:>14.1f} {:>14.1f}".format(
+            steps, result["steps"], result["add_rescan"] * 1000, result["add_cursor"] * 1000,
+            result["rescan"] * 1e6, result["cursor"] * 1e6))
+
+
+if __name__ == "__main__":
+    main()
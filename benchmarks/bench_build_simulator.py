@@ -0,0 +1,72 @@
+""" Simulates variants of a build order with botlib.build_simulator and reports throughput and the best of them
+
+The variants are one step swap, removal or copy away from the build order.
+Run from the repository root:
+
+    python -m benchmarks.bench_build_simulator --variants 20000 --jobs 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from botlib.build_queue import BuildQueue
+from botlib.build_simulator import KINDS, BuildOrderSimulator, encode, run_parallel, variants
+
+
+def describe(queue: BuildQueue) -> str:
+    return ", ".join("{} {}".format(step.unit_type.name, step.count) for step in queue.build_steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--build-order", default="build_orders/alpha_bot.txt")
+    parser.add_argument("--variants", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=360.0, help="game seconds simulated")
+    parser.add_argument("--jobs", type=int, default=0, help="also run on a pool of this many processes")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    queue = BuildQueue.load(args.build_order)
+    queues = [queue] + variants(queue, args.variants, np.random.RandomState(args.seed))
+    simulator = BuildOrderSimulator(duration=args.duration)
+
+    started = time.perf_counter()
+    arrays = encode(queues)
+    encoded = time.perf_counter()
+    result = simulator.run(*arrays)
+    finished = time.perf_counter()
+    print("{} build orders, encoded in {:.0f}ms, simulated in {:.0f}ms: {:.0f} simulations/s".format(
+        len(queues), (encoded - started) * 1000, (finished - encoded) * 1000, len(queues) / (finished - encoded)))
+
+    if args.jobs:
+        started = time.perf_counter()
+        pooled = run_parallel(simulator, *arrays, jobs=args.jobs)
+        elapsed = time.perf_counter() - started
+        assert np.array_equal(pooled.completed, result.completed, equal_nan=True)
+        print("{} processes: {:.0f} simulations/s".format(args.jobs, len(queues) / elapsed))
+
+    print()
+    print("{:>9} {:>9} {:>7} {:>7}  {}".format("complete", "blocked", "workers", "army", "  ".join(
+        "{:>8}".format(unit_type.name[:8].lower()) for unit_type in KINDS)))
+    # The build order itself first, then the variants finishing soonest with the least time supply blocked
+    order = np.lexsort((result.supply_blocked[1:], np.nan_to_num(result.completed[1:], nan=np.inf))) + 1
+    best, seen = [], {describe(queue)}
+    for row in order.tolist():
+        if len(best) == args.top:
+            break
+        if describe(queues[row]) not in seen:
+            seen.add(describe(queues[row]))
+            best.append(row)
+    for row in [0] + best:
+        print("{:>9.0f} {:>9.0f} {:>7} {:>7}  {}".format(
+            result.completed[row], result.supply_blocked[row], result.workers[row], result.army_supply[row],
+            "  ".join("{:>8.0f}".format(value) for value in result.first_done[row])))
+    print()
+    for row in best:
+        print(describe(queues[row]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+""" Times simulate_engagements for batches of candidate engagements, and checks a few fights come out right
+
+Run from the repository root:
+
+    python -m benchmarks.bench_engagement --army 40 --enemies 20 --candidates 1 16 64 256 --budget 1
+"""
+import argparse
+import time
+
+import numpy as np
+
+from botlib.engagement import simulate_engagements, MEDIVAC_HEAL_RATE
+
+MARINE = (45, 9.8, 5)  # health, damage per second, range
+STALKER = (160, 9.7, 6)
+ZEALOT = (150, 18.6, 0.1)
+
+
+def fight(ours, our_count, theirs, their_count, medivacs=0):
+    """ What each side has left after a straight fight, everyone there from the start """
+    hp, dps, reach = (np.full(our_count, float(value)) for value in ours)
+    their_hp, their_dps, their_reach = (np.full(their_count, float(value)) for value in theirs)
+    our_left, their_left = simulate_engagements(
+        hp, dps, reach, np.ones((1, our_count), dtype=bool), np.zeros((1, our_count)),
+        their_hp, their_dps, their_reach, healing=np.array([medivacs * MEDIVAC_HEAL_RATE]))
+    return our_left[0], their_left[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--army", type=int, default=40)
+    parser.add_argument("--enemies", type=int, default=20)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--budget", type=float, default=1.0, help="milliseconds allowed per call")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Who should win is plain from the numbers, the simulation has to agree
+    assert fight(MARINE, 20, STALKER, 5)[1] == 0, "20 marines should beat 5 stalkers"
+    assert fight(MARINE, 10, ZEALOT, 10)[0] == 0, "10 marines should lose to 10 zealots"
+    assert fight(MARINE, 8, ZEALOT, 4, medivacs=2)[0] > fight(MARINE, 8, ZEALOT, 4)[0], "medivacs should help"
+    assert fight(STALKER, 6, (160, 9.7, 4), 6)[1] < fight(STALKER, 6, STALKER, 6)[1], "range should help"
+
+    rng = np.random.default_rng(args.seed)
+    our_hp, our_dps, our_range = (np.full(args.army, float(value)) for value in MARINE)
+    their_hp, their_dps, their_range = (np.full(args.enemies, float(value)) for value in STALKER)
+    their_arrival = rng.uniform(0, 5, args.enemies)
+
+    print("{:>10} {:>10} {:>12} {:>8}".format("candidates", "ms/call", "us/candidate", "budget"))
+    for count in args.candidates:
+        # Random subsets of the army, each unit turning up at a different time
+        members = rng.random((count, args.army)) < 0.8
+        arrival = rng.uniform(0, 8, (count, args.army))
+        healing = rng.integers(0, 4, count) * MEDIVAC_HEAL_RATE
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            simulate_engagements(our_hp, our_dps, our_range, members, arrival, their_hp, their_dps, their_range,
+                                 their_arrival=their_arrival, healing=healing)
+        call_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        print("{:>10} {:>10.3f} {:>12.2f} {:>8}".format(
+            count, call_ms, call_ms * 1000 / count, "ok" if call_ms <= args.budget else "OVER"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+""" Times the batched focus fire assignment against the per-unit target search it replaced
+
+Run from the repository root:
+
+    python -m benchmarks.bench_focus_fire --sizes 50 100 200 300 --budget 10
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from sc2.position import Point2
+from sc2.units import Units
+
+from botlib.targeting import FocusFire
+
+
+class StandInUnit:
+    def __init__(self, tag: int, position: Point2, health: float, ground_range: float, dps: float) -> None:
+        self.tag = tag
+        self.position = position
+        self.radius = 0.375
+        self.health = health
+        self.shield = 0
+        self.is_flying = False
+        self.ground_range = ground_range
+        self.air_range = ground_range
+        self.ground_dps = dps
+        self.air_dps = dps
+        self.order_target = None
+
+
+def make_army(count: int, first_tag: int, centre: Point2, rng: random.Random) -> Units:
+    return Units([StandInUnit(tag, Point2((centre.x + rng.gauss(0, 6), centre.y + rng.gauss(0, 6))),
+                              rng.uniform(10, 55), 5, 9.8)
+                  for tag in range(first_tag, first_tag + count)], None)
+
+
+def per_unit(army: Units, enemies: Units, bonus_distance: float) -> list:
+    """ The old approach, a filter and sort for each of our units """
+    orders = []
+    for unit in army:
+        reach = unit.ground_range + bonus_distance
+        attackable = [e for e in enemies
+                      if e.position.distance_to(unit.position) - unit.radius - e.radius <= reach]
+        if attackable:
+            orders.append((unit, min(attackable, key=lambda e: e.health)))
+    return orders
+
+
+def measure(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 300])
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="milliseconds allowed per step, a realtime step lasts about 45")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    focus_fire = FocusFire()
+    print("{:>6} {:>12} {:>12} {:>8}".format("size", "per-unit ms", "batched ms", "budget"))
+    for size in args.sizes:
+        army = make_army(size, 1, Point2((50, 50)), rng)
+        enemies = make_army(size, size + 1, Point2((60, 55)), rng)
+
+        per_unit_ms = measure(lambda: per_unit(army, enemies, 20), args.repeat)
+        batched_ms = measure(lambda: focus_fire.plan(army, enemies, bonus_distance=20, busy=army), args.repeat)
+
+        orders, unassigned = focus_fire.plan(army, enemies, bonus_distance=20)
+        assert sum(len(units) for _, units in orders) + len(unassigned) == size
+
+        print("{:>6} {:>12.3f} {:>12.3f} {:>8}".format(
+            size, per_unit_ms, batched_ms, "ok" if batched_ms <= args.budget else "OVER"))
+
+
+if __name__ == "__main__":
+    main()
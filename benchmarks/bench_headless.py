@@ -0,0 +1,77 @@
+""" Plays the bot for thousands of steps against the headless harness and reports its step latency
+
+Run from the repository root:
+
+    python -m benchmarks.bench_headless --units 10 60 300 --enemies 0 40 200 --steps 2000
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+
+from botlib.headless import Scenario, run_headless
+
+
+def make_bot(name: str):
+    if name == "terran":
+        from botlib.terran_bot import TerranBot
+        return TerranBot()
+    from alpha_bot import AlphaBot
+    return AlphaBot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bot", default="alpha", choices=["alpha", "terran"])
+    parser.add_argument("--units", type=int, nargs="+", default=[10, 60, 300],
+                        help="our units at the start of each run, workers and structures included")
+    parser.add_argument("--enemies", type=int, nargs="+", default=[0, 40, 200],
+                        help="enemy army size, paired with --units")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--game-step", type=int, default=8, help="game loops per bot step")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--step-budget", metavar="MS", type=float, default=44.6,
+                        help="the step scheduler's budget, low priority work is put off past it")
+    parser.add_argument("--json", metavar="PATH", help="write every run's summary to PATH")
+    parser.add_argument("--actions", metavar="PREFIX",
+                        help="write the commands of each run to PREFIX_<units>_<enemies>.jsonl")
+    args = parser.parse_args()
+    if len(args.units) != len(args.enemies):
+        parser.error("--units and --enemies need the same number of values")
+
+    # The bot logs and prints as it goes, keep the table readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    summaries = []
+    print("{:>6} {:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>9} {:>9} {:>9} {:>9}".format(
+        "units", "enemies", "steps", "steps/s", "mean ms", "p95 ms", "p99 ms", "max ms", "commands",
+        "dropped", "overruns", "deferred"))
+    for units, enemies in zip(args.units, args.enemies):
+        scenario = Scenario(units=units, enemies=enemies, steps=args.steps, seed=args.seed,
+                            game_step=args.game_step)
+        bot = make_bot(args.bot)
+        bot.scheduler.budget = args.step_budget / 1000
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run_headless(bot, scenario)
+        summary = report.summary()
+        summary["overruns"] = bot.scheduler.overruns
+        summary["deferrals"] = sum(task.deferrals for task in bot.scheduler.tasks)
+        summary["scheduler"] = bot.scheduler.summary()
+        summary["command_filter"] = bot.command_filter.summary()
+        summaries.append(summary)
+        if args.actions:
+            report.server.actions.write("{}_{}_{}.jsonl".format(args.actions, units, enemies))
+
+        print("{:>6} {:>8} {:>6} {:>8.1f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>9} {:>9} {:>9} {:>9}".format(
+            units, enemies, summary["steps"], summary["steps_per_second"], summary["mean_ms"],
+            summary["p95_ms"], summary["p99_ms"], summary["max_ms"], summary["commands"],
+            sum(bot.command_filter.suppressed.values()), summary["overruns"], summary["deferrals"]))
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summaries, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+""" Plays a long headless game and checks the bot's memory use per step against recorded baselines
+
+Each garbage collection mode is played twice in a fresh process: once
+untraced, for step latency, collector pauses and peak RSS, and once under
+tracemalloc, for the memory every step and routine allocates and how much
+the process keeps hold of as the game goes on. The run fails when a figure
+goes over its baseline by more than the tolerance, or when there is no
+baseline for the scenario. Run from the repository root, --record to write
+the baselines:
+
+    python -m benchmarks.bench_memory --steps 30000 --gc default tuned
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "memory.json")
+
+# Figures checked against the baseline, and what they may go over it by on top of the tolerance
+CHECKED = {
+    "mean_alloc_kb": 1.0,
+    "p99_alloc_kb": 4.0,
+    "growth_kb_per_1000_steps": 64.0,
+    "peak_rss_mb": 4.0,
+}
+
+
+def child(args):
+    """ Runs in the launched process, printing the run's figures as JSON """
+    import logging
+    import resource
+    import tracemalloc
+    from alpha_bot import AlphaBot
+    from botlib.headless import Scenario, run_headless
+
+    logging.disable(logging.ERROR)
+    bot = AlphaBot()
+    tuned = args.gc == ["tuned"]
+    bot.enable_gc_tuning(freeze=tuned, idle=tuned)
+    if args.traced:
+        bot.enable_profiling(report_path=None, allocations=True)
+
+    warmup = args.steps // 10
+    traced = {}
+    on_step = bot.on_step
+
+    async def marked_on_step(iteration):
+        await on_step(iteration)
+        # Memory held once the game is under way and at its last step, to see what keeps growing
+        if args.traced and iteration >= warmup:
+            traced.setdefault("warm", (iteration, tracemalloc.get_traced_memory()[0]))
+            traced["last"] = (iteration, tracemalloc.get_traced_memory()[0])
+
+    bot.on_step = marked_on_step
+    scenario = Scenario(units=args.units, enemies=args.enemies, steps=args.steps, seed=args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = run_headless(bot, scenario)
+
+    summary = report.summary()
+    figures = {
+        "steps": summary["steps"],
+        "mean_ms": summary["mean_ms"],
+        "p99_ms": summary["p99_ms"],
+        "max_ms": summary["max_ms"],
+        "gc": bot.gc_tuner.summary(),
+    }
+    if args.traced:
+        steps = bot.profiler.summary()
+        figures["mean_alloc_kb"] = steps[0]["mean_alloc_kb"]
+        figures["p99_alloc_kb"] = steps[0]["p99_alloc_kb"]
+        figures["max_alloc_kb"] = steps[0]["max_alloc_kb"]
+        (first, held), (last, still_held) = traced["warm"], traced["last"]
+        figures["growth_kb_per_1000_steps"] = (still_held - held) / 1024 * 1000 / max(last - first, 1)
+        figures["routines"] = steps[1:]
+    else:
+        figures["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(figures))
+
+
+def launch(args, gc_mode: str, traced: bool) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_memory", "--child", "--gc", gc_mode, "--units", str(args.units),
+               "--enemies", str(args.enemies), "--steps", str(args.steps), "--seed", str(args.seed)]
+    if traced:
+        command.append("--traced")
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def baseline_key(args, gc_mode: str) -> str:
+    return "units{}-enemies{}-steps{}-seed{}-gc-{}".format(args.units, args.enemies, args.steps, args.seed, gc_mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=30)
+    parser.add_argument("--enemies", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=30000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--gc", nargs="+", default=["default", "tuned"], choices=["default", "tuned"])
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--tolerance", type=float, default=0.15, help="fraction a figure may go over its baseline")
+    parser.add_argument("--record", action="store_true", help="write this run's figures as the baselines")
+    parser.add_argument("--routines", type=int, default=8, help="routines listed by memory allocated")
+    parser.add_argument("--json", metavar="PATH", help="write every run's figures to PATH")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--traced", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    try:
+        with open(args.baselines) as baselines_file:
+            baselines = json.load(baselines_file)
+    except (OSError, ValueError):
+        baselines = {}
+
+    runs = {}
+    failures = []
+    print("{:<8} {:>8} {:>8} {:>8} {:>10} {:>10} {:>10} {:>9} {:>9} {:>9}".format(
+        "gc", "mean ms", "p99 ms", "max ms", "gc pauses", "pause ms", "idle ms", "alloc kb", "p99 kb", "rss mb"))
+    for gc_mode in args.gc:
+        figures = launch(args, gc_mode, False)
+        traced = launch(args, gc_mode, True)
+        for name in ("mean_alloc_kb", "p99_alloc_kb", "max_alloc_kb", "growth_kb_per_1000_steps", "routines"):
+            figures[name] = traced[name]
+        runs[gc_mode] = figures
+
+        gc_summary = figures["gc"]
+        print("{:<8} {:>8.2f} {:>8.2f} {:>8.2f} {:>10} {:>10.1f} {:>10.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            gc_mode, figures["mean_ms"], figures["p99_ms"], figures["max_ms"], sum(gc_summary["collections"]),
+            gc_summary["pause_ms"], gc_summary["idle_ms"], figures["mean_alloc_kb"], figures["p99_alloc_kb"],
+            figures["peak_rss_mb"]))
+
+        baseline = baselines.get(baseline_key(args, gc_mode))
+        if baseline and not args.record:
+            for name, slack in CHECKED.items():
+                limit = baseline[name] * (1 + args.tolerance) + slack
+                if figures[name] > limit:
+                    failures.append("{} {}: {:.1f} over the baseline's {:.1f}".format(
+                        gc_mode, name, figures[name], baseline[name]))
+        elif not args.record:
+            failures.append("{}: no baseline for {}, record one with --record".format(
+                gc_mode, baseline_key(args, gc_mode)))
+
+    for gc_mode, figures in runs.items():
+        print()
+        print("{} gc, growth {:.1f}kb per 1000 steps, routines by memory allocated:".format(
+            gc_mode, figures["growth_kb_per_1000_steps"]))
+        print("  {:<28} {:>8} {:>10} {:>10} {:>12}".format("routine", "calls", "alloc kb", "p99 kb", "retained kb"))
+        for row in sorted(figures["routines"], key=lambda row: row["mean_alloc_kb"], reverse=True)[:args.routines]:
+            print("  {:<28} {:>8} {:>10.1f} {:>10.1f} {:>12.1f}".format(
+                row["routine"], row["calls"], row["mean_alloc_kb"], row["p99_alloc_kb"], row["retained_kb"]))
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(runs, output, indent=2)
+
+    if args.record:
+        for gc_mode, figures in runs.items():
+            baselines[baseline_key(args, gc_mode)] = {name: figures[name] for name in CHECKED}
+        os.makedirs(os.path.dirname(args.baselines), exist_ok=True)
+        with open(args.baselines, "w") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+        print()
+        print("Baselines written to {}".format(args.baselines))
+
+    if failures:
+        print()
+        print("Failed against the baselines:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+""" Times PathingFields on the synthetic map against a heap based Dijkstra, and the queries once a field is cached
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pathing --size 200 --queries 1000
+"""
+import argparse
+import heapq
+import random
+import time
+
+import numpy as np
+from sc2.pixel_map import PixelMap
+from sc2.position import Point2
+
+from botlib.compute_pool import ComputePool
+from botlib.headless.synthetic_map import SyntheticMap
+from botlib.pathing import PathingFields, DIAGONAL, STRAIGHT, UNREACHABLE
+
+
+class StandInGame:
+    """ Just what PathingFields reads from the bot """
+
+    def __init__(self, synthetic_map: SyntheticMap) -> None:
+        self.synthetic_map = synthetic_map
+        self.state = type("State", (), {"game_loop": 0})()
+        self.game_info = type("GameInfo", (), {})()
+        self.refresh()
+
+    def refresh(self):
+        proto = self.synthetic_map.game_info_proto([])
+        self.game_info.pathing_grid = PixelMap(proto.start_raw.pathing_grid, in_bits=True)
+        self.state.game_loop += 1
+
+
+def heap_dijkstra(pathable: np.ndarray, target: Point2) -> np.ndarray:
+    height, width = pathable.shape
+    distances = np.full(pathable.shape, UNREACHABLE, dtype=np.int64)
+    x, y = int(target.x), int(target.y)
+    distances[y, x] = 0
+    heap = [(0, y, x)]
+    while heap:
+        distance, y, x = heapq.heappop(heap)
+        if distance > distances[y, x]:
+            continue
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                ny, nx = y + dy, x + dx
+                if (dx or dy) and 0 <= ny < height and 0 <= nx < width and pathable[ny, nx]:
+                    reached = distance + (DIAGONAL if dx and dy else STRAIGHT)
+                    if reached < distances[ny, nx]:
+                        distances[ny, nx] = reached
+                        heapq.heappush(heap, (reached, ny, nx))
+    return distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    synthetic_map = SyntheticMap(args.size)
+    game = StandInGame(synthetic_map)
+    pathing = PathingFields(game)
+    target = synthetic_map.start_locations[1]
+
+    start = time.perf_counter()
+    expected = heap_dijkstra(synthetic_map.pathable, target)
+    heap_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    field = pathing.field(target)
+    field_ms = (time.perf_counter() - start) * 1000
+    assert (field.distances[1:-1, 1:-1] == expected).all(), "field disagrees with the heap based Dijkstra"
+
+    positions = []
+    while len(positions) < args.queries:
+        x, y = rng.uniform(1, args.size - 1), rng.uniform(1, args.size - 1)
+        if synthetic_map.pathable[int(y), int(x)]:
+            positions.append(Point2((x, y)))
+
+    start = time.perf_counter()
+    for position in positions:
+        pathing.distance(target, position)
+    distance_us = (time.perf_counter() - start) * 1e6 / len(positions)
+
+    start = time.perf_counter()
+    pathing.waypoints(target, np.array([[p.x, p.y] for p in positions]))
+    waypoints_ms = (time.perf_counter() - start) * 1000
+
+    # A structure going up changes the grid, the field is worked out again when next asked for
+    synthetic_map.pathable[40:43, 60:63] = False
+    game.refresh()
+    start = time.perf_counter()
+    pathing.field(target)
+    refresh_ms = (time.perf_counter() - start) * 1000
+
+    # With a compute pool the old field answers at once, the new one is handed back by a later poll
+    compute = ComputePool(game, workers=1)
+    pathing.compute = compute
+    synthetic_map.pathable[50:53, 60:63] = False
+    game.refresh()
+    start = time.perf_counter()
+    stale = pathing.field(target)
+    background_ms = (time.perf_counter() - start) * 1000
+    while stale is pathing.field(target):
+        time.sleep(0.001)
+        compute.poll()
+    handed_back_ms = (time.perf_counter() - start) * 1000
+    compute.close()
+
+    print("heap Dijkstra    {:>9.3f} ms".format(heap_ms))
+    print("field            {:>9.3f} ms".format(field_ms))
+    print("field refresh    {:>9.3f} ms (after the grid changed)".format(refresh_ms))
+    print("pooled refresh   {:>9.3f} ms (old field answers, new one handed back after {:.3f} ms)".format(
+        background_ms, handed_back_ms))
+    print("ground distance  {:>9.3f} us/query (cached field)".format(distance_us))
+    print("waypoints        {:>9.3f} ms for {} units".format(waypoints_ms, len(positions)))
+
+
+if __name__ == "__main__":
+    main()
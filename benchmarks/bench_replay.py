@@ -0,0 +1,83 @@
+""" Records a headless game, then times reading the recording back and replaying it through the bot
+
+The recording is read back as observation protos and as game states built
+straight from its columns, and replayed both through the library's game
+loop and directly.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_replay --units 60 --enemies 40 --steps 2000
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from alpha_bot import AlphaBot
+from botlib.headless import Scenario, run_headless, run_replay
+from botlib.observation_recorder import ObservationReader
+
+
+def unbudgeted_bot() -> AlphaBot:
+    """ A bot which runs every service every step, so its commands don't depend on how fast the machine is """
+    bot = AlphaBot()
+    bot.scheduler.budget = float("inf")
+    return bot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=60)
+    parser.add_argument("--enemies", type=int, default=40)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--chunk-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", metavar="DIR", help="record to DIR and keep it, instead of a temporary directory")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    path = args.keep or tempfile.mkdtemp(prefix="alpha_bot_recording_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot = unbudgeted_bot()
+            bot.enable_recording(path, args.chunk_steps)
+            recorded = run_headless(bot, Scenario(units=args.units, enemies=args.enemies, steps=args.steps,
+                                                  seed=args.seed))
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print("recorded {} steps, {:.1f}kB on disk ({:.0f} bytes a step)".format(
+            bot.recorder.steps, size / 1024, size / max(bot.recorder.steps, 1)))
+
+        reader = ObservationReader(path)
+        start = time.perf_counter()
+        steps = sum(1 for _ in reader)
+        print("reader protos  {:>8.0f} steps/s".format(steps / (time.perf_counter() - start)))
+        start = time.perf_counter()
+        steps = sum(1 for _ in reader.states())
+        print("reader states  {:>8.0f} steps/s".format(steps / (time.perf_counter() - start)))
+
+        for name, direct in (("replay", False), ("replay direct", True)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                replayed = run_replay(unbudgeted_bot(), path, seed=args.seed, direct=direct)
+            summary = replayed.summary()
+            # Wall time less the bot's is what feeding it the recording cost
+            bot_time = replayed.server.step_latency.total + replayed.server.first_step
+            feed = replayed.wall_time - bot_time
+            print("{:<14} {:>8.0f} steps/s, {:.0f} steps/s of bot time, {:.0f} steps/s feeding it".format(
+                name, summary["wall_steps_per_second"], summary["steps_per_second"],
+                summary["steps"] / max(feed, 1e-9)))
+
+            # A faithful replay makes the bot repeat the recorded game's commands
+            pairs = list(zip(recorded.server.actions.records, replayed.server.actions.records))
+            matching = next((i for i, (original, replay) in enumerate(pairs) if original != replay), len(pairs))
+            print("  commands {} of {} identical before the first difference".format(matching, len(pairs)))
+    finally:
+        if not args.keep:
+            shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+""" Compares SpatialIndex proximity queries against the nested loops they replace
+
+Run from the repository root:
+
+    python -m benchmarks.bench_spatial_index --own 200 --enemies 200
+"""
+import argparse
+import random
+import time
+
+from sc2.position import Point2
+from sc2.units import Units
+
+from botlib.spatial_index import SpatialIndex
+
+
+class StandInUnit:
+    def __init__(self, tag: int, position: Point2) -> None:
+        self.tag = tag
+        self.position = position
+        self.radius = 0.375
+
+
+def make_units(count: int, first_tag: int, rng: random.Random) -> Units:
+    # Clustered like armies on a 200x200 map, rather than spread uniformly
+    centres = [Point2((rng.uniform(20, 180), rng.uniform(20, 180))) for _ in range(4)]
+    units = []
+    for tag in range(first_tag, first_tag + count):
+        centre = rng.choice(centres)
+        units.append(StandInUnit(tag, Point2((centre.x + rng.gauss(0, 8), centre.y + rng.gauss(0, 8)))))
+    return Units(units, None)
+
+
+def naive(own: Units, enemies: Units) -> tuple:
+    threatened = sum(1 for u in own if any(e.position.distance_to(u.position) < 15 for e in enemies))
+    in_range = sum(len([e for e in enemies if e.position.distance_to(u.position) < 6]) for u in own)
+    closest = [min(enemies, key=lambda e: e.position.distance_to(u.position)).tag for u in own]
+    return threatened, in_range, closest
+
+
+def indexed(own: Units, enemies: Units) -> tuple:
+    index = SpatialIndex(enemies)
+    threatened = sum(1 for u in own if index.any_closer_than(u.position, 15))
+    in_range = sum(len(index.closer_than(u.position, 6)) for u in own)
+    closest = [index.closest_to(u.position).tag for u in own]
+    return threatened, in_range, closest
+
+
+def measure(function, own: Units, enemies: Units, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(own, enemies)
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--own", type=int, default=200)
+    parser.add_argument("--enemies", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    own = make_units(args.own, 1, rng)
+    enemies = make_units(args.enemies, args.own + 1, rng)
+
+    expected, naive_ms = measure(naive, own, enemies, args.repeat)
+    result, indexed_ms = measure(indexed, own, enemies, args.repeat)
+    assert result == expected, "index disagrees with the naive scan"
+
+    print("naive   {:>8.3f} ms/step".format(naive_ms))
+    print("indexed {:>8.3f} ms/step (includes building the index)".format(indexed_ms))
+
+
+if __name__ == "__main__":
+    main()
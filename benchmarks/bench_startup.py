@@ -0,0 +1,86 @@
+""" Times AlphaBot from process launch to its first on_step, with an empty and with a filled map cache
+
+Each run is a fresh Python process playing the first steps of a headless
+game, so imports and the map analysis are paid in full. Run from the
+repository root:
+
+    python -m benchmarks.bench_startup --size 200 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+LAUNCHED_AT = "BENCH_STARTUP_LAUNCHED_AT"
+
+
+def child(size: int, cache: str):
+    """ Runs in the launched process, printing the times since launch as JSON """
+    launched = float(os.environ[LAUNCHED_AT])
+    import contextlib
+    import io
+    import logging
+    from alpha_bot import AlphaBot
+    from botlib.headless import HeadlessServer, Scenario, SyntheticMap, World, run_server
+    times = {"imported": time.time() - launched}
+
+    logging.disable(logging.INFO)
+    bot = AlphaBot()
+    bot.map_cache.root = cache
+    on_start, on_step = bot.on_start, bot.on_step
+
+    def timed_on_start():
+        on_start()
+        times.setdefault("on_start", time.time() - launched)
+
+    async def timed_on_step(iteration):
+        times.setdefault("first_step", time.time() - launched)
+        await on_step(iteration)
+
+    bot.on_start, bot.on_step = timed_on_start, timed_on_step
+    world = World(Scenario(units=30, enemies=16, steps=2), SyntheticMap(size))
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_server(bot, HeadlessServer(world), {}, 1)
+    print(json.dumps(times))
+
+
+def launch(size: int, cache: str) -> dict:
+    env = dict(os.environ, **{LAUNCHED_AT: repr(time.time())})
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", "--size", str(size),
+                             "--cache", cache], env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200, help="side of the synthetic map")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--cache", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.size, args.cache)
+        return
+
+    print("{:<6} {:>12} {:>12} {:>14}".format("cache", "imported ms", "on_start ms", "first step ms"))
+    with tempfile.TemporaryDirectory() as warm:
+        launch(args.size, warm)
+        for name in ("empty", "filled"):
+            runs = []
+            for _ in range(args.repeat):
+                if name == "empty":
+                    with tempfile.TemporaryDirectory() as cold:
+                        runs.append(launch(args.size, cold))
+                else:
+                    runs.append(launch(args.size, warm))
+            print("{:<6} {:>12.1f} {:>12.1f} {:>14.1f}".format(name, *(
+                statistics.median(run[key] for run in runs) * 1000 for key in ("imported", "on_start", "first_step"))))
+
+
+if __name__ == "__main__":
+    main()
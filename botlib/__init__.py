@@ -1,10 +1 @@
-from pathlib import Path
-__all__ = [p.stem for p in Path().iterdir() if p.is_file() and p.suffix == ".py" and p.stem != "__init__"]
-
-import sys, logging
-logging.basicConfig(stream=sys.stdout, level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-from .build_info import BuildInfo
-from .building_constructor import BuildingConstructor
-from .terran_bot import *
+# Import what you need from its module, such as botlib.terran_bot, so loading one part doesn't load them all
@@ -0,0 +1,97 @@
+import logging
+from typing import Dict, List, Tuple
+
+import sc2
+from sc2.position import Point2
+
+logger = logging.getLogger(__name__)
+
+
+class ActionBuffer:
+    """ Collects unit commands during a step and submits them as a single request """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+
+        self._sequence = 0
+        self._unit_actions = {}  # type: Dict[int, List[Tuple[int, object]]]
+
+        # Running totals, useful to confirm the batching is doing its job
+        self.actions_queued = 0
+        self.commands_sent = 0
+        self.requests_sent = 0
+
+    def __len__(self) -> int:
+        return sum(len(actions) for actions in self._unit_actions.values())
+
+    def queue(self, action) -> None:
+        # Deduct the cost straight away, so can_afford stays honest for the rest of the step
+        cost = self.game._game_data.calculate_ability_cost(action.ability)
+        self.game.minerals -= cost.minerals
+        self.game.vespene -= cost.vespene
+
+        tag = action.unit.tag
+        if not action.queue or tag not in self._unit_actions:
+            # A fresh command replaces anything the unit was told earlier this step
+            self._unit_actions[tag] = []
+        self._unit_actions[tag].append((self._sequence, action))
+        self._sequence += 1
+        self.actions_queued += 1
+
+    def coalesce(self) -> list:
+        """ Orders the buffered actions so identical commands sit next to each other
+
+        The client merges adjacent commands with the same ability, target and queue
+        flag into one multi-tag command. Commands queued on the same unit keep their
+        relative order, as each is placed in a later wave than the one before it.
+        """
+        groups = {}  # type: Dict[Tuple, List[Tuple[int, object]]]
+        for unit_actions in self._unit_actions.values():
+            for wave, (sequence, action) in enumerate(unit_actions):
+                key = (wave,) + self.combining_key(action)
+                groups.setdefault(key, []).append((sequence, action))
+
+        ordered = sorted(groups.items(), key=lambda item: (item[0][0], item[1][0][0]))
+        return [action for _, group in ordered for _, action in group]
+
+    async def flush(self):
+        if not self._unit_actions:
+            return None
+
+        actions = self.coalesce()
+        self._unit_actions = {}
+        self._sequence = 0
+
+        # do_actions deducts costs again, but they were already deducted when queued
+        minerals, vespene = self.game.minerals, self.game.vespene
+        result = await self.game.do_actions(actions)
+        self.game.minerals, self.game.vespene = minerals, vespene
+
+        self.commands_sent += self.count_commands(actions)
+        self.requests_sent += 1
+        if result:
+            logger.error("Errors: {} (actions: {})".format(result, len(actions)))
+        return result
+
+    @staticmethod
+    def combining_key(action) -> Tuple:
+        target = action.target
+        if target is None:
+            target_key = None
+        elif isinstance(target, Point2):
+            target_key = (target.x, target.y)
+        else:
+            target_key = target.tag
+        return (action.ability, target_key, action.queue)
+
+    @staticmethod
+    def count_commands(actions: list) -> int:
+        """ Number of raw commands the actions combine into """
+        count = 0
+        previous = None
+        for action in actions:
+            key = ActionBuffer.combining_key(action)
+            if key != previous:
+                count += 1
+                previous = key
+        return count
@@ -1,7 +1,13 @@
 import math
+from collections import Counter
 
 import sc2
-from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, REFINERY, SCV, SUPPLYDEPOT
+from sc2.constants import COMMANDCENTER, REFINERY, SCV, SUPPLYDEPOT
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+
+from .unit_events import UnitEvents, CREATED, CONSTRUCTION_STARTED, CONSTRUCTION_COMPLETED, DESTROYED, MORPHED
+from .unit_snapshot import COMMAND_CENTERS, SUPPLY_DEPOTS
 
 
 class BuildInfo:
@@ -11,10 +17,48 @@ class BuildInfo:
         # create the instance
         self.game = game
 
+        # Kept up to date by unit events
+        self.counts = Counter()  # type: Counter  # our units by type, under construction included
+        self.constructing = Counter()  # type: Counter  # our unfinished units by type
+
+    def subscribe(self, events: UnitEvents):
+        events.subscribe(CREATED, self._created)
+        events.subscribe(CONSTRUCTION_STARTED, self._construction_started)
+        events.subscribe(CONSTRUCTION_COMPLETED, self._construction_completed)
+        events.subscribe(DESTROYED, self._destroyed)
+        events.subscribe(MORPHED, self._morphed)
+
+    def _created(self, unit: Unit):
+        self.counts[unit.type_id] += 1
+
+    def _construction_started(self, unit: Unit):
+        self.constructing[unit.type_id] += 1
+
+    def _construction_completed(self, unit: Unit):
+        self.constructing[unit.type_id] -= 1
+
+    def _destroyed(self, tag: int, unit_type: UnitTypeId, was_ready: bool):
+        self.counts[unit_type] -= 1
+        if not was_ready:
+            self.constructing[unit_type] -= 1
+
+    def _morphed(self, unit: Unit, previous_type: UnitTypeId):
+        self.counts[previous_type] -= 1
+        self.counts[unit.type_id] += 1
+
+    def ordered(self, unit_type: UnitTypeId) -> int:
+        """ Build orders for the structure which have not been placed yet """
+        builder = self.game.building_constructor.builders.get(unit_type)
+        return builder.pending_total if builder else 0
+
+    def pending(self, unit_type: UnitTypeId) -> int:
+        """ Structures under construction, plus build orders not placed yet """
+        return self.constructing[unit_type] + self.ordered(unit_type)
+
     @property
     def workers_wanted(self) -> bool:
-        existing_scvs = self.game.units(
-            SCV).amount + self.game.already_pending(SCV)
+        # SCVs in training are orders of the command centers, not units yet
+        existing_scvs = self.counts[SCV] + self.game.snapshot.pending(SCV)
         target_scvs = self._target_workers
         if existing_scvs >= target_scvs:
             return 0
@@ -22,27 +66,29 @@ class BuildInfo:
 
     @property
     def supply_wanted(self) -> bool:
+        snapshot = self.game.snapshot
         # The more units we have, the quicker we reach capacity
         build_capacity = math.floor(self.game.supply_used / 100) + 1
+        depots_pending = self.pending(SUPPLYDEPOT)
+        depots = sum(self.counts[t] for t in SUPPLY_DEPOTS)
 
-        if not self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).ready or self.game.supply_cap == self.game.supply_used:
+        if not snapshot.ready(COMMAND_CENTERS) or self.game.supply_cap == self.game.supply_used:
             # Ensure we save money for a new command center
             return 0
-        elif self.game.units(SUPPLYDEPOT).amount + self.game.already_pending(SUPPLYDEPOT) < 2:
+        elif depots + self.ordered(SUPPLYDEPOT) < 2:
             # Rush to wall off base
             return 1
         elif self.game.supply_left < (5 * build_capacity):
-            return max(build_capacity - self.game.already_pending(SUPPLYDEPOT), 0)
+            return max(build_capacity - depots_pending, 0)
 
         return 0
 
     @property
     def _target_workers(self):
-        ideal = 1  # one for construction
-        for cc in self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]):
-            ideal += cc.ideal_harvesters
+        # One for construction, and the mining slots of finished bases and refineries
+        ideal = 1 + self.game.mining_manager.ideal_workers
         # Add pending command center units count
-        ideal += self.game.already_pending(COMMANDCENTER) * 8
-        # Add refinery counts
-        ideal += self.game.units(REFINERY).amount * 3
+        ideal += self.pending(COMMANDCENTER) * 8
+        # Add unfinished refinery counts
+        ideal += self.constructing[REFINERY] * 3
         return ideal
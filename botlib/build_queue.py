@@ -1,44 +1,121 @@
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Set
 
-from sc2.constants import COMMANDCENTER, SCV, SUPPLYDEPOT, BARRACKS, MARINE, \
-    REFINERY, FACTORY, HELLION, REAPER, ORBITALCOMMAND
+from sc2.constants import COMMANDCENTER, SUPPLYDEPOT
 from sc2.ids.unit_typeid import UnitTypeId
-from sc2.units import Units
 
 from .building_constructor import BuildingConstructor
+from .unit_events import UnitEvents, CREATED, DESTROYED, MORPHED
+from .unit_snapshot import COMMAND_CENTERS, SUPPLY_DEPOTS
+
+logger = logging.getLogger(__name__)
 
 
 class BuildStep:
+    # Steps for these types are also satisfied by what they morph into
     TYPE_LOOKUP = {
-        COMMANDCENTER: [COMMANDCENTER, ORBITALCOMMAND]
+        COMMANDCENTER: COMMAND_CENTERS,
+        SUPPLYDEPOT: SUPPLY_DEPOTS,
     }
 
     def __init__(self, unit_type: UnitTypeId, count: int) -> None:
         self.unit_type = unit_type
         self.count = count
-        print(unit_type, count)
+        logger.debug("Build step {} {}".format(unit_type.name, count))
 
-    def is_complete(self, units):
-        return units.of_type(BuildStep.TYPE_LOOKUP.get(self.unit_type, [self.unit_type])).amount >= self.count
+    @property
+    def counted_types(self) -> Iterable[UnitTypeId]:
+        return BuildStep.TYPE_LOOKUP.get(self.unit_type, (self.unit_type,))
 
     def update_build_target(self, building_constructor: BuildingConstructor):
         building_constructor.set_build_target(self.unit_type, self.count)
 
 
 class BuildQueue:
+    """ Works through the build order with a cursor on the first unfinished step
+
+    Unit counts are kept up to date from created, destroyed and morphed
+    events, so moving on is a counter comparison. Losing a unit moves the
+    cursor back to the first step its type no longer satisfies.
+    """
+
     def __init__(self) -> None:
-        self.build_steps = []
+        self.build_steps = []  # type: List[BuildStep]
+        self.cursor = 0
+        self.counts = Counter()  # type: Counter  # our units by type, under construction included
+
+        self._highest = {}  # type: Dict[UnitTypeId, int]
+        self._steps_of = {}  # type: Dict[UnitTypeId, List[int]]  # step type -> indexes of its steps
+        self._counts_of = {}  # type: Dict[UnitTypeId, List[int]]  # step type -> counts of those steps
+        self._step_types = {}  # type: Dict[UnitTypeId, Set[UnitTypeId]]  # unit type -> step types it counts for
+
+    @classmethod
+    def load(cls, path: str) -> "BuildQueue":
+        """ Reads a build order with one "UNIT_TYPE increment" step per line, # starts a comment """
+        queue = cls()
+        with open(path) as build_order:
+            for number, line in enumerate(build_order, start=1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    name, increment = line.split()
+                    queue.add_step(UnitTypeId[name.upper()], int(increment))
+                except (KeyError, ValueError):
+                    raise ValueError("{}:{}: expected a unit type and a count, got {!r}".format(path, number, line))
+        return queue
 
     # Adds increment to the number of desired unit_type
     def add_step(self, unit_type: UnitTypeId, increment: int):
-        count = 0
-        for build_step in self.build_steps:
-          if build_step.unit_type == unit_type:
-            count = build_step.count # Use highest count
-
-        self.build_steps.append(BuildStep(unit_type, count + increment))
-
-    async def on_step(self, units: Units, building_constructor: BuildingConstructor):
-        for step in self.build_steps:
-            if not step.is_complete(units):
-                step.update_build_target(building_constructor)
-                return
+        count = self._highest.get(unit_type, 0) + increment
+        self._highest[unit_type] = count
+
+        step = BuildStep(unit_type, count)
+        self._steps_of.setdefault(unit_type, []).append(len(self.build_steps))
+        self._counts_of.setdefault(unit_type, []).append(count)
+        for counted_type in step.counted_types:
+            self._step_types.setdefault(counted_type, set()).add(unit_type)
+        self.build_steps.append(step)
+
+    @property
+    def current_step(self):
+        return self.build_steps[self.cursor] if self.cursor < len(self.build_steps) else None
+
+    def amount(self, unit_type: UnitTypeId) -> int:
+        """ Units counting towards steps of the type """
+        return sum(self.counts[t] for t in BuildStep.TYPE_LOOKUP.get(unit_type, (unit_type,)))
+
+    def unit_created(self, unit_type: UnitTypeId):
+        self.counts[unit_type] += 1
+
+    def unit_destroyed(self, unit_type: UnitTypeId):
+        self.counts[unit_type] -= 1
+        self._rewind(unit_type)
+
+    def unit_morphed(self, previous_type: UnitTypeId, unit_type: UnitTypeId):
+        self.counts[previous_type] -= 1
+        self.counts[unit_type] += 1
+        self._rewind(previous_type)
+
+    def _rewind(self, lost_type: UnitTypeId):
+        for step_type in self._step_types.get(lost_type, ()):
+            amount = self.amount(step_type)
+            for index, count in zip(self._steps_of[step_type], self._counts_of[step_type]):
+                if index >= self.cursor:
+                    break
+                if count > amount:
+                    self.cursor = index
+                    break
+
+    def subscribe(self, events: UnitEvents):
+        events.subscribe(CREATED, lambda unit: self.unit_created(unit.type_id))
+        events.subscribe(DESTROYED, lambda tag, unit_type, was_ready: self.unit_destroyed(unit_type))
+        events.subscribe(MORPHED, lambda unit, previous_type: self.unit_morphed(previous_type, unit.type_id))
+
+    async def on_step(self, building_constructor: BuildingConstructor):
+        steps = self.build_steps
+        while self.cursor < len(steps) and self.amount(steps[self.cursor].unit_type) >= steps[self.cursor].count:
+            self.cursor += 1
+        if self.cursor < len(steps):
+            steps[self.cursor].update_build_target(building_constructor)
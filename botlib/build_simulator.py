@@ -0,0 +1,412 @@
+""" Forward simulation of the bot's economy and build order, many build orders at once
+
+The model follows what the bot does rather than what the game allows: the
+build queue's cursor sets one builder's target at a time, the builders run
+in BuildingConstructor's order with their own rules, command centers train
+SCVs up to BuildInfo's worker target, and every idle production structure
+trains what AlphaBot trains. Income is a per-worker rate with diminishing
+returns past two workers a patch, plus MULEs from orbital energy. Walking
+is a fixed delay before a structure is placed. Each build order is a
+column of the state arrays, so a tick is the same few NumPy operations
+whether one build order is simulated or ten thousand.
+"""
+import math
+import multiprocessing
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sc2.ids.unit_typeid import UnitTypeId
+
+from .build_queue import BuildQueue
+from .headless.game_data import LOOPS_PER_SECOND, UNITS
+
+# Structures the builders make, in the order BuildingConstructor runs them
+COMMANDCENTER, ORBITALCOMMAND, SUPPLYDEPOT, BARRACKS, FACTORY, REFINERY, STARPORT = range(7)
+KINDS = [UnitTypeId.COMMANDCENTER, UnitTypeId.ORBITALCOMMAND, UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS,
+         UnitTypeId.FACTORY, UnitTypeId.REFINERY, UnitTypeId.STARPORT]
+KIND_OF = {unit_type: kind for kind, unit_type in enumerate(KINDS)}
+
+PATCH_SLOTS = 16  # two workers on each of a base's eight patches
+OVERSATURATION = 8  # a third worker per patch still mines, at a lower rate
+MINERALS_PER_WORKER = 0.95  # per second, faster game speed
+MINERALS_PER_EXTRA_WORKER = 0.4
+GAS_PER_WORKER = 0.63
+REFINERY_WORKERS = 3
+MULE_MINERALS = 225
+MULE_SECONDS = 64
+MULE_ENERGY = 50
+ENERGY_PER_SECOND = 0.7875
+WALK_SECONDS = 4  # an SCV walking to a building spot in the main
+EXPAND_WALK_SECONDS = 12
+
+ORBITAL_UPGRADE = UNITS[UnitTypeId.ORBITALCOMMAND].minerals - UNITS[UnitTypeId.COMMANDCENTER].minerals
+
+
+def seconds(unit_type: UnitTypeId) -> float:
+    return UNITS[unit_type].build_time / LOOPS_PER_SECOND
+
+
+def floor_divide(values: np.ndarray, divisor: float, out: np.ndarray) -> np.ndarray:
+    """ values // divisor for non-negative values, into out, many times quicker than NumPy's float floor division """
+    np.divide(values, divisor, out=out)
+    np.floor(out, out=out)
+    # The division can round up onto the next whole number, which floor division never does
+    out -= out * divisor > values
+    return out
+
+
+def encode(queues: Sequence[BuildQueue]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ The queues' steps as padded (type, count) arrays and each queue's length """
+    width = max((len(queue.build_steps) for queue in queues), default=0)
+    types = np.zeros((len(queues), width), dtype=np.int32)
+    counts = np.zeros((len(queues), width), dtype=np.int32)
+    lengths = np.zeros(len(queues), dtype=np.int32)
+    for row, queue in enumerate(queues):
+        for column, step in enumerate(queue.build_steps):
+            if step.unit_type not in KIND_OF:
+                raise ValueError("The simulator has no builder for {}".format(step.unit_type.name))
+            types[row, column] = KIND_OF[step.unit_type]
+            counts[row, column] = step.count
+        lengths[row] = len(queue.build_steps)
+    return types, counts, lengths
+
+
+class SimulationResult:
+    """ Per build order milestones, in game seconds, nan when never reached """
+
+    def __init__(self, size: int, steps: int) -> None:
+        self.step_done = np.full((size, steps), np.nan)  # when the build queue moved past each step
+        self.first_done = np.full((size, len(KINDS)), np.nan)  # when the first of each structure finished
+        self.completed = np.full(size, np.nan)  # when the whole build order was satisfied
+        self.supply_blocked = np.zeros(size)  # seconds spent at the supply cap below 200
+        self.supply_blocks = np.zeros(size, dtype=np.int32)
+        self.workers = np.zeros(size, dtype=np.int32)
+        self.army_supply = np.zeros(size, dtype=np.int32)
+        self.minerals_mined = np.zeros(size)
+        self.gas_mined = np.zeros(size)
+
+    def __len__(self) -> int:
+        return len(self.completed)
+
+    @staticmethod
+    def concatenate(results: Sequence["SimulationResult"]) -> "SimulationResult":
+        merged = SimulationResult(0, 0)
+        for name in vars(merged):
+            setattr(merged, name, np.concatenate([getattr(result, name) for result in results]))
+        return merged
+
+    def summary(self, row: int) -> Dict:
+        return {
+            "completed": self.completed[row],
+            "supply_blocked": self.supply_blocked[row],
+            "supply_blocks": int(self.supply_blocks[row]),
+            "workers": int(self.workers[row]),
+            "army_supply": int(self.army_supply[row]),
+            "minerals_mined": self.minerals_mined[row],
+            "gas_mined": self.gas_mined[row],
+            "first_done": {unit_type.name: self.first_done[row, kind] for kind, unit_type in enumerate(KINDS)},
+        }
+
+
+class BuildOrderSimulator:
+    def __init__(self, duration: float = 360.0, tick: float = 1.0, workers: int = 12, minerals: float = 50.0) -> None:
+        self.duration = duration  # game seconds simulated
+        self.tick = tick
+        self.workers = workers
+        self.minerals = minerals
+
+        costs = [(UNITS[unit_type].minerals, UNITS[unit_type].vespene) for unit_type in KINDS]
+        costs[ORBITALCOMMAND] = (ORBITAL_UPGRADE, 0)
+        self.costs = costs
+        walks = [EXPAND_WALK_SECONDS if kind == COMMANDCENTER else 0 if kind == ORBITALCOMMAND else WALK_SECONDS
+                 for kind in range(len(KINDS))]
+        self.delays = [self._ticks(seconds(unit_type) + walk) for unit_type, walk in zip(KINDS, walks)]
+        self._production = [  # structure, unit, supply
+            (BARRACKS, UnitTypeId.MARINE, 1), (FACTORY, UnitTypeId.HELLION, 2), (STARPORT, UnitTypeId.MEDIVAC, 2)]
+
+    def _ticks(self, duration: float) -> int:
+        return max(int(math.ceil(duration / self.tick)), 1)
+
+    def simulate(self, queues: Sequence[BuildQueue]) -> SimulationResult:
+        return self.run(*encode(queues))
+
+    def run(self, types: np.ndarray, counts: np.ndarray, lengths: np.ndarray) -> SimulationResult:
+        size, width = types.shape
+        dt = self.tick
+        result = SimulationResult(size, width)
+        kinds = len(KINDS)
+
+        # Events are scheduled into a ring of ticks, long enough for the slowest of them
+        ring = max(self.delays + [self._ticks(MULE_SECONDS), self._ticks(seconds(UnitTypeId.MEDIVAC))]) + 1
+        finishing = np.zeros((ring, kinds, size), dtype=np.int16)  # structures
+        builders_back = np.zeros((ring, size), dtype=np.int16)
+        scvs_trained = np.zeros((ring, size), dtype=np.int16)
+        trained = np.zeros((ring, len(self._production), size), dtype=np.int16)
+        mules_gone = np.zeros((ring, size), dtype=np.int16)
+
+        minerals = np.full(size, float(self.minerals))
+        gas = np.zeros(size)
+        built = np.zeros((kinds, size), dtype=np.int32)  # placed, unfinished included, as the build queue counts
+        done = np.zeros((kinds, size), dtype=np.int32)
+        built[COMMANDCENTER] = done[COMMANDCENTER] = 1
+        targets = np.zeros((kinds, size), dtype=np.int32)
+        targets[COMMANDCENTER] = 1
+        morphing = np.zeros(size, dtype=np.int32)  # command centers becoming orbitals
+        scvs = np.full(size, self.workers, dtype=np.int32)
+        training = np.zeros(size, dtype=np.int32)  # SCVs in training
+        building = np.zeros(size, dtype=np.int32)  # SCVs away constructing
+        producing = np.zeros((len(self._production), size), dtype=np.int32)
+        army = np.zeros(size, dtype=np.int32)  # supply, in training included
+        medivacs = np.zeros(size, dtype=np.int32)
+        reaper = np.zeros(size, dtype=bool)
+        energy = np.zeros(size)
+        mules = np.zeros(size, dtype=np.int32)
+        cursor = np.zeros(size, dtype=np.int32)
+        blocked = np.zeros(size, dtype=bool)
+        padded_types = np.concatenate([types, np.zeros((size, 1), dtype=types.dtype)], axis=1)
+        padded_counts = np.concatenate([counts, np.zeros((size, 1), dtype=counts.dtype)], axis=1)
+        changed = np.ones(size, dtype=bool)  # structure counts changed, so the build queue may move on
+        first_done = np.full((kinds, size), np.nan)  # result.first_done by kind, for contiguous rows
+
+        # Scratch arrays the tick works in, so it doesn't allocate
+        income = np.zeros(size)
+        scratch = np.zeros(size)
+        supply_left = np.zeros(size, dtype=np.int32)
+        count = np.zeros(size, dtype=np.int32)
+        limit = np.zeros(size, dtype=np.int32)
+        go = np.zeros(size, dtype=bool)
+        scv_ticks = self._ticks(seconds(UnitTypeId.SCV))
+        reaper_ticks = self._ticks(seconds(UnitTypeId.REAPER))
+        mule_ticks = self._ticks(MULE_SECONDS)
+        production = [(index, structure, supply, UNITS[unit_type], self._ticks(seconds(unit_type)),
+                       unit_type == UnitTypeId.MEDIVAC)
+                      for index, (structure, unit_type, supply) in enumerate(self._production)]
+
+        for tick in range(int(self.duration / dt)):
+            now = tick * dt
+            slot = tick % ring
+
+            # Whatever finishes this tick
+            finished = finishing[slot]
+            if finished.any():
+                done += finished
+                morphed = finished[ORBITALCOMMAND]
+                if morphed.any():
+                    done[COMMANDCENTER] -= morphed
+                    built[COMMANDCENTER] -= morphed
+                    built[ORBITALCOMMAND] += morphed
+                    morphing -= morphed
+                    energy += MULE_ENERGY * morphed
+                    changed |= morphed > 0
+                first_done[(finished > 0) & np.isnan(first_done)] = now
+                finished[:] = 0
+            building -= builders_back[slot]
+            builders_back[slot] = 0
+            scvs += scvs_trained[slot]
+            training -= scvs_trained[slot]
+            scvs_trained[slot] = 0
+            producing -= trained[slot]
+            trained[slot] = 0
+            mules -= mules_gone[slot]
+            mules_gone[slot] = 0
+
+            # Income
+            bases = done[COMMANDCENTER] + done[ORBITALCOMMAND]
+            saturated = PATCH_SLOTS * bases
+            on_gas = np.minimum(scvs - building, REFINERY_WORKERS * done[REFINERY])
+            on_minerals = scvs - building
+            on_minerals -= on_gas
+            np.multiply(np.minimum(on_minerals, saturated), MINERALS_PER_WORKER, out=income)
+            on_minerals -= saturated
+            np.clip(on_minerals, 0, OVERSATURATION * bases, out=on_minerals)
+            income += np.multiply(on_minerals, MINERALS_PER_EXTRA_WORKER, out=scratch)
+            income += np.multiply(mules, MULE_MINERALS / MULE_SECONDS, out=scratch)
+            income *= dt
+            minerals += income
+            result.minerals_mined += income
+            np.multiply(on_gas, GAS_PER_WORKER, out=income)
+            income *= dt
+            gas += income
+            result.gas_mined += income
+
+            # Orbitals call down a MULE each as soon as they have the energy
+            orbitals = done[ORBITALCOMMAND]
+            if orbitals.any():
+                energy += np.multiply(orbitals, ENERGY_PER_SECOND * dt, out=scratch)
+                floor_divide(energy, MULE_ENERGY, scratch)
+                calls = np.minimum(scratch, orbitals).astype(np.int32)
+                energy -= np.multiply(calls, MULE_ENERGY, out=scratch)
+                mules += calls
+                mules_gone[(tick + mule_ticks) % ring] += calls.astype(np.int16)
+
+            # The build queue moves past satisfied steps, the first unsatisfied one sets its builder's target.
+            # Only the build orders whose structure counts changed since the last tick can move on
+            checked = np.flatnonzero(changed)
+            candidates = checked
+            while len(candidates):
+                at = cursor[candidates]
+                step_type = padded_types[candidates, at]
+                amount = built[step_type, candidates]
+                amount += np.where(step_type == COMMANDCENTER, built[ORBITALCOMMAND, candidates], 0)
+                moving = (at < lengths[candidates]) & (amount >= padded_counts[candidates, at])
+                candidates = candidates[moving]
+                result.step_done[candidates, at[moving]] = now
+                cursor[candidates] += 1
+            if len(checked):
+                at = cursor[checked]
+                active = at < lengths[checked]
+                following = checked[active]
+                targets[padded_types[following, at[active]], following] = padded_counts[following, at[active]]
+                through = checked[~active]
+                result.completed[through[np.isnan(result.completed[through])]] = now
+                changed[:] = False
+
+            supply_cap = np.minimum(15 * bases + 8 * done[SUPPLYDEPOT], 200)
+            supply_used = scvs + training
+            supply_used += army
+
+            # Builders, one order each a tick
+            for kind in range(kinds):
+                mineral_cost, gas_cost = self.costs[kind]
+                np.greater_equal(minerals, mineral_cost, out=go)
+                if gas_cost:
+                    go &= gas >= gas_cost
+                if kind == SUPPLYDEPOT:
+                    under_construction = built[SUPPLYDEPOT] - done[SUPPLYDEPOT]
+                    go &= (supply_cap - supply_used < 5) | (built[SUPPLYDEPOT] == 0) | (supply_cap > 50)
+                    go &= (under_construction < np.where(supply_cap > 100, 2, 1)) & (supply_cap < 200)
+                elif kind == ORBITALCOMMAND:
+                    go &= (targets[kind] > built[kind] + morphing) & (done[BARRACKS] > 0)
+                    go &= np.minimum(bases - training - morphing, done[COMMANDCENTER] - morphing) > 0
+                else:
+                    go &= targets[kind] > built[kind]
+                    if kind == BARRACKS:
+                        go &= done[SUPPLYDEPOT] > 0
+                    elif kind == FACTORY:
+                        go &= done[BARRACKS] > 0
+                    elif kind == STARPORT:
+                        go &= done[FACTORY] > 0
+                    elif kind == REFINERY:
+                        go &= built[REFINERY] < 2 * bases
+                if not go.any():
+                    continue
+                minerals -= np.multiply(go, mineral_cost, out=scratch)
+                if gas_cost:
+                    gas -= np.multiply(go, gas_cost, out=scratch)
+                finishing[(tick + self.delays[kind]) % ring, kind] += go
+                if kind == ORBITALCOMMAND:
+                    morphing += go
+                else:
+                    built[kind] += go
+                    building += go
+                    builders_back[(tick + self.delays[kind]) % ring] += go
+                    changed |= go
+
+            # Command centers train SCVs up to BuildInfo's target
+            np.subtract(supply_cap, supply_used, out=supply_left)
+            train = REFINERY_WORKERS * done[REFINERY]
+            train += PATCH_SLOTS * bases + 1
+            train += 8 * (built[COMMANDCENTER] - done[COMMANDCENTER])
+            train += REFINERY_WORKERS * (built[REFINERY] - done[REFINERY])
+            train -= scvs
+            train -= training
+            np.minimum(train, bases - training - morphing, out=train)
+            floor_divide(minerals, 50, scratch)
+            np.minimum(train, scratch, out=train, casting="unsafe")
+            np.minimum(train, supply_left, out=train)
+            np.maximum(train, 0, out=train)
+            if train.any():
+                minerals -= np.multiply(train, 50, out=scratch)
+                training += train
+                supply_left -= train
+                scvs_trained[(tick + scv_ticks) % ring] += train.astype(np.int16)
+
+            # A reaper first, then every idle production structure trains
+            first_reaper = (done[BARRACKS] > producing[0]) & (minerals >= 50) & (gas >= 50) & (supply_left >= 1)
+            first_reaper &= ~reaper
+            if first_reaper.any():
+                reaper |= first_reaper
+                minerals -= np.multiply(first_reaper, 50, out=scratch)
+                gas -= np.multiply(first_reaper, 50, out=scratch)
+                army += first_reaper
+                supply_left -= first_reaper
+                producing[0] += first_reaper
+                trained[(tick + reaper_ticks) % ring, 0] += first_reaper
+            for index, structure, supply, data, ticks, is_medivac in production:
+                np.subtract(done[structure], producing[index], out=count)
+                np.minimum(count, np.floor_divide(supply_left, supply, out=limit), out=count)
+                floor_divide(minerals, data.minerals, scratch)
+                np.minimum(count, scratch, out=count, casting="unsafe")
+                if data.vespene:
+                    floor_divide(gas, data.vespene, scratch)
+                    np.minimum(count, scratch, out=count, casting="unsafe")
+                if is_medivac:
+                    np.minimum(count, np.minimum(5 - medivacs, 1), out=count)
+                np.maximum(count, 0, out=count)
+                if not count.any():
+                    continue
+                minerals -= np.multiply(count, data.minerals, out=scratch)
+                gas -= np.multiply(count, data.vespene, out=scratch)
+                army += supply * count
+                supply_left -= supply * count
+                producing[index] += count
+                if is_medivac:
+                    medivacs += count
+                trained[(tick + ticks) % ring, index] += count.astype(np.int16)
+
+            at_cap = (scvs + training + army >= supply_cap) & (supply_cap < 200)
+            result.supply_blocked += at_cap * dt
+            result.supply_blocks += at_cap & ~blocked
+            blocked = at_cap
+
+        result.first_done = first_done.T.copy()
+        result.workers = scvs + training
+        result.army_supply = army
+        return result
+
+
+def _run_chunk(job) -> SimulationResult:
+    simulator, types, counts, lengths = job
+    return simulator.run(types, counts, lengths)
+
+
+def run_parallel(simulator: BuildOrderSimulator, types: np.ndarray, counts: np.ndarray, lengths: np.ndarray,
+                 jobs: Optional[int] = None, chunk: Optional[int] = None) -> SimulationResult:
+    """ Splits the build orders into chunks simulated on a process pool
+
+    Every tick costs the same Python overhead however many build orders it
+    steps, so by default each process gets one chunk as wide as it can be.
+    """
+    if chunk is None:
+        chunk = max(math.ceil(len(types) / (jobs or multiprocessing.cpu_count())), 1)
+    chunks = [(simulator, types[i:i + chunk], counts[i:i + chunk], lengths[i:i + chunk])
+              for i in range(0, len(types), chunk)]
+    with multiprocessing.Pool(jobs) as pool:
+        return SimulationResult.concatenate(pool.map(_run_chunk, chunks))
+
+
+def variants(queue: BuildQueue, count: int, rng: np.random.RandomState) -> List[BuildQueue]:
+    """ Build orders a step swap, removal or copy away from the queue, for searching around it """
+    steps = [(step.unit_type, step.count) for step in queue.build_steps]
+    # Back to the increments the queue was made from
+    increments, highest = [], {}  # type: List[Tuple[UnitTypeId, int]], Dict[UnitTypeId, int]
+    for unit_type, total in steps:
+        increments.append((unit_type, total - highest.get(unit_type, 0)))
+        highest[unit_type] = total
+
+    found = []
+    for _ in range(count):
+        changed = list(increments)
+        position = rng.randint(len(changed))
+        change = rng.randint(3)
+        if change == 0 and position + 1 < len(changed):
+            changed[position], changed[position + 1] = changed[position + 1], changed[position]
+        elif change == 1 and len(changed) > 1:
+            del changed[position]
+        else:
+            changed.insert(rng.randint(len(changed) + 1), changed[position])
+        variant = BuildQueue()
+        for unit_type, increment in changed:
+            variant.add_step(unit_type, increment)
+        found.append(variant)
+    return found
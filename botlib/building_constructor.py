@@ -9,6 +9,8 @@ from sc2.unit import Unit
 
 from .structure_builder import RefineryBuilder, SupplyDepotBuilder, CommandCenterBuilder, \
     BarracksBuilder, FactoryBuilder, OrbitalCommandBuilder, StarportBuilder
+from .unit_events import UnitEvents
+from .unit_snapshot import COMMAND_CENTERS
 
 
 class BuildingConstructor:
@@ -25,8 +27,12 @@ class BuildingConstructor:
             STARPORT: StarportBuilder(game)
         }
 
+    def subscribe(self, events: UnitEvents):
+        for builder in self.builders.values():
+            builder.subscribe(events)
+
     async def on_step(self, iteration):
-        if not self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]):
+        if not self.game.snapshot.amount(COMMAND_CENTERS):
             await self.rebuild_command_center()
             return  # There is no more build priority
 
@@ -35,7 +41,7 @@ class BuildingConstructor:
 
     async def rebuild_command_center(self):
         # Probably screwed at this point, but might as well keep things going
-        if not self.game.already_pending(COMMANDCENTER) and self.game.can_afford(COMMANDCENTER):
+        if not self.game.snapshot.pending(COMMANDCENTER) and self.game.can_afford(COMMANDCENTER):
             await self.game.build(COMMANDCENTER, self.game.start_location, max_distance=0, random_alternative=False)
 
     def set_build_target(self, unit_type: UnitTypeId, target: int):
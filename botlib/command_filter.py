@@ -0,0 +1,111 @@
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import sc2
+from sc2.ids.ability_id import AbilityId
+from sc2.position import Point2
+
+logger = logging.getLogger(__name__)
+
+REPEAT_LOOPS = 22  # a command repeated within a second is dropped, the game may not show the first one yet
+POSITION_TOLERANCE = 0.5  # targets closer than this are the same target
+
+
+class CommandFilter:
+    """ Drops commands that would not change what a unit is doing
+
+    A command is dropped when the unit's current order already has the same
+    ability and target, or when the same command went to the unit in the
+    last REPEAT_LOOPS game loops, which covers the steps before the game
+    reports the order (a depot still lowering, an orbital whose energy is
+    not spent yet). Commands that queue up units are only checked against
+    what was sent, another one in the queue is never redundant.
+    """
+
+    def __init__(self, game: sc2.BotAI, repeat_loops: int = REPEAT_LOOPS) -> None:
+        self.game = game
+        self.repeat_loops = repeat_loops
+
+        self._sent = {}  # type: Dict[int, Tuple[Tuple, int]]
+        self._generic = {}  # type: Dict[int, int]
+        self._producing = None  # type: Optional[Set[int]]
+
+        # Running totals, per ability, to confirm the filter is doing its job
+        self.admitted = 0
+        self.suppressed = {}  # type: Dict[AbilityId, int]
+
+    def generic(self, ability_id: int) -> int:
+        """ The ability orders report, MOVE_MOVE for MOVE, as the command's """
+        generic = self._generic.get(ability_id)
+        if generic is None:
+            data = self.game._game_data.abilities.get(ability_id)
+            generic = self._generic[ability_id] = data.id.value if data else ability_id
+        return generic
+
+    def producing(self, ability_id: int) -> bool:
+        if self._producing is None:
+            self._producing = {self.generic(data.creation_ability.id.value)
+                               for data in self.game._game_data.units.values() if data.creation_ability}
+        return self.generic(ability_id) in self._producing
+
+    @staticmethod
+    def same_target(target, order_target) -> bool:
+        if target is None:
+            return not order_target
+        if isinstance(target, Point2):
+            if isinstance(order_target, int):
+                return False
+            dx, dy = target.x - order_target.x, target.y - order_target.y
+            return dx * dx + dy * dy < POSITION_TOLERANCE * POSITION_TOLERANCE
+        return target.tag == order_target
+
+    def key(self, action) -> Tuple:
+        target = action.target
+        if isinstance(target, Point2):
+            # Rounded to the tolerance, so the same spot asked for twice compares equal
+            target = (round(target.x / POSITION_TOLERANCE), round(target.y / POSITION_TOLERANCE))
+        elif target is not None:
+            target = target.tag
+        return (self.generic(action.ability.value), target, action.queue)
+
+    def redundant(self, action) -> bool:
+        unit = action.unit
+        key = self.key(action)
+        loop = self.game.state.game_loop
+        sent = self._sent.get(unit.tag)
+        if sent and sent[0] == key and loop - sent[1] <= self.repeat_loops:
+            return True
+
+        if action.queue or not unit.orders or self.producing(action.ability.value):
+            return False
+        order = unit.orders[0]
+        return order.ability.id.value == key[0] and self.same_target(action.target, order.target)
+
+    def admit(self, action) -> bool:
+        """ Whether to send the action, counting the ones dropped """
+        if self.redundant(action):
+            self.suppressed[action.ability] = self.suppressed.get(action.ability, 0) + 1
+            return False
+
+        self.admitted += 1
+        self._sent[action.unit.tag] = (self.key(action), self.game.state.game_loop)
+        return True
+
+    def forget(self):
+        """ Drops what was sent longer ago than the repeat window, call once a step """
+        oldest = self.game.state.game_loop - self.repeat_loops
+        self._sent = {tag: sent for tag, sent in self._sent.items() if sent[1] >= oldest}
+
+    def summary(self) -> Dict:
+        return {
+            "admitted": self.admitted,
+            "suppressed": {ability.name: count for ability, count in sorted(
+                self.suppressed.items(), key=lambda item: -item[1])},
+        }
+
+    def report(self) -> str:
+        suppressed = sum(self.suppressed.values())
+        lines = ["{} commands sent, {} dropped as redundant".format(self.admitted, suppressed)]
+        for name, count in self.summary()["suppressed"].items():
+            lines.append("{:<40} {:>8}".format(name, count))
+        return "\n".join(lines)
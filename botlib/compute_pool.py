@@ -0,0 +1,181 @@
+import concurrent.futures
+import logging
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+import sc2
+
+from .step_profiler import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    __slots__ = ("key", "future", "on_done", "expires", "submitted_loop", "submitted_at", "done", "value")
+
+    def __init__(self, key: Hashable, on_done: Optional[Callable], expires: Optional[int], submitted_loop: int) -> None:
+        self.key = key
+        self.future = None  # type: Optional[concurrent.futures.Future]
+        self.on_done = on_done
+        self.expires = expires  # game loop after which the result is no use, None to keep it however late
+        self.submitted_loop = submitted_loop
+        self.submitted_at = time.perf_counter()
+        self.done = False
+        self.value = None
+
+
+class ComputePool:
+    """ Runs CPU heavy functions off the game loop, handing the results back on a later step
+
+    Functions are submitted under a key, such as ("pathing", target), with
+    their arguments: arrays taken from the step's snapshot which nothing
+    changes in place afterwards, so the worker can read them while the bot
+    carries on. Submitting under a key which is still pending supersedes the
+    older job, which is cancelled or, if it already started, has its result
+    dropped. poll runs once a step, before any service, and calls each
+    finished job's on_done with the result on the game loop.
+
+    With no workers jobs run inline on submit, as the bot did before. Threads
+    suit NumPy work which releases the GIL, processes suit pure Python work
+    but need picklable module level functions and arguments. Once
+    max_pending jobs are in flight submit turns jobs away and returns None,
+    the caller carries on with what it has and tries again later.
+    """
+
+    def __init__(self, game: sc2.BotAI, workers: int = 0, processes: bool = False, max_pending: int = 8) -> None:
+        self.game = game
+        self.workers = workers
+        self.processes = processes
+        self.max_pending = max_pending
+
+        self.latency = Histogram()  # seconds from submit to the result being handed back
+        self.latency_loops = Histogram(smallest=1.0, largest=1e5)  # game loops from submit to the result
+        self.run_time = Histogram()  # seconds spent by the function itself
+        self.submitted = 0
+        self.completed = 0
+        self.superseded = 0
+        self.expired = 0
+        self.rejected = 0
+        self.failed = 0
+
+        self._pending = {}  # type: Dict[Hashable, Job]
+        self._executor = None  # type: Optional[concurrent.futures.Executor]
+
+    def _loop(self) -> int:
+        state = self.game.state
+        return state.game_loop if state else 0
+
+    def submit(self, key: Hashable, function: Callable, *args, on_done: Optional[Callable] = None,
+               expires: Optional[int] = None) -> Optional[Job]:
+        """ Runs function(*args) in the pool, on_done(result) is called from a later poll
+
+        expires is a number of game loops, a result arriving later than that
+        is dropped. Returns None when the pool is full.
+        """
+        previous = self._pending.get(key)
+        if previous is None and len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return None
+        if previous is not None:
+            self.cancel(key)
+            self.superseded += 1
+
+        loop = self._loop()
+        job = Job(key, on_done, loop + expires if expires is not None else None, loop)
+        self.submitted += 1
+        if not self.workers:
+            start = time.perf_counter()
+            job.value = function(*args)
+            self.run_time.record(time.perf_counter() - start)
+            self._finish(job)
+            return job
+
+        if self._executor is None:
+            if self.processes:
+                self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="compute")
+        job.future = self._executor.submit(timed, function, *args)
+        self._pending[key] = job
+        return job
+
+    def pending(self, key: Hashable) -> Optional[Job]:
+        return self._pending.get(key)
+
+    def cancel(self, key: Hashable):
+        """ Drops the job pending under key, its result is never handed back """
+        job = self._pending.pop(key, None)
+        if job is not None:
+            job.future.cancel()
+
+    def poll(self):
+        """ Hands back the results which are ready, call once a step before the services run """
+        if not self._pending:
+            return
+        loop = self._loop()
+        finished = [job for job in self._pending.values() if job.future.done()]
+        for job in finished:
+            del self._pending[job.key]
+            try:
+                job.value, run_time = job.future.result()
+            except Exception:
+                self.failed += 1
+                logger.exception("Compute job {!r} failed".format(job.key))
+                continue
+            self.run_time.record(run_time)
+            if job.expires is not None and loop > job.expires:
+                self.expired += 1
+                continue
+            self._finish(job)
+
+    def _finish(self, job: Job):
+        job.done = True
+        self.completed += 1
+        self.latency.record(time.perf_counter() - job.submitted_at)
+        self.latency_loops.record(self._loop() - job.submitted_loop)
+        if job.on_done is not None:
+            job.on_done(job.value)
+
+    def close(self):
+        """ Stops the workers, dropping whatever is still pending """
+        # Cancelling here keeps queued jobs from starting, shutdown only cancels them itself from 3.9
+        for key in list(self._pending):
+            self.cancel(key)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def summary(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "processes": self.processes,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "mean_run_ms": self.run_time.mean * 1000,
+            "mean_latency_ms": self.latency.mean * 1000,
+            "p99_latency_ms": self.latency.percentile(99) * 1000,
+            "mean_latency_loops": self.latency_loops.mean,
+            "max_latency_loops": self.latency_loops.largest,
+        }
+
+    def report(self) -> str:
+        summary = self.summary()
+        return ("{} jobs on {} {}, {} completed, {} superseded, {} expired, {} turned away, {} failed; "
+                "{:.1f}ms to run, {:.1f}ms (p99 {:.1f}ms, {:.1f} game loops) until handed back".format(
+                    summary["submitted"], summary["workers"] or "no",
+                    "processes" if summary["processes"] else "threads", summary["completed"],
+                    summary["superseded"], summary["expired"], summary["rejected"], summary["failed"],
+                    summary["mean_run_ms"], summary["mean_latency_ms"], summary["p99_latency_ms"],
+                    summary["mean_latency_loops"]))
+
+
+def timed(function: Callable, *args) -> tuple:
+    """ Runs in the worker, returning the result and how long it took """
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
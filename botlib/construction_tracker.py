@@ -0,0 +1,146 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+import sc2
+from sc2.constants import SCV
+from sc2.position import Point2
+from sc2.unit import Unit
+
+from .spatial_index import SpatialIndex
+
+
+ASSIGNED = ("assigned",)
+
+
+def position_key(position: Point2) -> Tuple[float, float]:
+    return (round(position.x, 1), round(position.y, 1))
+
+
+class ConstructionTracker:
+    """ Tracks which SCV is building each of our unfinished structures
+
+    SCVs are only looked at again when their first order changes, or while
+    they are walking to a build site that has not been placed yet. Refineries
+    are matched through the geyser the SCV was sent to.
+    """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+
+        self.builders = {}  # type: Dict[int, int]  # structure tag -> scv tag
+        self._building = {}  # type: Dict[int, int]  # scv tag -> structure tag
+        self._orders = {}  # type: Dict[int, Tuple]  # scv tag -> first order last seen
+        self._walking = set()  # type: Set[int]  # scvs with a build order but no structure yet
+
+        self._structures = {}  # type: Dict[int, Unit]
+        self._structure_at = {}  # type: Dict[Tuple[float, float], int]
+
+    async def on_step(self, iteration):
+        self.update()
+
+    def update(self):
+        self._structures = {s.tag: s for s in self.game.snapshot.under_construction}
+        self._structure_at = {position_key(s.position): s.tag for s in self._structures.values()}
+
+        # Finished or destroyed structures no longer need a builder
+        for structure_tag in [tag for tag in self.builders if tag not in self._structures]:
+            self._unlink(self.builders[structure_tag])
+
+        scvs = self.game.snapshot.of_type(SCV)
+        scv_tags = set()
+        for scv in scvs:
+            scv_tags.add(scv.tag)
+            order = (scv.orders[0].ability.id, scv.order_target) if scv.orders else None
+            if self._orders.get(scv.tag) == order and scv.tag not in self._walking:
+                continue
+            self._orders[scv.tag] = order
+            self._assign_from_order(scv)
+
+        # Forget SCVs which have died
+        for scv_tag in [tag for tag in self._orders if tag not in scv_tags]:
+            del self._orders[scv_tag]
+            self._walking.discard(scv_tag)
+            self._unlink(scv_tag)
+
+    def abandoned(self) -> List[Unit]:
+        """ Unfinished structures without an SCV working on them """
+        return [s for tag, s in self._structures.items()
+                if tag not in self.builders and s.health < s.health_max]
+
+    def replacement_builders(self) -> List[Tuple[Unit, Unit]]:
+        """ Picks the nearest free SCV for each abandoned structure, idle SCVs first """
+        abandoned = self.abandoned()
+        if not abandoned:
+            return []
+
+        snapshot = self.game.snapshot
+        busy = set(self._building)
+        idle = snapshot.idle(SCV).filter(lambda s: s.tag not in busy)
+        empty_handed = snapshot.of_type(SCV).filter(
+            lambda s: s.tag not in busy and not s.is_carrying_vespene and not s.is_carrying_minerals)
+
+        pairs = []
+        chosen = set()
+        for candidates in (idle, empty_handed):
+            if not abandoned or not candidates:
+                continue
+            index = SpatialIndex(candidates)
+            waiting = []
+            for structure in abandoned:
+                scv = index.closest_to(structure.position, predicate=lambda s: s.tag not in chosen)
+                if scv is None:
+                    waiting.append(structure)
+                    continue
+                chosen.add(scv.tag)
+                pairs.append((structure, scv))
+            abandoned = waiting
+        return pairs
+
+    def assign(self, structure: Unit, scv: Unit) -> None:
+        """ Records a builder straight away, its order is only visible next step """
+        self._unlink(scv.tag)
+        self._link(structure.tag, scv.tag)
+        # Never matches a real order, so the SCV is checked again next step
+        self._orders[scv.tag] = ASSIGNED
+
+    def _assign_from_order(self, scv: Unit):
+        structure_tag = self._resolve(scv)
+        if structure_tag == self._building.get(scv.tag):
+            return
+        self._unlink(scv.tag)
+        if structure_tag is not None:
+            self._link(structure_tag, scv.tag)
+
+    def _resolve(self, scv: Unit) -> Optional[int]:
+        self._walking.discard(scv.tag)
+        target = scv.order_target
+        if target is None:
+            return None
+
+        if isinstance(target, Point2):
+            # Construction orders target the middle of the footprint
+            if not scv.is_constructing_scv:
+                return None
+            structure_tag = self._structure_at.get(position_key(target))
+        elif target in self._structures:
+            # Resuming with SMART or repair targets the structure itself
+            structure_tag = target
+        elif scv.is_constructing_scv:
+            # Refineries are ordered on the geyser, which sits where the refinery will be
+            geyser = self.game.resource_index.unit(target)
+            structure_tag = self._structure_at.get(position_key(geyser.position)) if geyser else None
+        else:
+            return None
+
+        if structure_tag is None:
+            self._walking.add(scv.tag)
+        return structure_tag
+
+    def _link(self, structure_tag: int, scv_tag: int) -> None:
+        self.builders[structure_tag] = scv_tag
+        self._building[scv_tag] = structure_tag
+
+    def _unlink(self, scv_tag: int) -> None:
+        structure_tag = self._building.pop(scv_tag, None)
+        # Another SCV may have taken over the structure since
+        if structure_tag is not None and self.builders.get(structure_tag) == scv_tag:
+            del self.builders[structure_tag]
@@ -0,0 +1,149 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import sc2
+from sc2.position import Point2
+from sc2.units import Units
+
+ARMY_MEMORY_LOOPS = 22 * 60  # army units not seen for a minute have moved on, structures stay until seen gone
+
+
+def positions_of(units: Units) -> np.ndarray:
+    """ The units' positions as (x, y) rows """
+    positions = np.empty((len(units), 2))
+    for i, unit in enumerate(units):
+        position = unit.position
+        positions[i] = position.x, position.y
+    return positions
+
+
+class EnemyMemory:
+    """ Every enemy unit seen, as NumPy columns with a row per unit
+
+    Rows are found by tag and written in place each step, and the rows of
+    units which died or were forgotten are reused. Army units are forgotten
+    once not seen for forget_loops, and anything whose last position we can
+    see again without it being there. Queries work on whole columns, so
+    asking about every depot or the whole remembered army is a few array
+    operations.
+    """
+
+    def __init__(self, game: sc2.BotAI, capacity: int = 256, forget_loops: int = ARMY_MEMORY_LOOPS) -> None:
+        self.game = game
+        self.forget_loops = forget_loops
+
+        self.tags = np.zeros(capacity, dtype=np.uint64)
+        self.types = np.zeros(capacity, dtype=np.int32)  # UnitTypeId values
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.health = np.zeros(capacity, dtype=np.float32)  # health and shields
+        self.dps = np.zeros(capacity, dtype=np.float32)  # the better of its ground and air weapons
+        self.range = np.zeros(capacity, dtype=np.float32)
+        self.last_seen = np.zeros(capacity, dtype=np.int32)  # game loop
+        self.structure = np.zeros(capacity, dtype=bool)
+        self.used = np.zeros(capacity, dtype=bool)
+
+        self._rows = {}  # type: Dict[int, int]  # tag -> row
+        self._free = list(range(capacity - 1, -1, -1))  # type: List[int]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def row(self, tag: int) -> Optional[int]:
+        return self._rows.get(tag)
+
+    def _row(self, tag: int) -> int:
+        row = self._rows.get(tag)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._rows[tag] = row
+            self.tags[row] = tag
+            self.used[row] = True
+        return row
+
+    def _grow(self):
+        capacity = len(self.tags)
+        for name in ("tags", "types", "x", "y", "health", "dps", "range", "last_seen", "structure", "used"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+        self._free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def _forget(self, rows: Iterable[int]):
+        for row in rows:
+            del self._rows[int(self.tags[row])]
+            self.used[row] = False
+            self._free.append(row)
+
+    def update(self, dead_tags: Iterable[int] = ()):
+        """ Writes this step's sightings, then forgets the dead and whatever has moved on """
+        loop = self.game.state.game_loop
+        self._forget([self._rows[tag] for tag in dead_tags if tag in self._rows])
+
+        # Snapshots of structures in the fog are what we saw last, not a new sighting
+        seen = [unit for unit in self.game.known_enemy_units if not unit.is_snapshot]
+        if seen:
+            count = len(seen)
+            rows = np.fromiter((self._row(unit.tag) for unit in seen), dtype=np.int64, count=count)
+            positions = [unit.position for unit in seen]
+            self.x[rows] = np.fromiter((position.x for position in positions), dtype=np.float32, count=count)
+            self.y[rows] = np.fromiter((position.y for position in positions), dtype=np.float32, count=count)
+            self.types[rows] = np.fromiter((unit.type_id.value for unit in seen), dtype=np.int32, count=count)
+            self.health[rows] = np.fromiter((unit.health + unit.shield for unit in seen), dtype=np.float32, count=count)
+            self.dps[rows] = np.fromiter((max(unit.ground_dps, unit.air_dps) for unit in seen), dtype=np.float32,
+                                         count=count)
+            self.range[rows] = np.fromiter((max(unit.ground_range, unit.air_range) for unit in seen), dtype=np.float32,
+                                           count=count)
+            self.structure[rows] = np.fromiter((unit.is_structure for unit in seen), dtype=bool, count=count)
+            self.last_seen[rows] = loop
+
+        unseen = self.used & (self.last_seen < loop)
+        if not unseen.any():
+            return
+        stale = unseen & ~self.structure & (loop - self.last_seen > self.forget_loops)
+        visibility = self.game.state.visibility.data_numpy
+        if visibility.size:
+            rows = np.flatnonzero(unseen)
+            height, width = visibility.shape
+            ys = np.clip(self.y[rows].astype(np.int32), 0, height - 1)
+            xs = np.clip(self.x[rows].astype(np.int32), 0, width - 1)
+            stale[rows[visibility[ys, xs] == 2]] = True
+        self._forget(np.flatnonzero(stale).tolist())
+
+    def _army(self, max_age: Optional[int]) -> np.ndarray:
+        army = self.used & ~self.structure
+        if max_age is not None:
+            army &= self.last_seen >= self.game.state.game_loop - max_age
+        return army
+
+    def army(self, max_age: Optional[int] = None) -> np.ndarray:
+        """ Rows of the army units remembered, seen at most max_age loops ago """
+        return np.flatnonzero(self._army(max_age))
+
+    def army_within(self, position: Point2, radius: float, max_age: Optional[int] = None) -> np.ndarray:
+        """ Rows of the army units remembered within radius of the position, seen at most max_age loops ago """
+        army = self._army(max_age)
+        army &= (self.x - position.x) ** 2 + (self.y - position.y) ** 2 < radius * radius
+        return np.flatnonzero(army)
+
+    def threatened(self, positions: np.ndarray, radius: float, max_age: Optional[int] = None) -> np.ndarray:
+        """ For each (x, y) row of positions, whether a remembered army unit is within radius """
+        rows = np.flatnonzero(self._army(max_age))
+        if not len(rows) or not len(positions):
+            return np.zeros(len(positions), dtype=bool)
+        dx = positions[:, 0, None] - self.x[rows]
+        dy = positions[:, 1, None] - self.y[rows]
+        return (dx * dx + dy * dy < radius * radius).any(axis=1)
+
+    def structures(self) -> List[Point2]:
+        """ Where the enemy structures were when last seen """
+        rows = np.flatnonzero(self.used & self.structure)
+        return [Point2((float(x), float(y))) for x, y in zip(self.x[rows], self.y[rows])]
+
+    def closest_structure(self, position: Point2) -> Optional[Point2]:
+        rows = np.flatnonzero(self.used & self.structure)
+        if not len(rows):
+            return None
+        row = rows[((self.x[rows] - position.x) ** 2 + (self.y[rows] - position.y) ** 2).argmin()]
+        return Point2((float(self.x[row]), float(self.y[row])))
@@ -0,0 +1,174 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import sc2
+from sc2.units import Units
+
+from .enemy_memory import ARMY_MEMORY_LOOPS, positions_of
+
+# What the army should do about the enemy army
+ENGAGE = "engage"
+HOLD = "hold"  # fight what comes into reach, but don't go looking for it
+RETREAT = "retreat"
+
+CLOSING_SPEED = 3.15  # cells per second a unit walks into range at, a marine's
+MEDIVAC_HEAL_RATE = 12.6  # health per second one medivac restores
+
+
+def simulate_engagements(our_hp: np.ndarray, our_dps: np.ndarray, our_range: np.ndarray,
+                         members: np.ndarray, arrival: np.ndarray,
+                         their_hp: np.ndarray, their_dps: np.ndarray, their_range: np.ndarray,
+                         their_arrival: Optional[np.ndarray] = None, healing: Optional[np.ndarray] = None,
+                         duration: float = 20.0, step: float = 0.5,
+                         speed: float = CLOSING_SPEED) -> Tuple[np.ndarray, np.ndarray]:
+    """ Plays many fights between subsets of our army and the enemy's at once, returns what each side has left
+
+    Our units are given once, (N,) rows, and each candidate engagement picks
+    some of them with a row of members and says when each one gets to the
+    fight with a row of arrival seconds, both (C, N). The enemy's units are
+    the same for every candidate. healing is the health per second our
+    medivacs restore in each candidate.
+
+    Each side is a pool of health dealing damage in proportion to what is
+    left of it, a discrete Lanchester square law, stepped step seconds at a
+    time. A unit adds its health to the pool when it arrives, and its damage
+    once it has walked into range of the longest ranged enemy, so the side
+    out-ranging the other gets shots in for free. Returns the fraction of
+    each side's health left standing after duration seconds, (C,) each.
+    """
+    candidates = len(members)
+    ticks = int(np.ceil(duration / step))
+    if their_arrival is None:
+        their_arrival = np.zeros(len(their_hp))
+
+    # Reaching the fight and walking into range, as the tick each happens on (ticks is never)
+    their_reach = their_range.max() if len(their_range) else 0.0
+    our_closing = np.maximum(their_reach - our_range, 0) / speed
+    joins = np.ceil(arrival / step)
+    joins[~members] = ticks
+    fires = np.ceil((arrival + our_closing) / step)
+    fires[~members] = ticks
+    our_reach = (our_range * members).max(axis=1) if members.shape[1] else np.zeros(candidates)
+    their_fires = np.maximum(our_reach[:, None] - their_range, 0) / speed
+    their_fires += their_arrival
+    their_fires /= step
+    np.ceil(their_fires, out=their_fires)
+
+    def per_tick(tick: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """ Sums values by candidate and tick into (ticks + 1, C) """
+        index = np.minimum(tick, ticks, out=tick).astype(np.int64)
+        index *= candidates
+        index += np.arange(candidates)[:, None]
+        weights = np.broadcast_to(values, index.shape).ravel()
+        return np.bincount(index.ravel(), weights, (ticks + 1) * candidates).reshape(ticks + 1, candidates)
+
+    our_joining = per_tick(joins, our_hp)
+    our_total = np.cumsum(our_joining, axis=0)
+    # The enemy is the same in every candidate, only when it starts shooting depends on our range
+    their_joins = np.minimum(np.ceil(their_arrival / step), ticks).astype(np.int64)
+    their_joining = np.bincount(their_joins, their_hp, ticks + 1)[:, None]
+    their_total = np.cumsum(their_joining, axis=0)
+    # Damage dealt per step by each point of health still standing, all that changes with the fight is the health
+    our_rate = np.cumsum(per_tick(fires, our_dps), axis=0)
+    our_rate *= step
+    np.divide(our_rate, our_total, out=our_rate, where=our_total > 0)
+    their_rate = np.cumsum(per_tick(their_fires, their_dps), axis=0)
+    their_rate *= step
+    np.divide(their_rate, their_total, out=their_rate, where=their_total > 0)
+    healed = healing * step if healing is not None else np.zeros(candidates)
+
+    ours = np.zeros(candidates)
+    theirs = np.zeros(candidates)
+    for tick in range(ticks):
+        ours += our_joining[tick]
+        theirs += their_joining[tick]
+        # Both sides shoot at once, with what they had at the start of the step
+        dealt = ours * our_rate[tick]
+        ours -= theirs * their_rate[tick]
+        theirs -= dealt
+        np.maximum(ours, 0, out=ours)
+        np.maximum(theirs, 0, out=theirs)
+        # Medivacs only heal the living, and no more than they lost
+        np.add(ours, healed, out=ours, where=ours > 0)
+        np.minimum(ours, our_total[tick], out=ours)
+        if tick % 8 == 7 and not (theirs.any() and ours.any()):
+            break
+
+    our_left = np.divide(ours, our_total[-1], out=np.zeros(candidates), where=our_total[-1] > 0)
+    their_left = theirs / their_total[-1] if their_total[-1] > 0 else np.zeros(candidates)
+    return our_left, their_left
+
+
+class EngagementEstimator:
+    """ Decides whether the army should engage the remembered enemy army, hold, or retreat
+
+    Two engagements at the enemy army's centre are played with
+    simulate_engagements in one call: the army as it stands, stragglers
+    joining as they walk up behind the front, and the whole army gathered
+    before it moves out. Enemies further than front_radius from the centre
+    join as they walk in. The army engages when it wins as it stands, holds
+    when it would only win gathered, and retreats when it loses even then.
+    A win leaves the enemy less than win_margin of its health, or us margin
+    more of ours than they keep of theirs. The decision is kept for
+    interval game loops before it is worked out again.
+    """
+
+    def __init__(self, game: sc2.BotAI, front_radius: float = 15.0, margin: float = 0.25, win_margin: float = 0.05,
+                 max_age: int = ARMY_MEMORY_LOOPS, interval: int = 8) -> None:
+        self.game = game
+        self.front_radius = front_radius  # enemies this close to their centre are in the fight from the start
+        self.margin = margin
+        self.win_margin = win_margin
+        self.max_age = max_age
+        self.interval = interval
+
+        self._stance = None  # type: Optional[str]
+        self._decided_at = 0
+
+    def candidates(self, army_xy: np.ndarray, our_range: np.ndarray,
+                   enemy_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ (members, arrival) for the army as it stands and gathered, and when each enemy joins in """
+        centre = enemy_xy.mean(axis=0)
+        walk = np.maximum(np.hypot(*(army_xy - centre).T) - our_range, 0)
+        walk -= walk.min()  # the fight starts when the first of ours gets there
+        their_walk = np.maximum(np.hypot(*(enemy_xy - centre).T) - self.front_radius, 0)
+        members = np.ones((2, len(army_xy)), dtype=bool)
+        arrival = np.stack([walk / CLOSING_SPEED, np.zeros(len(army_xy))])
+        return members, arrival, their_walk / CLOSING_SPEED
+
+    def wins(self, our_left: np.ndarray, their_left: np.ndarray) -> np.ndarray:
+        return (their_left < self.win_margin) | (our_left - their_left > self.margin)
+
+    def decide(self, army: Units, medivacs: Units, unopposed: str = ENGAGE) -> str:
+        """ ENGAGE, HOLD or RETREAT for the army against the enemy army remembered, unopposed when there is none """
+        loop = self.game.state.game_loop
+        if self._stance is None or loop - self._decided_at >= self.interval:
+            self._stance = self._decide(army, medivacs, unopposed)
+            self._decided_at = loop
+        return self._stance
+
+    def _decide(self, army: Units, medivacs: Units, unopposed: str) -> str:
+        memory = self.game.enemy_memory
+        rows = memory.army(self.max_age)
+        rows = rows[memory.dps[rows] > 0]
+        if not len(rows):
+            return unopposed
+        if not army:
+            return RETREAT
+
+        our_range = np.array([max(unit.ground_range, unit.air_range) for unit in army])
+        members, arrival, their_arrival = self.candidates(
+            positions_of(army), our_range, np.stack([memory.x[rows], memory.y[rows]], axis=1).astype(float))
+        healers = sum(1 for medivac in medivacs if medivac.energy >= 5)
+        wins = self.wins(*simulate_engagements(
+            our_hp=np.array([unit.health + unit.shield for unit in army], dtype=float),
+            our_dps=np.array([max(unit.ground_dps, unit.air_dps) for unit in army], dtype=float),
+            our_range=our_range, members=members, arrival=arrival,
+            their_hp=memory.health[rows].astype(float), their_dps=memory.dps[rows].astype(float),
+            their_range=memory.range[rows].astype(float), their_arrival=their_arrival,
+            healing=np.full(len(members), healers * MEDIVAC_HEAL_RATE)))
+        if wins[0]:
+            return ENGAGE
+        if wins[1]:
+            return HOLD
+        return RETREAT
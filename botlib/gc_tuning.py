@@ -0,0 +1,120 @@
+import gc
+import logging
+import time
+from typing import Dict, Tuple
+
+import sc2
+
+from .step_profiler import Histogram
+
+logger = logging.getLogger(__name__)
+
+STEP_THRESHOLD = 100000  # allocations before the collector steps in by itself, once collections are left to idle time
+IDLE_THRESHOLD = 700  # allocations before a collection is worth the idle time, the collector's own default
+MARGIN = 0.002  # seconds of the step budget never spent collecting
+
+
+class GcTuner:
+    """ Watches the garbage collector's pauses and can move them out of the bot's steps
+
+    With freeze set, everything alive once the game has started (game data,
+    map analysis) is moved to the permanent generation, which collections
+    never walk again. Python 3.6 has no gc.freeze, there it is skipped. With idle set, the collector's first threshold is
+    raised so it rarely runs on its own, and collect is called after each
+    step to run the collections that are due in whatever is left of the
+    step's budget. Each generation's collection time is averaged, so one is
+    only started when it is expected to fit.
+    """
+
+    def __init__(self, game: sc2.BotAI, freeze: bool = True, idle: bool = True) -> None:
+        self.game = game
+        self.freeze_startup = freeze
+        self.idle = idle
+
+        self.pauses = Histogram()  # collections the collector started by itself
+        self.collections = [0, 0, 0]  # per generation, started by the collector
+        self.idle_collections = [0, 0, 0]
+        self.idle_time = 0.0
+        self.frozen = 0
+
+        self._costs = [0.0, 0.0, 0.0]  # seconds, running average per generation
+        self._started_at = 0.0
+        self._collecting = False
+        self._thresholds = None  # type: Tuple[int, int, int]
+
+    def start(self):
+        gc.callbacks.append(self._callback)
+        if self.idle:
+            self._thresholds = gc.get_threshold()
+            gc.set_threshold(STEP_THRESHOLD, *self._thresholds[1:])
+
+    def stop(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+        if self._thresholds:
+            gc.set_threshold(*self._thresholds)
+            self._thresholds = None
+
+    def freeze(self):
+        """ Call once the game has started and the map is analysed """
+        if not self.freeze_startup or not hasattr(gc, "freeze"):
+            return
+        gc.collect()
+        gc.freeze()
+        self.frozen = gc.get_freeze_count()
+
+    def _callback(self, phase: str, info: Dict):
+        if self._collecting:
+            return
+        if phase == "start":
+            self._started_at = time.perf_counter()
+        else:
+            self.pauses.record(time.perf_counter() - self._started_at)
+            self.collections[info["generation"]] += 1
+
+    def collect(self, remaining: float):
+        """ Runs the collection that is due, if it fits in the remaining seconds of the step """
+        if not self.idle:
+            return
+        counts = gc.get_count()
+        if counts[0] < IDLE_THRESHOLD:
+            return
+        _, threshold1, threshold2 = self._thresholds
+        generation = 0
+        if counts[1] >= threshold1:
+            generation = 2 if counts[2] >= threshold2 else 1
+        # Older generations are left for a later step with more time to spare
+        while generation and self._costs[generation] >= remaining - MARGIN:
+            generation -= 1
+        if self._costs[0] >= remaining - MARGIN:
+            return
+
+        self._collecting = True
+        start = time.perf_counter()
+        try:
+            gc.collect(generation)
+        finally:
+            self._collecting = False
+        elapsed = time.perf_counter() - start
+        cost = self._costs[generation]
+        self._costs[generation] = elapsed if not self.idle_collections[generation] else cost * 0.8 + elapsed * 0.2
+        self.idle_collections[generation] += 1
+        self.idle_time += elapsed
+
+    def summary(self) -> Dict:
+        return {
+            "frozen": self.frozen,
+            "collections": list(self.collections),
+            "pause_ms": self.pauses.total * 1000,
+            "p99_pause_ms": self.pauses.percentile(99) * 1000,
+            "max_pause_ms": self.pauses.largest * 1000,
+            "idle_collections": list(self.idle_collections),
+            "idle_ms": self.idle_time * 1000,
+        }
+
+    def report(self) -> str:
+        summary = self.summary()
+        return ("{} collections started by the collector ({:.1f}ms, longest {:.1f}ms), {} in idle time "
+                "({:.1f}ms), {} objects frozen".format(
+                    sum(summary["collections"]), summary["pause_ms"], summary["max_pause_ms"],
+                    sum(summary["idle_collections"]), summary["idle_ms"], summary["frozen"]))
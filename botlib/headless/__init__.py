@@ -0,0 +1,14 @@
+""" Plays the bot against a synthetic game, without a StarCraft II binary
+
+    from botlib.headless import Scenario, run_headless
+    report = run_headless(AlphaBot(), Scenario(units=100, enemies=50, steps=1000))
+    print(report.summary())
+
+A game recorded with TerranBot.enable_recording replays the same way:
+
+    report = run_replay(AlphaBot(), "recording")
+"""
+from .replay import ReplayedGame, play_direct, run_replay
+from .server import ActionLog, HeadlessReport, HeadlessServer, play_headless, run_headless, run_server
+from .synthetic_map import SyntheticMap
+from .world import Scenario, World
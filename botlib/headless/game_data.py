@@ -0,0 +1,139 @@
+from collections import namedtuple
+from typing import Dict
+
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.data import Attribute, Race
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+
+LOOPS_PER_SECOND = 22.4
+
+# Weapon targets, as in data_pb.Weapon.TargetType
+GROUND, AIR, ANY = 1, 2, 3
+
+Weapon = namedtuple("Weapon", ["target", "damage", "attacks", "range", "cooldown"])
+
+UnitData = namedtuple("UnitData", [
+    "type_id", "race", "ability", "minerals", "vespene", "build_time",
+    "food_required", "food_provided", "health", "shield", "energy", "radius",
+    "speed", "weapons", "attributes", "footprint", "flying", "tech_alias",
+])
+
+
+def unit_data(type_id: UnitTypeId, race: Race = Race.Terran, ability: AbilityId = None,
+              minerals: int = 0, vespene: int = 0, build_time: float = 0.0,
+              food_required: float = 0, food_provided: float = 0,
+              health: float = 0, shield: float = 0, energy: float = 0, radius: float = 0.5,
+              speed: float = 0.0, weapons=(), attributes=(), footprint: int = 0,
+              flying: bool = False, tech_alias: UnitTypeId = None) -> UnitData:
+    """ build_time is in seconds and speed in distance per second, both at faster game speed """
+    return UnitData(type_id, race, ability, minerals, vespene, build_time * LOOPS_PER_SECOND,
+                    food_required, food_provided, health, shield, energy, radius,
+                    speed, tuple(weapons), tuple(attributes), footprint, flying, tech_alias)
+
+
+STRUCTURE = (Attribute.Armored, Attribute.Structure)
+
+# The subset of the game data the bot and the synthetic opponent use, with ladder values
+UNITS = {data.type_id: data for data in [
+    unit_data(UnitTypeId.SCV, ability=AbilityId.COMMANDCENTERTRAIN_SCV, minerals=50, build_time=12,
+              food_required=1, health=45, radius=0.375, speed=3.94,
+              weapons=[Weapon(GROUND, 5, 1, 0.1, 1.07)], attributes=[Attribute.Light, Attribute.Biological]),
+    unit_data(UnitTypeId.MULE, health=60, radius=0.375, speed=3.94,
+              attributes=[Attribute.Light, Attribute.Mechanical, Attribute.Summoned]),
+    unit_data(UnitTypeId.MARINE, ability=AbilityId.BARRACKSTRAIN_MARINE, minerals=50, build_time=18,
+              food_required=1, health=45, radius=0.375, speed=3.15,
+              weapons=[Weapon(ANY, 6, 1, 5, 0.61)], attributes=[Attribute.Light, Attribute.Biological]),
+    unit_data(UnitTypeId.REAPER, ability=AbilityId.BARRACKSTRAIN_REAPER, minerals=50, vespene=50,
+              build_time=32, food_required=1, health=60, radius=0.375, speed=5.25,
+              weapons=[Weapon(GROUND, 4, 2, 5, 0.79)], attributes=[Attribute.Light, Attribute.Biological]),
+    unit_data(UnitTypeId.HELLION, ability=AbilityId.FACTORYTRAIN_HELLION, minerals=100, build_time=21,
+              food_required=2, health=90, radius=0.625, speed=5.95,
+              weapons=[Weapon(GROUND, 8, 1, 5, 1.79)], attributes=[Attribute.Light, Attribute.Mechanical]),
+    unit_data(UnitTypeId.MEDIVAC, ability=AbilityId.STARPORTTRAIN_MEDIVAC, minerals=100, vespene=100,
+              build_time=30, food_required=2, health=150, energy=50, radius=0.75, speed=3.5, flying=True,
+              attributes=[Attribute.Armored, Attribute.Mechanical]),
+    unit_data(UnitTypeId.COMMANDCENTER, ability=AbilityId.TERRANBUILD_COMMANDCENTER, minerals=400,
+              build_time=71, food_provided=15, health=1500, radius=2.75, footprint=5, attributes=STRUCTURE),
+    unit_data(UnitTypeId.ORBITALCOMMAND, ability=AbilityId.UPGRADETOORBITAL_ORBITALCOMMAND, minerals=550,
+              build_time=25, food_provided=15, health=1500, energy=50, radius=2.75, footprint=5,
+              attributes=STRUCTURE, tech_alias=UnitTypeId.COMMANDCENTER),
+    unit_data(UnitTypeId.SUPPLYDEPOT, ability=AbilityId.TERRANBUILD_SUPPLYDEPOT, minerals=100, build_time=21,
+              food_provided=8, health=400, radius=1.0, footprint=2, attributes=STRUCTURE),
+    unit_data(UnitTypeId.SUPPLYDEPOTLOWERED, ability=AbilityId.MORPH_SUPPLYDEPOT_LOWER, minerals=100,
+              food_provided=8, health=400, radius=1.0, footprint=2, attributes=STRUCTURE),
+    unit_data(UnitTypeId.BARRACKS, ability=AbilityId.TERRANBUILD_BARRACKS, minerals=150, build_time=46,
+              health=1000, radius=1.8125, footprint=3, attributes=STRUCTURE),
+    unit_data(UnitTypeId.REFINERY, ability=AbilityId.TERRANBUILD_REFINERY, minerals=75, build_time=21,
+              health=500, radius=1.5, footprint=3, attributes=STRUCTURE),
+    unit_data(UnitTypeId.FACTORY, ability=AbilityId.TERRANBUILD_FACTORY, minerals=150, vespene=100,
+              build_time=43, health=1250, radius=1.8125, footprint=3, attributes=STRUCTURE),
+    unit_data(UnitTypeId.STARPORT, ability=AbilityId.TERRANBUILD_STARPORT, minerals=150, vespene=100,
+              build_time=36, health=1300, radius=1.8125, footprint=3, attributes=STRUCTURE),
+
+    unit_data(UnitTypeId.ZEALOT, Race.Protoss, AbilityId.GATEWAYTRAIN_ZEALOT, minerals=100, build_time=27,
+              food_required=2, health=100, shield=50, radius=0.5, speed=3.15,
+              weapons=[Weapon(GROUND, 8, 2, 0.1, 0.86)], attributes=[Attribute.Light, Attribute.Biological]),
+    unit_data(UnitTypeId.STALKER, Race.Protoss, AbilityId.GATEWAYTRAIN_STALKER, minerals=125, vespene=50,
+              build_time=30, food_required=2, health=80, shield=80, radius=0.625, speed=4.13,
+              weapons=[Weapon(ANY, 13, 1, 6, 1.34)], attributes=[Attribute.Armored, Attribute.Mechanical]),
+    unit_data(UnitTypeId.NEXUS, Race.Protoss, AbilityId.PROTOSSBUILD_NEXUS, minerals=400, build_time=71,
+              food_provided=15, health=1000, shield=1000, radius=2.75, footprint=5, attributes=STRUCTURE),
+    unit_data(UnitTypeId.PYLON, Race.Protoss, AbilityId.PROTOSSBUILD_PYLON, minerals=100, build_time=18,
+              food_provided=8, health=200, shield=200, radius=1.0, footprint=2, attributes=STRUCTURE),
+    unit_data(UnitTypeId.GATEWAY, Race.Protoss, AbilityId.PROTOSSBUILD_GATEWAY, minerals=150, build_time=46,
+              health=500, shield=500, radius=1.8125, footprint=3, attributes=STRUCTURE),
+
+    unit_data(UnitTypeId.MINERALFIELD, Race.NoRace, radius=1.125, attributes=[Attribute.Structure]),
+    unit_data(UnitTypeId.VESPENEGEYSER, Race.NoRace, radius=1.5, footprint=3, attributes=[Attribute.Structure]),
+]}  # type: Dict[UnitTypeId, UnitData]
+
+# Link names matter, the library treats morphs named Lower, Raise, Lift, ... as free
+ABILITIES = {
+    AbilityId.SMART: "Smart",
+    AbilityId.STOP: "Stop",
+    AbilityId.MOVE: "Move",
+    AbilityId.ATTACK: "Attack",
+    AbilityId.HOLDPOSITION: "HoldPosition",
+    AbilityId.HARVEST_GATHER: "Gather",
+    AbilityId.HARVEST_RETURN: "Return",
+    AbilityId.EFFECT_REPAIR: "Repair",
+    AbilityId.MEDIVACHEAL_HEAL: "MedivacHeal",
+    AbilityId.CALLDOWNMULE_CALLDOWNMULE: "CalldownMULE",
+    AbilityId.MORPH_SUPPLYDEPOT_LOWER: "SupplyDepotLower",
+    AbilityId.MORPH_SUPPLYDEPOT_RAISE: "SupplyDepotRaise",
+}  # type: Dict[AbilityId, str]
+ABILITIES.update({data.ability: data.type_id.name.title() for data in UNITS.values()
+                  if data.ability is not None and data.ability not in ABILITIES})
+
+# Abilities whose order produces a unit, and the unit they produce
+PRODUCES = {data.ability: data.type_id for data in UNITS.values() if data.ability is not None}
+
+
+def footprint_size(unit_type: UnitTypeId) -> int:
+    data = UNITS.get(unit_type)
+    return data.footprint if data else 0
+
+
+def game_data_proto() -> sc_pb.ResponseData:
+    """ The game data the real client asks for at game start """
+    response = sc_pb.ResponseData()
+    for ability, link_name in ABILITIES.items():
+        response.abilities.add(ability_id=ability.value, link_name=link_name, button_name=link_name,
+                               friendly_name=link_name, available=True)
+
+    for data in UNITS.values():
+        proto = response.units.add(
+            unit_id=data.type_id.value, name=data.type_id.name.title(), available=True,
+            mineral_cost=data.minerals, vespene_cost=data.vespene, build_time=data.build_time,
+            food_required=data.food_required, food_provided=data.food_provided,
+            ability_id=data.ability.value if data.ability else 0, race=data.race.value,
+            movement_speed=data.speed, has_minerals=data.type_id == UnitTypeId.MINERALFIELD,
+            has_vespene=data.type_id == UnitTypeId.VESPENEGEYSER,
+            attributes=[attribute.value for attribute in data.attributes])
+        if data.tech_alias:
+            proto.tech_alias.append(data.tech_alias.value)
+        for weapon in data.weapons:
+            proto.weapons.add(type=weapon.target, damage=weapon.damage, attacks=weapon.attacks,
+                              range=weapon.range, speed=weapon.cooldown)
+    return response
@@ -0,0 +1,165 @@
+import logging
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import sc2
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.client import Client
+from sc2.data import ActionResult, Result
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+from sc2.unit import UnitGameData
+
+from ..observation_recorder import ObservationReader
+from .game_data import PRODUCES, footprint_size
+from .server import HeadlessReport, HeadlessServer, play_headless, run_server
+from .synthetic_map import footprint
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayedGame:
+    """ Stands in for the World, serving a recorded game one observation per step
+
+    The bot's commands are logged by the server but change nothing, each step
+    request moves on to the next recorded observation. Placements are checked
+    against the placement grid and the recorded structures of known size.
+    With direct set the steps are game states read from the columns, for
+    play_direct to hand to the bot, rather than observation protos.
+    """
+
+    def __init__(self, reader: ObservationReader, game_step: int = 8, direct: bool = False) -> None:
+        self.reader = reader
+        self.player_id = reader.player_id
+        self.game_step = game_step  # only decides how the bot's clock advances, steps follow the recording
+        self.direct = direct
+        self.finished = False
+
+        self._observations = reader.states() if direct else iter(reader)
+        self._current = next(self._observations)  # ResponseObservation, or RecordedState when direct
+        self._positions = None  # type: Optional[Dict[int, Point2]]
+        self._occupied = None  # type: Optional[np.ndarray]
+
+        grid = reader.game_info.start_raw.placement_grid
+        self._placeable = np.unpackbits(np.frombuffer(grid.data, dtype=np.uint8))[:grid.size.x * grid.size.y]
+        self._placeable = self._placeable.reshape(grid.size.y, grid.size.x).astype(bool)
+
+    @property
+    def loop(self) -> int:
+        return self._current.game_loop if self.direct else self._current.observation.game_loop
+
+    @property
+    def state(self):
+        """ The current step's RecordedState, when direct """
+        return self._current
+
+    def _units(self):
+        return self._current.raw_units if self.direct else self._current.observation.raw_data.units
+
+    def game_info_proto(self, races) -> sc_pb.ResponseGameInfo:
+        return self.reader.game_info
+
+    def game_data_proto(self) -> sc_pb.ResponseData:
+        return self.reader.game_data
+
+    def observation(self) -> sc_pb.ResponseObservation:
+        if self.finished and not self._current.player_result:
+            for player_info in self.reader.game_info.player_info:
+                self._current.player_result.add(player_id=player_info.player_id, result=Result.Tie.value)
+        return self._current
+
+    def apply(self, command) -> ActionResult:
+        return ActionResult.Success
+
+    def placement_result(self, ability_id: int, x: float, y: float) -> ActionResult:
+        unit_type = PRODUCES.get(AbilityId(ability_id))
+        if unit_type is None:
+            return ActionResult.Success
+        rows, cols = footprint(Point2((x, y)), footprint_size(unit_type))
+        if rows.start < 0 or cols.start < 0 or rows.stop > self._placeable.shape[0] \
+                or cols.stop > self._placeable.shape[1]:
+            return ActionResult.CantBuildLocationInvalid
+        if self._placeable[rows, cols].all() and not self.occupied()[rows, cols].any():
+            return ActionResult.Success
+        return ActionResult.CantBuildLocationInvalid
+
+    def occupied(self) -> np.ndarray:
+        """ Grid cells covered by the current observation's structures """
+        if self._occupied is None:
+            self._occupied = np.zeros_like(self._placeable)
+            for unit in self._units():
+                try:
+                    size = footprint_size(UnitTypeId(unit.unit_type))
+                except ValueError:
+                    continue
+                if size:
+                    self._occupied[footprint(Point2((unit.pos.x, unit.pos.y)), size)] = True
+        return self._occupied
+
+    def position_of(self, tag: int) -> Point2:
+        if self._positions is None:
+            self._positions = {unit.tag: Point2((unit.pos.x, unit.pos.y)) for unit in self._units()}
+        return self._positions[tag]
+
+    def advance(self, loops: int) -> None:
+        try:
+            self._current = next(self._observations)
+            self._positions = None
+            self._occupied = None
+        except StopIteration:
+            self.finished = True
+
+
+async def play_direct(bot: sc2.BotAI, server: HeadlessServer) -> Result:
+    """ The library's game loop cut down for a recording, handing the bot its game states directly
+
+    Game data, game info and the bot's commands and queries still go through
+    the server, but the observations never become protos: each step's
+    RecordedState goes straight to the bot, and moving on to the next is a
+    step of the reader rather than a request.
+    """
+    game = server.world
+    client = Client(server)
+    client.game_step = game.game_step
+    game_data = await client.get_game_data()
+    UnitGameData._game_data = game_data
+    UnitGameData._bot_object = bot
+    bot._prepare_start(client, game.player_id, await client.get_game_info(), game_data)
+    # The recording's map never changes, so the game info the step reads its pathing grid from doesn't either
+    proto_game_info = await client._execute(game_info=sc_pb.RequestGameInfo())
+
+    iteration = 0
+    while not game.finished:
+        start = time.perf_counter()
+        bot._prepare_step(game.state, proto_game_info)
+        try:
+            if not iteration:
+                bot._prepare_first_step()
+                bot.on_start()
+                await bot.on_start_async()
+            await bot.issue_events()
+            await bot.on_step(iteration)
+        except Exception:
+            logger.exception("AI step threw an error")
+            bot.on_end(Result.Defeat)
+            return Result.Defeat
+        server.record_step(time.perf_counter() - start)
+        game.advance(game.game_step)
+        iteration += 1
+
+    bot.on_end(Result.Tie)
+    return Result.Tie
+
+
+def run_replay(bot: sc2.BotAI, path: str, seed: int = 1, direct: bool = False) -> HeadlessReport:
+    """ Feeds a recording made with TerranBot.enable_recording back through the bot
+
+    By default the recording is served as observation protos through the
+    library's own game loop, as a real game would be. direct skips the protos
+    with play_direct, which is far quicker on the server's side of each step.
+    """
+    server = HeadlessServer(ReplayedGame(ObservationReader(path), direct=direct))
+    return run_server(bot, server, {"recording": path, "seed": seed, "direct": direct}, seed,
+                      play=play_direct if direct else play_headless)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import sc2
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.client import Client
+from sc2.data import Race, Status
+from sc2.ids.ability_id import AbilityId
+from sc2.main import _play_game_ai
+
+from ..step_profiler import Histogram
+from .world import World, Scenario
+
+
+class ActionLog:
+    """ Every raw unit command the bot sent, with the game loop it was sent on """
+
+    def __init__(self) -> None:
+        self.records = []  # type: List[Tuple[int, int, Tuple[int, ...], object]]
+        self.by_ability = Counter()  # type: Counter
+        self.commands = 0
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, game_loop: int, command, result) -> None:
+        if command.HasField("target_world_space_pos"):
+            target = (command.target_world_space_pos.x, command.target_world_space_pos.y)
+        elif command.HasField("target_unit_tag"):
+            target = command.target_unit_tag
+        else:
+            target = None
+        self.records.append((game_loop, command.ability_id, tuple(command.unit_tags), target))
+        self.by_ability[command.ability_id] += len(command.unit_tags)
+        self.commands += 1
+        if result.value != 1:
+            self.errors += 1
+
+    def ability_counts(self) -> Dict[str, int]:
+        return {AbilityId(ability).name: count for ability, count in self.by_ability.most_common()}
+
+    def write(self, path: str) -> None:
+        """ One JSON object per command """
+        with open(path, "w") as log:
+            for game_loop, ability, tags, target in self.records:
+                log.write(json.dumps({"game_loop": game_loop, "ability": AbilityId(ability).name,
+                                      "units": list(tags), "target": target}) + "\n")
+
+
+class HeadlessServer:
+    """ Stands in for the websocket to a StarCraft II process
+
+    The real sc2 Client talks to it, so the bot runs through the library's own
+    game loop, requests and parsing. Time between the observation reply and
+    the step request, less the time spent answering requests, is the bot's.
+    """
+
+    def __init__(self, world: World, races=(Race.Terran, Race.Protoss), budget: float = 0.0446) -> None:
+        self.world = world
+        self.races = list(races)
+        self.budget = budget  # seconds, one game step at realtime speed by default
+        self.actions = ActionLog()
+        self.step_latency = Histogram()
+        self.steps_over_budget = 0
+        self.placement_queries = 0
+        self.first_step = 0.0
+        self.steps = 0
+
+        self._game_data = world.game_data_proto()
+        self._game_info = world.game_info_proto(self.races)
+        self._reply = None  # type: Optional[bytes]
+        self._replied_at = None  # type: Optional[float]
+        self._thinking = None  # type: Optional[float]
+
+    async def send_bytes(self, data: bytes) -> None:
+        received = time.perf_counter()
+        if self._thinking is not None:
+            self._thinking += received - self._replied_at
+
+        request = sc_pb.Request.FromString(data)
+        response = self.handle(request)
+        self._reply = response.SerializeToString()
+
+    async def receive_bytes(self) -> bytes:
+        self._replied_at = time.perf_counter()
+        return self._reply
+
+    def handle(self, request: sc_pb.Request) -> sc_pb.Response:
+        world = self.world
+        response = sc_pb.Response(id=request.id, status=Status.in_game.value)
+        kind = request.WhichOneof("request")
+
+        if kind == "data":
+            response.data.CopyFrom(self._game_data)
+        elif kind == "game_info":
+            response.game_info.CopyFrom(self._game_info)
+        elif kind == "observation":
+            response.observation.CopyFrom(world.observation())
+            if world.finished:
+                response.status = Status.ended.value
+            self._thinking = 0.0
+        elif kind == "action":
+            for action in request.action.actions:
+                command = action.action_raw.unit_command
+                result = world.apply(command)
+                self.actions.record(world.loop, command, result)
+                response.action.result.append(result.value)
+            self.actions.requests += 1
+        elif kind == "query":
+            self.placement_queries += len(request.query.placements)
+            for placement in request.query.placements:
+                result = world.placement_result(placement.ability_id, placement.target_pos.x, placement.target_pos.y)
+                response.query.placements.add(result=result.value)
+            for pathing in request.query.pathing:
+                start = world.position_of(pathing.unit_tag) if pathing.HasField("unit_tag") else pathing.start_pos
+                # No path finding, straight line distances are close enough for picking expansions
+                distance = ((start.x - pathing.end_pos.x) ** 2 + (start.y - pathing.end_pos.y) ** 2) ** 0.5
+                response.query.pathing.add(distance=distance)
+        elif kind == "step":
+            self._end_step()
+            world.advance(request.step.count or 1)
+            response.step.simulation_loop = world.loop
+        elif kind in ("leave_game", "quit"):
+            response.status = Status.ended.value
+        elif kind not in ("ping", "debug"):
+            response.error.append("Request {} is not supported headless".format(kind))
+        return response
+
+    def _end_step(self) -> None:
+        if self._thinking is None:
+            return
+        self.record_step(self._thinking)
+        self._thinking = None
+
+    def record_step(self, seconds: float) -> None:
+        """ Counts a step the bot took seconds over, for game loops which don't step through the server """
+        if self.steps:
+            self.step_latency.record(seconds)
+            if seconds > self.budget:
+                self.steps_over_budget += 1
+        else:
+            # Includes on_start and the first step preparation, which are one-off costs
+            self.first_step = seconds
+        self.steps += 1
+
+
+class HeadlessReport:
+    def __init__(self, bot_name: str, setup: Dict, server: HeadlessServer, result, wall_time: float) -> None:
+        self.bot_name = bot_name
+        self.setup = setup  # what was played, the scenario's size or the recording
+        self.server = server
+        self.result = result
+        self.wall_time = wall_time
+
+    def summary(self) -> Dict:
+        latency = self.server.step_latency
+        actions = self.server.actions
+        summary = {"bot": self.bot_name}
+        summary.update(self.setup)
+        summary.update({
+            "steps": self.server.steps,
+            "result": self.result.name if self.result else None,
+            "steps_per_second": latency.count / latency.total if latency.total else 0.0,
+            "wall_steps_per_second": self.server.steps / self.wall_time if self.wall_time else 0.0,
+            "first_step_ms": self.server.first_step * 1000,
+            "mean_ms": latency.mean * 1000,
+            "p50_ms": latency.percentile(50) * 1000,
+            "p95_ms": latency.percentile(95) * 1000,
+            "p99_ms": latency.percentile(99) * 1000,
+            "max_ms": latency.largest * 1000,
+            "steps_over_budget": self.server.steps_over_budget,
+            "placement_queries": self.server.placement_queries,
+            "commands": actions.commands,
+            "unit_commands": sum(actions.by_ability.values()),
+            "action_requests": actions.requests,
+            "action_errors": actions.errors,
+            "abilities": actions.ability_counts(),
+        })
+        return summary
+
+
+async def play_headless(bot: sc2.BotAI, server: HeadlessServer):
+    """ Runs the library's game loop for the bot against the headless server """
+    client = Client(server)
+    client.game_step = server.world.game_step
+    return await _play_game_ai(client, server.world.player_id, bot,
+                               realtime=False, step_time_limit=None, game_time_limit=None)
+
+
+def run_server(bot: sc2.BotAI, server: HeadlessServer, setup: Dict, seed: int, play=play_headless) -> HeadlessReport:
+    # The bot and the library pick some targets and placements at random
+    random.seed(seed)
+
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    try:
+        result = loop.run_until_complete(play(bot, server))
+    finally:
+        loop.close()
+    return HeadlessReport(type(bot).__name__, setup, server, result, time.perf_counter() - start)
+
+
+def run_headless(bot: sc2.BotAI, scenario: Scenario = None) -> HeadlessReport:
+    """ Plays the scenario with the bot and reports how long its steps took """
+    scenario = scenario or Scenario()
+    setup = {"units": scenario.units, "enemies": scenario.enemies, "seed": scenario.seed}
+    return run_server(bot, HeadlessServer(World(scenario)), setup, scenario.seed)
@@ -0,0 +1,137 @@
+from typing import List, Tuple
+
+import numpy as np
+from s2clientprotocol import common_pb2 as common_pb
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.data import Difficulty, PlayerType, Race
+from sc2.position import Point2
+
+LOW_GROUND, HIGH_GROUND = 100, 140  # terrain height bytes
+
+
+class Base:
+    """ A base location with its mineral line and geysers, minerals face the direction (dx, dy) """
+
+    def __init__(self, center: Point2, direction: Tuple[int, int]) -> None:
+        self.center = center
+        dx, dy = direction
+        if dx:
+            # A column of 2x1 mineral fields, centred on whole x and half y
+            self.minerals = [Point2((center.x + dx * (7.5 + i % 2), center.y - 4 + i)) for i in range(8)]
+            self.geysers = [Point2((center.x + dx * 3, center.y + side * 7)) for side in (-1, 1)]
+        else:
+            self.minerals = [Point2((center.x - 7.5 + 2 * i, center.y + dy * (7 + i % 2))) for i in range(8)]
+            self.geysers = [Point2((center.x + side * 7, center.y + dy * 3)) for side in (-1, 1)]
+
+    def mirrored(self, size: int) -> "Base":
+        base = Base.__new__(Base)
+        base.center = mirror(self.center, size)
+        base.minerals = [mirror(p, size) for p in self.minerals]
+        base.geysers = [mirror(p, size) for p in self.geysers]
+        return base
+
+
+def mirror(point: Point2, size: int) -> Point2:
+    return Point2((size - point.x, size - point.y))
+
+
+def footprint(position: Point2, size: int) -> Tuple[slice, slice]:
+    """ Grid rows and columns covered by a square structure centred on position """
+    x0 = int(round(position.x - size / 2))
+    y0 = int(round(position.y - size / 2))
+    return slice(y0, y0 + size), slice(x0, x0 + size)
+
+
+class SyntheticMap:
+    """ Point symmetric two player map, shaped like the ladder maps the bot plays on
+
+    Each player has a raised main with a single ramp, a natural below the ramp
+    and a third base. Grids are indexed [y, x] like the game's image data.
+    """
+
+    def __init__(self, size: int = 96, name: str = "Synthetic") -> None:
+        assert size >= 96, "the base layout needs a 96x96 map"
+        self.size = size
+        self.name = name
+
+        self.terrain_height = np.full((size, size), LOW_GROUND, dtype=np.uint8)
+        self.pathable = np.zeros((size, size), dtype=bool)
+        self.pathable[1:-1, 1:-1] = True
+        self.placeable = self.pathable.copy()
+
+        ours = [
+            Base(Point2((17.5, 17.5)), (-1, 0)),  # main, on the plateau
+            Base(Point2((44.5, 14.5)), (0, -1)),  # natural, below the ramp
+            Base(Point2((17.5, 46.5)), (-1, 0)),
+        ]
+        self.bases = ours + [base.mirrored(size) for base in ours]  # type: List[Base]
+        self.start_locations = [self.bases[0].center, self.bases[len(ours)].center]
+
+        self._raise_main(flip=False)
+        self._raise_main(flip=True)
+
+    def _raise_main(self, flip: bool) -> None:
+        """ Plateau in the corner up to 30 on both axes, its edge is a cliff apart from a ramp heading east """
+        walkable = np.ones((29, 29), dtype=bool)
+        walkable[-1, :] = walkable[:, -1] = False
+        self._paint(slice(1, 30), slice(1, 30), HIGH_GROUND, walkable, flip)
+
+        # Two cells wide and four long, stepping down towards the low ground
+        for step in range(4):
+            height = HIGH_GROUND - (step + 1) * (HIGH_GROUND - LOW_GROUND) // 5
+            self._paint(slice(20, 22), slice(29 + step, 30 + step), height, None, flip, ramp=True)
+
+    def _paint(self, rows: slice, cols: slice, height: int, walkable, flip: bool, ramp: bool = False) -> None:
+        if flip:
+            size = self.size
+            rows = slice(size - rows.stop, size - rows.start)
+            cols = slice(size - cols.stop, size - cols.start)
+            if walkable is not None:
+                walkable = walkable[::-1, ::-1]
+        self.terrain_height[rows, cols] = height
+        if ramp:
+            self.pathable[rows, cols] = True
+            self.placeable[rows, cols] = False
+        else:
+            self.pathable[rows, cols] = walkable
+            self.placeable[rows, cols] = walkable
+
+    @property
+    def map_center(self) -> Point2:
+        return Point2((self.size / 2, self.size / 2))
+
+    def height_at(self, x: float, y: float) -> float:
+        return float(self.terrain_height[int(y), int(x)]) * 32 / 255 - 16
+
+    def footprint(self, position: Point2, size: int) -> Tuple[slice, slice]:
+        return footprint(position, size)
+
+    def in_bounds(self, rows: slice, cols: slice) -> bool:
+        return rows.start >= 0 and cols.start >= 0 and rows.stop <= self.size and cols.stop <= self.size
+
+    def game_info_proto(self, races: List[Race]) -> sc_pb.ResponseGameInfo:
+        """ What the game sends for RequestGameInfo, for player 1 """
+        size = common_pb.Size2DI(x=self.size, y=self.size)
+        info = sc_pb.ResponseGameInfo(map_name=self.name, local_map_path=self.name + ".SC2Map")
+        for player_id, race in enumerate(races, start=1):
+            player = info.player_info.add(player_id=player_id, race_requested=race.value, race_actual=race.value)
+            if player_id == 1:
+                player.type = PlayerType.Participant.value
+            else:
+                player.type = PlayerType.Computer.value
+                player.difficulty = Difficulty.Easy.value
+
+        start_raw = info.start_raw
+        start_raw.map_size.CopyFrom(size)
+        start_raw.pathing_grid.CopyFrom(common_pb.ImageData(
+            bits_per_pixel=1, size=size, data=np.packbits(self.pathable).tobytes()))
+        start_raw.placement_grid.CopyFrom(common_pb.ImageData(
+            bits_per_pixel=1, size=size, data=np.packbits(self.placeable).tobytes()))
+        start_raw.terrain_height.CopyFrom(common_pb.ImageData(
+            bits_per_pixel=8, size=size, data=self.terrain_height.tobytes()))
+        start_raw.playable_area.p0.x, start_raw.playable_area.p0.y = 1, 1
+        start_raw.playable_area.p1.x, start_raw.playable_area.p1.y = self.size - 1, self.size - 1
+        # Like the game, only the opponent's start location is listed
+        for location in self.start_locations[1:]:
+            start_raw.start_locations.add(x=location.x, y=location.y)
+        return info
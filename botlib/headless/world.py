@@ -0,0 +1,799 @@
+import math
+import random
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from s2clientprotocol import raw_pb2 as raw_pb
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.data import ActionResult, Alliance, CloakState, DisplayType, Result
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.buff_id import BuffId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+
+from .game_data import UNITS, PRODUCES, LOOPS_PER_SECOND, AIR, GROUND, UnitData, game_data_proto
+from .synthetic_map import SyntheticMap
+
+PLAYER_ID, ENEMY_ID, NEUTRAL_ID = 1, 2, 16
+SELF, ENEMY, NEUTRAL = Alliance.Self.value, Alliance.Enemy.value, Alliance.Neutral.value
+
+MINING_RATE = 0.94 / LOOPS_PER_SECOND  # per worker and game loop, about 56 a minute
+MULE_MINING_RATE = 3.5 / LOOPS_PER_SECOND
+MULE_LIFETIME = 64 * LOOPS_PER_SECOND
+HEAL_RATE = 12.6 / LOOPS_PER_SECOND  # health per loop, costing a third of that in energy
+ENERGY_REGEN = 0.7875 / LOOPS_PER_SECOND
+ENEMY_AGGRO_RANGE = 10.0
+ARRIVED = 0.5
+
+CONSTRUCTION = {ability for ability, unit_type in PRODUCES.items()
+                if ability.name.startswith("TERRANBUILD_")}
+MORPHS = {
+    AbilityId.MORPH_SUPPLYDEPOT_LOWER: (UnitTypeId.SUPPLYDEPOT, UnitTypeId.SUPPLYDEPOTLOWERED),
+    AbilityId.MORPH_SUPPLYDEPOT_RAISE: (UnitTypeId.SUPPLYDEPOTLOWERED, UnitTypeId.SUPPLYDEPOT),
+}
+
+Target = Union[None, int, Point2]
+
+
+class Scenario:
+    """ Shape of a synthetic game, units counts our workers and army but not structures
+
+    The base is sized to the unit count, with more command centers, production
+    and depots as it grows, so the bot starts in a plausible mid game. With
+    reinforce set, fallen units are replaced so the scale holds for the whole run.
+    """
+
+    def __init__(self, units: int = 60, enemies: int = 40, steps: int = 2000, seed: int = 1,
+                 game_step: int = 8, reinforce: bool = True, minerals: int = 400, vespene: int = 200) -> None:
+        self.units = units
+        self.enemies = enemies
+        self.steps = steps
+        self.seed = seed
+        self.game_step = game_step
+        self.reinforce = reinforce
+        self.minerals = minerals
+        self.vespene = vespene
+
+    @property
+    def workers(self) -> int:
+        if self.units <= 12:
+            return self.units
+        return max(12, min(66, int(self.units * 0.4)))
+
+    @property
+    def army(self) -> int:
+        return self.units - self.workers
+
+    def __repr__(self) -> str:
+        return "Scenario(units={}, enemies={}, steps={}, seed={})".format(
+            self.units, self.enemies, self.steps, self.seed)
+
+
+class SimOrder:
+    __slots__ = ("ability", "target", "progress")
+
+    def __init__(self, ability: AbilityId, target: Target = None) -> None:
+        self.ability = ability
+        self.target = target
+        self.progress = 0.0
+
+
+class SimUnit:
+    __slots__ = ("tag", "type_id", "data", "alliance", "x", "y", "health", "shield", "energy",
+                 "build_progress", "orders", "mineral_contents", "vespene_contents", "carrying",
+                 "waypoint", "expires")
+
+    def __init__(self, tag: int, type_id: UnitTypeId, alliance: int, position: Point2,
+                 build_progress: float = 1.0) -> None:
+        self.tag = tag
+        self.type_id = type_id
+        self.data = UNITS[type_id]  # type: UnitData
+        self.alliance = alliance
+        self.x, self.y = position.x, position.y
+        self.build_progress = build_progress
+        self.health = self.data.health * (0.1 + 0.9 * build_progress)
+        self.shield = self.data.shield
+        self.energy = self.data.energy
+        self.orders = []  # type: List[SimOrder]
+        self.mineral_contents = 0
+        self.vespene_contents = 0
+        self.carrying = False
+        self.waypoint = None  # type: Optional[Point2]
+        self.expires = None  # type: Optional[float]
+
+    @property
+    def position(self) -> Point2:
+        return Point2((self.x, self.y))
+
+    @property
+    def is_structure(self) -> bool:
+        return self.data.footprint > 0 or self.alliance == NEUTRAL
+
+    @property
+    def is_ready(self) -> bool:
+        return self.build_progress >= 1.0
+
+    def distance_to(self, x: float, y: float) -> float:
+        return math.hypot(self.x - x, self.y - y)
+
+    def morph(self, type_id: UnitTypeId) -> None:
+        self.type_id = type_id
+        self.data = UNITS[type_id]
+
+
+class World:
+    """ Game state for the headless server, stepped a few game loops at a time
+
+    This is not a simulation of StarCraft II. Orders, production, mining and
+    fights are approximated just closely enough that the bot keeps seeing
+    changing, plausible observations at the scale set by the scenario.
+    """
+
+    player_id = PLAYER_ID
+
+    def __init__(self, scenario: Scenario, game_map: SyntheticMap = None) -> None:
+        self.scenario = scenario
+        self.map = game_map or SyntheticMap()
+        self.rng = random.Random(scenario.seed)
+
+        self.loop = 0
+        self.minerals = float(scenario.minerals)
+        self.vespene = float(scenario.vespene)
+        self.units = {}  # type: Dict[int, SimUnit]
+        self.occupied = np.zeros_like(self.map.placeable)
+        self._next_tag = 4294967297  # real tags are large, keep the same magnitude
+        self._dead = []  # type: List[int]
+        self._sites = {}  # type: Dict[Tuple[float, float], int]  # build target -> structure tag
+        self._army_types = []  # type: List[UnitTypeId]
+
+        self.front = self.map.map_center
+        self.rally = Point2((self.map.bases[1].center.x - 4, self.map.bases[1].center.y + 20))
+        self._setup()
+
+    @property
+    def game_step(self) -> int:
+        return self.scenario.game_step
+
+    @property
+    def result(self) -> Optional[Result]:
+        """ Our result once the game is over: losing every structure, wiping out the enemy or running out of steps """
+        if not any(u.alliance == SELF and u.data.footprint for u in self.units.values()):
+            return Result.Defeat
+        if self.scenario.enemies and not self.scenario.reinforce and \
+                not any(u.alliance == ENEMY for u in self.units.values()):
+            return Result.Victory
+        if self.loop >= self.scenario.steps * self.scenario.game_step:
+            return Result.Tie
+        return None
+
+    @property
+    def finished(self) -> bool:
+        return self.result is not None
+
+    def game_info_proto(self, races) -> sc_pb.ResponseGameInfo:
+        return self.map.game_info_proto(races)
+
+    def game_data_proto(self) -> sc_pb.ResponseData:
+        return game_data_proto()
+
+    def position_of(self, tag: int) -> Point2:
+        return self.units[tag].position
+
+    # Setup
+
+    def _setup(self) -> None:
+        scenario = self.scenario
+        for base in self.map.bases:
+            for i, position in enumerate(base.minerals):
+                self.spawn(UnitTypeId.MINERALFIELD, NEUTRAL, position).mineral_contents = 1800 if i % 2 else 900
+            for position in base.geysers:
+                self.spawn(UnitTypeId.VESPENEGEYSER, NEUTRAL, position).vespene_contents = 2250
+
+        ours = self.map.bases[:len(self.map.bases) // 2]
+        theirs = self.map.bases[len(self.map.bases) // 2:]
+        main = ours[0].center
+        ramp_side = Point2((main.x + 6, main.y + 3))
+
+        base_count = 1 + (scenario.units >= 40) + (scenario.units >= 120)
+        for i, base in enumerate(ours[:base_count]):
+            orbital = i == 0 and scenario.units >= 40
+            self.spawn(UnitTypeId.ORBITALCOMMAND if orbital else UnitTypeId.COMMANDCENTER, SELF, base.center)
+
+        army = scenario.army
+        medivacs = army // 10 if scenario.units >= 80 else 0
+        hellions = army // 8 if scenario.units >= 60 else 0
+        self._army_types = [UnitTypeId.MEDIVAC] * medivacs + [UnitTypeId.HELLION] * hellions
+        self._army_types += [UnitTypeId.MARINE] * (army - len(self._army_types))
+
+        production = [UnitTypeId.BARRACKS] * (min(5, 1 + army // 40) if army else 0)
+        if hellions:
+            production.append(UnitTypeId.FACTORY)
+            for geyser in self._resources_near(main, UnitTypeId.VESPENEGEYSER):
+                self.spawn(UnitTypeId.REFINERY, SELF, geyser.position).vespene_contents = geyser.vespene_contents
+        if medivacs:
+            production.append(UnitTypeId.STARPORT)
+        for unit_type in production:
+            self.spawn(unit_type, SELF, self.free_spot(unit_type, ramp_side))
+
+        food = scenario.workers + sum(UNITS[t].food_required for t in self._army_types)
+        depots = max(1 if army else 0, math.ceil((food - 15 * base_count) / 8) + 1)
+        for _ in range(depots):
+            self.spawn(UnitTypeId.SUPPLYDEPOT, SELF, self.free_spot(UnitTypeId.SUPPLYDEPOT, main))
+
+        self._spawn_workers(scenario.workers, ours[:base_count])
+        for unit_type in self._army_types:
+            self._spawn_army(unit_type)
+
+        enemy_main = theirs[0].center
+        self.spawn(UnitTypeId.NEXUS, ENEMY, enemy_main)
+        for unit_type in (UnitTypeId.PYLON, UnitTypeId.PYLON, UnitTypeId.GATEWAY, UnitTypeId.GATEWAY):
+            self.spawn(unit_type, ENEMY, self.free_spot(unit_type, enemy_main))
+        for _ in range(scenario.enemies):
+            self._spawn_enemy(self.front)
+
+    def _spawn_workers(self, count: int, bases) -> None:
+        mining = []
+        for base in bases:
+            fields = self._resources_near(base.center, UnitTypeId.MINERALFIELD)
+            mining += [fields[i % len(fields)] for i in range(2 * len(fields))]
+        refineries = [u for u in self.units.values() if u.type_id == UnitTypeId.REFINERY]
+        mining += [refinery for refinery in refineries for _ in range(3)]
+
+        main = bases[0].center
+        for i in range(count):
+            if i < len(mining):
+                target = mining[i]
+                position = Point2((target.x + self.rng.uniform(-1.5, 1.5), target.y + self.rng.uniform(-1.5, 1.5)))
+                scv = self.spawn(UnitTypeId.SCV, SELF, position.towards(main, 2))
+                scv.orders.append(SimOrder(AbilityId.HARVEST_GATHER, target.tag))
+                scv.carrying = self.rng.random() < 0.5
+            else:
+                self.spawn(UnitTypeId.SCV, SELF, self._scatter(main, 3))
+
+    def _spawn_army(self, unit_type: UnitTypeId) -> SimUnit:
+        unit = self.spawn(unit_type, SELF, self._scatter(self.rally, 3))
+        if unit_type == UnitTypeId.MARINE and self.rng.random() < 0.25:
+            unit.health = self.rng.uniform(10, unit.data.health - 1)
+        return unit
+
+    def _spawn_enemy(self, around: Point2) -> SimUnit:
+        unit_type = UnitTypeId.ZEALOT if self.rng.random() < 0.6 else UnitTypeId.STALKER
+        return self.spawn(unit_type, ENEMY, self._scatter(around, 5))
+
+    def _scatter(self, around: Point2, spread: float) -> Point2:
+        limit = self.map.size - 2
+        return Point2((min(max(self.rng.gauss(around.x, spread), 2), limit),
+                       min(max(self.rng.gauss(around.y, spread), 2), limit)))
+
+    def _resources_near(self, position: Point2, unit_type: UnitTypeId, distance: float = 10) -> List[SimUnit]:
+        return [u for u in self.units.values()
+                if u.type_id == unit_type and u.distance_to(position.x, position.y) < distance]
+
+    # Units and placement
+
+    def spawn(self, unit_type: UnitTypeId, alliance: int, position: Point2, build_progress: float = 1.0) -> SimUnit:
+        unit = SimUnit(self._next_tag, unit_type, alliance, position, build_progress)
+        self._next_tag += 1
+        self.units[unit.tag] = unit
+        self._occupy(unit, True)
+        return unit
+
+    def _footprint(self, unit: SimUnit):
+        if unit.type_id == UnitTypeId.MINERALFIELD:
+            return slice(int(unit.y), int(unit.y) + 1), slice(int(unit.x) - 1, int(unit.x) + 1)
+        if unit.data.footprint:
+            return self.map.footprint(unit.position, unit.data.footprint)
+        return None
+
+    def _occupy(self, unit: SimUnit, occupied: bool) -> None:
+        # Refineries sit on a geyser, which keeps the ground taken
+        if unit.type_id == UnitTypeId.REFINERY:
+            return
+        footprint = self._footprint(unit)
+        if footprint is not None:
+            self.occupied[footprint] = occupied
+
+    def can_place(self, unit_type: UnitTypeId, position: Point2) -> bool:
+        size = UNITS[unit_type].footprint
+        rows, cols = self.map.footprint(position, size)
+        if not self.map.in_bounds(rows, cols):
+            return False
+        return bool(self.map.placeable[rows, cols].all()) and not self.occupied[rows, cols].any()
+
+    def free_spot(self, unit_type: UnitTypeId, near: Point2, max_distance: int = 30) -> Point2:
+        """ Closest placeable spot for the structure, searching outwards in square rings """
+        offset = 0.5 if UNITS[unit_type].footprint % 2 else 0.0
+        x0, y0 = int(near.x) + offset, int(near.y) + offset
+        for distance in range(max_distance):
+            ring = [(dx, dy) for dx in range(-distance, distance + 1) for dy in range(-distance, distance + 1)
+                    if max(abs(dx), abs(dy)) == distance]
+            for dx, dy in sorted(ring, key=lambda d: d[0] ** 2 + d[1] ** 2):
+                position = Point2((x0 + dx, y0 + dy))
+                if self.can_place(unit_type, position):
+                    return position
+        raise ValueError("No room for {} near {}".format(unit_type.name, near))
+
+    def _kill(self, unit: SimUnit) -> None:
+        del self.units[unit.tag]
+        self._occupy(unit, False)
+        self._dead.append(unit.tag)
+        for site, tag in list(self._sites.items()):
+            if tag == unit.tag:
+                del self._sites[site]
+
+    # Economy
+
+    @property
+    def food_used(self) -> float:
+        used = 0.0
+        for unit in self.units.values():
+            if unit.alliance != SELF:
+                continue
+            used += unit.data.food_required
+            for order in unit.orders:
+                if unit.data.footprint and order.ability in PRODUCES:
+                    used += UNITS[PRODUCES[order.ability]].food_required
+        return used
+
+    @property
+    def food_cap(self) -> float:
+        provided = sum(u.data.food_provided for u in self.units.values() if u.alliance == SELF and u.is_ready)
+        return min(provided, 200)
+
+    def _pay(self, data: UnitData) -> ActionResult:
+        minerals, vespene = data.minerals, data.vespene
+        if data.tech_alias:
+            minerals -= UNITS[data.tech_alias].minerals
+            vespene -= UNITS[data.tech_alias].vespene
+        if minerals > self.minerals:
+            return ActionResult.NotEnoughMinerals
+        if vespene > self.vespene:
+            return ActionResult.NotEnoughVespene
+        self.minerals -= minerals
+        self.vespene -= vespene
+        return ActionResult.Success
+
+    # Commands
+
+    def apply(self, command: raw_pb.ActionRawUnitCommand) -> ActionResult:
+        """ Carries out a raw unit command for each of its units, returning the last failure if any """
+        try:
+            ability = AbilityId(command.ability_id)
+        except ValueError:
+            return ActionResult.NotSupported
+
+        target = None  # type: Target
+        if command.HasField("target_world_space_pos"):
+            target = Point2((command.target_world_space_pos.x, command.target_world_space_pos.y))
+        elif command.HasField("target_unit_tag"):
+            target = command.target_unit_tag
+            if target not in self.units:
+                return ActionResult.CantTargetThatUnit
+
+        result = ActionResult.Success
+        for tag in command.unit_tags:
+            unit = self.units.get(tag)
+            if unit is None or unit.alliance != SELF:
+                result = ActionResult.Error
+                continue
+            outcome = self._command(unit, ability, target, command.queue_command)
+            if outcome != ActionResult.Success:
+                result = outcome
+        return result
+
+    def _command(self, unit: SimUnit, ability: AbilityId, target: Target, queue: bool) -> ActionResult:
+        if ability in (AbilityId.STOP, AbilityId.HOLDPOSITION):
+            unit.orders = []
+            return ActionResult.Success
+
+        if ability in MORPHS:
+            before, after = MORPHS[ability]
+            if unit.type_id != before or not unit.is_ready:
+                return ActionResult.Error
+            unit.morph(after)
+            return ActionResult.Success
+
+        if ability == AbilityId.CALLDOWNMULE_CALLDOWNMULE:
+            return self._call_down_mule(unit, target)
+
+        if ability in CONSTRUCTION:
+            return self._build(unit, ability, target, queue)
+
+        if ability in PRODUCES:
+            return self._train(unit, ability, queue)
+
+        if ability == AbilityId.SMART and isinstance(target, int):
+            other = self.units[target]
+            if other.alliance == ENEMY:
+                ability = AbilityId.ATTACK
+            elif other.mineral_contents or other.type_id == UnitTypeId.REFINERY:
+                ability = AbilityId.HARVEST_GATHER
+        elif ability == AbilityId.SMART:
+            ability = AbilityId.MOVE
+
+        if ability == AbilityId.HARVEST_RETURN:
+            unit.carrying = False
+        self._order(unit, SimOrder(ability, target), queue)
+        return ActionResult.Success
+
+    @staticmethod
+    def _order(unit: SimUnit, order: SimOrder, queue: bool) -> None:
+        if queue:
+            unit.orders.append(order)
+        else:
+            unit.orders = [order]
+
+    def _train(self, structure: SimUnit, ability: AbilityId, queue: bool) -> ActionResult:
+        data = UNITS[PRODUCES[ability]]
+        if not structure.data.footprint or not structure.is_ready:
+            return ActionResult.Error
+        if len(structure.orders) >= 5:
+            return ActionResult.QueueIsFull
+        if data.food_required and self.food_used + data.food_required > self.food_cap:
+            return ActionResult.NotEnoughFood
+        paid = self._pay(data)
+        if paid == ActionResult.Success:
+            structure.orders.append(SimOrder(ability))
+        return paid
+
+    def _build(self, scv: SimUnit, ability: AbilityId, target: Target, queue: bool) -> ActionResult:
+        unit_type = PRODUCES[ability]
+        if unit_type == UnitTypeId.REFINERY:
+            geyser = self.units.get(target) if isinstance(target, int) else None
+            if geyser is None or geyser.type_id != UnitTypeId.VESPENEGEYSER:
+                return ActionResult.CantBuildOnThat
+            position = geyser.position
+            if (position.x, position.y) in self._sites or any(
+                    u.type_id == UnitTypeId.REFINERY and u.distance_to(position.x, position.y) < 1
+                    for u in self.units.values()):
+                return ActionResult.CantBuildOnThat
+        elif isinstance(target, Point2):
+            position = target
+            if not self.can_place(unit_type, position):
+                return ActionResult.CantBuildLocationInvalid
+        else:
+            return ActionResult.Error
+
+        paid = self._pay(UNITS[unit_type])
+        if paid != ActionResult.Success:
+            return paid
+        # The game only places the structure once the SCV arrives, this places it straight away
+        structure = self.spawn(unit_type, SELF, position, build_progress=0.0)
+        if unit_type == UnitTypeId.REFINERY:
+            # Refineries report the gas left in their geyser
+            structure.vespene_contents = geyser.vespene_contents
+        self._sites[(position.x, position.y)] = structure.tag
+        self._order(scv, SimOrder(ability, target), queue)
+        return ActionResult.Success
+
+    def _call_down_mule(self, orbital: SimUnit, target: Target) -> ActionResult:
+        if orbital.energy < 50:
+            return ActionResult.NotEnoughEnergy
+        mineral = self.units.get(target) if isinstance(target, int) else None
+        if mineral is None or not mineral.mineral_contents:
+            return ActionResult.MustTargetResources
+        orbital.energy -= 50
+        mule = self.spawn(UnitTypeId.MULE, SELF, Point2((mineral.x, mineral.y - 1)))
+        mule.orders.append(SimOrder(AbilityId.HARVEST_GATHER, mineral.tag))
+        mule.expires = self.loop + MULE_LIFETIME
+        return ActionResult.Success
+
+    # Stepping
+
+    def advance(self, loops: int) -> None:
+        self.loop += loops
+        self._run_orders(loops)
+        self._fight(loops)
+
+        for unit in list(self.units.values()):
+            # Resources have no health to lose
+            if (unit.data.health and unit.health <= 0) or (unit.expires is not None and unit.expires <= self.loop):
+                self._kill(unit)
+            elif unit.data.energy:
+                unit.energy = min(200.0, unit.energy + ENERGY_REGEN * loops)
+
+        if self.scenario.reinforce:
+            self._reinforce()
+
+    def _reinforce(self) -> None:
+        enemies = sum(1 for u in self.units.values() if u.alliance == ENEMY and not u.data.footprint)
+        for _ in range(self.scenario.enemies - enemies):
+            self._spawn_enemy(self.map.bases[len(self.map.bases) // 2 + 1].center)
+
+        army_types = set(self._army_types)
+        army = sum(1 for u in self.units.values() if u.alliance == SELF and u.type_id in army_types)
+        for _ in range(self.scenario.army - army):
+            self._spawn_army(self.rng.choice(self._army_types))
+
+    def _run_orders(self, loops: int) -> None:
+        sites_worked = set()
+        for unit in list(self.units.values()):
+            if not unit.orders or unit.tag not in self.units:
+                continue
+            order = unit.orders[0]
+            ability = order.ability
+
+            if unit.data.footprint:
+                self._produce(unit, order, loops)
+            elif ability in CONSTRUCTION or ability in (AbilityId.SMART, AbilityId.EFFECT_REPAIR):
+                site = self._site_for(order)
+                if site is None or site.is_ready:
+                    unit.orders.pop(0)
+                elif self._approach(unit, site.x, site.y, site.data.radius + 1, loops):
+                    sites_worked.add(site.tag)
+            elif ability == AbilityId.HARVEST_GATHER:
+                self._gather(unit, order, loops)
+            elif ability == AbilityId.HARVEST_RETURN:
+                unit.orders.pop(0)
+            elif ability == AbilityId.MEDIVACHEAL_HEAL:
+                self._heal(unit, order, loops)
+            elif ability == AbilityId.MOVE and isinstance(order.target, Point2):
+                if self._approach(unit, order.target.x, order.target.y, ARRIVED, loops):
+                    unit.orders.pop(0)
+            elif ability == AbilityId.MOVE and isinstance(order.target, int):
+                other = self.units.get(order.target)
+                if other is None or self._approach(unit, other.x, other.y, ARRIVED + other.data.radius, loops):
+                    unit.orders.pop(0)
+            # Attack orders are carried out by _fight
+
+        for tag in sites_worked:
+            site = self.units[tag]
+            progress = min(loops / site.data.build_time, 1.0 - site.build_progress)
+            site.build_progress += progress
+            site.health = min(site.data.health, site.health + 0.9 * site.data.health * progress)
+            if site.build_progress >= 1.0:
+                site.build_progress = 1.0
+                for position, site_tag in list(self._sites.items()):
+                    if site_tag == tag:
+                        del self._sites[position]
+
+    def _site_for(self, order: SimOrder) -> Optional[SimUnit]:
+        if isinstance(order.target, Point2):
+            tag = self._sites.get((order.target.x, order.target.y))
+        elif order.ability in CONSTRUCTION:
+            # Refineries are ordered on the geyser
+            geyser = self.units.get(order.target)
+            tag = self._sites.get((geyser.x, geyser.y)) if geyser else None
+        else:
+            tag = order.target
+        site = self.units.get(tag) if tag is not None else None
+        return site if site is not None and site.alliance == SELF else None
+
+    def _produce(self, structure: SimUnit, order: SimOrder, loops: int) -> None:
+        if not structure.is_ready or order.ability not in PRODUCES:
+            structure.orders.pop(0)
+            return
+        data = UNITS[PRODUCES[order.ability]]
+        order.progress += loops / data.build_time
+        if order.progress < 1.0:
+            return
+
+        structure.orders.pop(0)
+        if data.tech_alias:
+            structure.morph(data.type_id)
+            structure.energy = data.energy
+        else:
+            side = structure.data.radius + data.radius + 0.5
+            self.spawn(data.type_id, SELF, self._scatter(Point2((structure.x + side, structure.y - side)), 0.5))
+
+    def _gather(self, worker: SimUnit, order: SimOrder, loops: int) -> None:
+        resource = self.units.get(order.target)
+        if resource is None or (resource.type_id == UnitTypeId.REFINERY and not resource.is_ready):
+            worker.orders.pop(0)
+            return
+        if not self._approach(worker, resource.x, resource.y, resource.data.radius + 2.5, loops):
+            return
+
+        if worker.type_id == UnitTypeId.MULE:
+            self.minerals += MULE_MINING_RATE * loops
+        elif resource.type_id == UnitTypeId.REFINERY:
+            self.vespene += MINING_RATE * loops
+        else:
+            self.minerals += MINING_RATE * loops
+        # Trips take about five seconds, half of it carrying
+        worker.carrying = (self.loop + worker.tag) % 112 < 56
+
+    def _heal(self, medivac: SimUnit, order: SimOrder, loops: int) -> None:
+        patient = self.units.get(order.target)
+        if patient is None or patient.health >= patient.data.health or medivac.energy < 1:
+            medivac.orders.pop(0)
+            return
+        if self._approach(medivac, patient.x, patient.y, 4, loops):
+            healed = min(HEAL_RATE * loops, patient.data.health - patient.health, medivac.energy * 3)
+            patient.health += healed
+            medivac.energy -= healed / 3
+
+    def _approach(self, unit: SimUnit, x: float, y: float, reach: float, loops: int) -> bool:
+        """ Moves the unit towards (x, y), true once it is within reach """
+        distance = unit.distance_to(x, y)
+        if distance <= reach:
+            return True
+        travel = unit.data.speed * loops / LOOPS_PER_SECOND
+        if travel >= distance - reach:
+            travel = distance - reach
+        unit.x += (x - unit.x) * travel / distance
+        unit.y += (y - unit.y) * travel / distance
+        return travel >= distance - reach
+
+    def _fight(self, loops: int) -> None:
+        """ Every armed unit shoots its target, or the closest enemy in range, for the loops passed """
+        ours = [u for u in self.units.values() if u.alliance == SELF]
+        theirs = [u for u in self.units.values() if u.alliance == ENEMY]
+        if not ours or not theirs:
+            self._wander(theirs, loops)
+            return
+
+        our_xy = np.array([(u.x, u.y) for u in ours])
+        their_xy = np.array([(u.x, u.y) for u in theirs])
+        distances = np.sqrt(((our_xy[:, None, :] - their_xy[None, :, :]) ** 2).sum(axis=2))
+
+        damage = {}  # type: Dict[int, float]
+        seconds = loops / LOOPS_PER_SECOND
+        their_index = {u.tag: j for j, u in enumerate(theirs)}
+
+        for i, unit in enumerate(ours):
+            if not unit.data.weapons or not unit.is_ready:
+                continue
+            order = unit.orders[0] if unit.orders else None
+            if order is not None and order.ability != AbilityId.ATTACK:
+                continue
+            if order is not None and isinstance(order.target, int):
+                j = their_index.get(order.target)
+                if j is None:
+                    unit.orders.pop(0)
+                    continue
+            else:
+                j = int(distances[i].argmin())
+                reach = self._weapon(unit, theirs[j])
+                if reach is None or distances[i, j] > reach[0] + (2 if order else 0):
+                    # Nothing to shoot, keep walking
+                    if order is not None and self._approach(unit, order.target.x, order.target.y, ARRIVED, loops):
+                        unit.orders.pop(0)
+                    continue
+            self._shoot(unit, theirs[j], distances[i, j], damage, seconds, loops)
+
+        for j, enemy in enumerate(theirs):
+            if not enemy.data.weapons:
+                continue
+            i = int(distances[:, j].argmin())
+            if distances[i, j] > ENEMY_AGGRO_RANGE:
+                self._wander([enemy], loops)
+                continue
+            self._shoot(enemy, ours[i], distances[i, j], damage, seconds, loops)
+
+        for tag, amount in damage.items():
+            victim = self.units[tag]
+            absorbed = min(victim.shield, amount)
+            victim.shield -= absorbed
+            victim.health -= amount - absorbed
+
+    def _shoot(self, unit: SimUnit, target: SimUnit, distance: float, damage: Dict[int, float],
+               seconds: float, loops: int) -> None:
+        weapon = self._weapon(unit, target)
+        if weapon is None:
+            return
+        reach, dps = weapon
+        if distance > reach and not self._approach(unit, target.x, target.y, reach, loops):
+            return
+        damage[target.tag] = damage.get(target.tag, 0.0) + dps * seconds
+
+    @staticmethod
+    def _weapon(unit: SimUnit, target: SimUnit) -> Optional[Tuple[float, float]]:
+        """ (reach, damage per second) of the unit against the target, edge to edge """
+        kind = AIR if target.data.flying else GROUND
+        for weapon in unit.data.weapons:
+            if weapon.target == kind or weapon.target not in (AIR, GROUND):
+                reach = weapon.range + unit.data.radius + target.data.radius
+                return reach, weapon.damage * weapon.attacks / weapon.cooldown
+        return None
+
+    def _wander(self, enemies: List[SimUnit], loops: int) -> None:
+        for enemy in enemies:
+            if enemy.data.footprint:
+                continue
+            if enemy.waypoint is None or self._approach(enemy, enemy.waypoint.x, enemy.waypoint.y, ARRIVED, loops):
+                enemy.waypoint = self._scatter(self.front, 8)
+
+    # Observations and queries
+
+    def placement_result(self, ability_id: int, x: float, y: float) -> ActionResult:
+        unit_type = PRODUCES.get(AbilityId(ability_id))
+        if unit_type is None:
+            return ActionResult.Error
+        if self.can_place(unit_type, Point2((x, y))):
+            return ActionResult.Success
+        return ActionResult.CantBuildLocationInvalid
+
+    def observation(self) -> sc_pb.ResponseObservation:
+        """ What the game sends for RequestObservation, as seen by player 1 with full vision """
+        response = sc_pb.ResponseObservation()
+        observation = response.observation
+        observation.game_loop = self.loop
+
+        workers = sum(1 for u in self.units.values() if u.alliance == SELF and u.type_id == UnitTypeId.SCV)
+        food_used = self.food_used
+        common = observation.player_common
+        common.player_id = PLAYER_ID
+        common.minerals = int(self.minerals)
+        common.vespene = int(self.vespene)
+        common.food_cap = int(self.food_cap)
+        common.food_used = int(food_used)
+        common.food_workers = workers
+        common.food_army = int(food_used) - workers
+        common.idle_worker_count = sum(1 for u in self.units.values()
+                                       if u.type_id == UnitTypeId.SCV and not u.orders)
+
+        raw = observation.raw_data
+        raw.event.dead_units.extend(self._dead)
+        self._dead = []
+
+        harvesters = self._harvesters()
+        for unit in self.units.values():
+            self._unit_proto(raw.units.add(), unit, harvesters)
+
+        result = self.result
+        if result is not None:
+            enemy_result = {Result.Victory: Result.Defeat, Result.Defeat: Result.Victory}.get(result, result)
+            response.player_result.add(player_id=PLAYER_ID, result=result.value)
+            response.player_result.add(player_id=ENEMY_ID, result=enemy_result.value)
+        return response
+
+    def _harvesters(self) -> Dict[int, Tuple[int, int]]:
+        """ (assigned, ideal) workers for each of our command centers and refineries """
+        townhalls = [u for u in self.units.values() if u.alliance == SELF and u.is_ready and
+                     u.type_id in (UnitTypeId.COMMANDCENTER, UnitTypeId.ORBITALCOMMAND)]
+        townhall_of = {}
+        ideal = {}
+        for townhall in townhalls:
+            fields = self._resources_near(townhall.position, UnitTypeId.MINERALFIELD)
+            ideal[townhall.tag] = 2 * len(fields)
+            for field in fields:
+                townhall_of[field.tag] = townhall.tag
+        for refinery in self.units.values():
+            if refinery.type_id == UnitTypeId.REFINERY and refinery.is_ready:
+                townhall_of[refinery.tag] = refinery.tag
+                ideal[refinery.tag] = 3
+
+        assigned = dict.fromkeys(ideal, 0)
+        for unit in self.units.values():
+            if unit.type_id == UnitTypeId.SCV and unit.orders and unit.orders[0].ability == AbilityId.HARVEST_GATHER:
+                owner = townhall_of.get(unit.orders[0].target)
+                if owner is not None:
+                    assigned[owner] += 1
+        return {tag: (assigned[tag], ideal[tag]) for tag in ideal}
+
+    def _unit_proto(self, proto: raw_pb.Unit, unit: SimUnit, harvesters: Dict[int, Tuple[int, int]]) -> None:
+        data = unit.data
+        proto.display_type = DisplayType.Visible.value
+        proto.alliance = unit.alliance
+        proto.tag = unit.tag
+        proto.unit_type = unit.type_id.value
+        proto.owner = {SELF: PLAYER_ID, ENEMY: ENEMY_ID}.get(unit.alliance, NEUTRAL_ID)
+        proto.pos.x, proto.pos.y = unit.x, unit.y
+        proto.pos.z = self.map.height_at(unit.x, unit.y)
+        proto.radius = data.radius
+        proto.build_progress = unit.build_progress
+        proto.cloak = CloakState.NotCloaked.value
+        proto.is_flying = data.flying
+        if unit.alliance != NEUTRAL:
+            proto.health = max(unit.health, 0.0)
+            proto.health_max = data.health
+            proto.shield = unit.shield
+            proto.shield_max = data.shield
+        if data.energy:
+            proto.energy = unit.energy
+            proto.energy_max = 200
+        proto.mineral_contents = unit.mineral_contents
+        proto.vespene_contents = unit.vespene_contents
+        if unit.carrying:
+            proto.buff_ids.append(BuffId.CARRYMINERALFIELDMINERALS.value)
+        if unit.tag in harvesters:
+            proto.assigned_harvesters, proto.ideal_harvesters = harvesters[unit.tag]
+
+        for order in unit.orders:
+            order_proto = proto.orders.add(ability_id=order.ability.value, progress=min(order.progress, 1.0))
+            if isinstance(order.target, Point2):
+                order_proto.target_world_space_pos.x = order.target.x
+                order_proto.target_world_space_pos.y = order.target.y
+            elif order.target is not None:
+                order_proto.target_unit_tag = order.target
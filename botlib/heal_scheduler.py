@@ -0,0 +1,129 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import sc2
+from sc2.constants import MARINE, MEDIVAC
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+
+from .unit_events import UnitEvents, CREATED, DESTROYED, HEALTH_CHANGED
+
+
+def nearest_pairs(healer_xy: np.ndarray, patient_xy: np.ndarray) -> List[Tuple[int, int]]:
+    """ Greedily pairs healers and patients, shortest distance first, each used at most once """
+    if not len(healer_xy) or not len(patient_xy):
+        return []
+
+    distances = np.subtract.outer(healer_xy[:, 0], patient_xy[:, 0]) ** 2 + \
+        np.subtract.outer(healer_xy[:, 1], patient_xy[:, 1]) ** 2
+    wanted = min(distances.shape)
+
+    pairs = []
+    used_healers, used_patients = set(), set()
+    for flat in np.argsort(distances, axis=None, kind="stable"):
+        healer, patient = divmod(int(flat), distances.shape[1])
+        if healer in used_healers or patient in used_patients:
+            continue
+        pairs.append((healer, patient))
+        used_healers.add(healer)
+        used_patients.add(patient)
+        if len(pairs) == wanted:
+            break
+    return pairs
+
+
+class HealScheduler:
+    """ Keeps medivacs paired with injured marines across steps
+
+    Injured marines and our medivacs are followed from unit events, so a
+    marine joins the injured when it loses health and leaves once healed or
+    dead. Each step only the pairs are checked, for the medivac running low
+    on energy or dropping the heal order, and medivacs are only looked at
+    while an injured marine is waiting for one. A step where nothing changed
+    and nobody is waiting issues no orders and looks at no other units.
+    """
+
+    def __init__(self, game: sc2.BotAI, min_energy: float = 5) -> None:
+        self.game = game
+        self.min_energy = min_energy
+
+        self.assignments = {}  # type: Dict[int, int]  # marine tag -> medivac tag
+        self._healers = {}  # type: Dict[int, int]  # medivac tag -> marine tag
+        self._injured = set()  # type: Set[int]  # marine tags below full health
+        self._medivacs = set()  # type: Set[int]
+        # Orders only show up on the units a step later, so these are not dropped heals yet
+        self._fresh = set()
+
+    def subscribe(self, events: UnitEvents) -> None:
+        events.subscribe(CREATED, self._created)
+        events.subscribe(HEALTH_CHANGED, self._health_changed)
+        events.subscribe(DESTROYED, self._destroyed)
+
+    def _created(self, unit: Unit) -> None:
+        if unit.type_id == MEDIVAC:
+            self._medivacs.add(unit.tag)
+        elif unit.type_id == MARINE and unit.health < unit.health_max:
+            self._injured.add(unit.tag)
+
+    def _health_changed(self, unit: Unit, previous: float) -> None:
+        if unit.type_id != MARINE:
+            return
+        if unit.health < unit.health_max:
+            self._injured.add(unit.tag)
+        else:
+            self._injured.discard(unit.tag)
+            if unit.tag in self.assignments:
+                self._release(unit.tag)
+
+    def _destroyed(self, tag: int, unit_type: UnitTypeId, finished: bool) -> None:
+        self._injured.discard(tag)
+        self._medivacs.discard(tag)
+        if tag in self.assignments:
+            self._release(tag)
+        if tag in self._healers:
+            self._release(self._healers[tag])
+
+    async def on_step(self, iteration):
+        for medivac, marine in self.reconcile(self.game.snapshot.by_tag):
+            await self.game.do(medivac(AbilityId.MEDIVACHEAL_HEAL, marine))
+
+    def reconcile(self, lookup: Callable[[int], Optional[Unit]]) -> List[Tuple[Unit, Unit]]:
+        """ Checks the pairs and matches waiting marines, returning the (medivac, marine) pairs to order
+
+        lookup returns this step's unit for a tag, or None when it can't be seen.
+        """
+        for marine_tag, medivac_tag in list(self.assignments.items()):
+            medivac = lookup(medivac_tag)
+            if medivac is None or lookup(marine_tag) is None or \
+                    medivac.energy <= self.min_energy or \
+                    (medivac.is_idle and medivac_tag not in self._fresh):
+                self._release(marine_tag)
+
+        waiting = [tag for tag in self._injured if tag not in self.assignments]
+        if not waiting or len(self._healers) >= len(self._medivacs):
+            self._fresh = set()
+            return []
+
+        injured = [marine for marine in map(lookup, sorted(waiting)) if marine is not None]
+        available = [medivac for medivac in map(lookup, sorted(self._medivacs))
+                     if medivac is not None and medivac.tag not in self._healers and
+                     medivac.is_idle and medivac.energy > self.min_energy]
+
+        pairs = nearest_pairs(
+            np.array([(m.position.x, m.position.y) for m in available]).reshape(-1, 2),
+            np.array([(m.position.x, m.position.y) for m in injured]).reshape(-1, 2))
+
+        orders = []
+        for healer, patient in pairs:
+            medivac, marine = available[healer], injured[patient]
+            self.assignments[marine.tag] = medivac.tag
+            self._healers[medivac.tag] = marine.tag
+            orders.append((medivac, marine))
+
+        self._fresh = {medivac.tag for medivac, _ in orders}
+        return orders
+
+    def _release(self, marine_tag: int) -> None:
+        medivac_tag = self.assignments.pop(marine_tag)
+        self._healers.pop(medivac_tag, None)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import sc2
+from sc2.game_info import Ramp
+from sc2.position import Point2
+from sc2.unit import Unit
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1  # bump when what is stored, or how it is worked out, changes
+DEFAULT_ROOT = os.environ.get("ALPHA_BOT_MAP_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "alpha_bot"))
+
+Arrays = Dict[str, np.ndarray]
+
+
+def open_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Empty arrays can't be memory-mapped
+        return np.load(path)
+
+
+class MapCache:
+    """ Map analysis kept on disk between games, keyed by the map's name and a hash of its grids
+
+    Each map has a directory of .npy files, opened memory-mapped, and a
+    meta.json listing the entries and the cache version. A directory written
+    by another version is cleared and filled again. Entries are worked out
+    and saved the first time they are asked for.
+    """
+
+    def __init__(self, game: sc2.BotAI, root: Optional[str] = DEFAULT_ROOT) -> None:
+        self.game = game
+        self.root = root  # None to always work everything out
+        self.hits = 0
+        self.misses = 0
+
+        self._directory = None  # type: Optional[str]
+
+    @property
+    def directory(self) -> str:
+        """ Worked out from the first step's grids, before any structure of ours changes them """
+        if self._directory is None:
+            info = self.game.game_info
+            digest = hashlib.sha1("{}x{}".format(info.map_size.width, info.map_size.height).encode())
+            for grid in (info.pathing_grid, info.placement_grid, info.terrain_height):
+                digest.update(grid._proto.data)
+            name = re.sub(r"[^\w.-]+", "_", info.map_name)
+            self._directory = os.path.join(self.root, "maps", "{}-{}".format(name, digest.hexdigest()[:16]))
+        return self._directory
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._meta_path()) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION:
+            logger.info("Map cache {} is from version {}, rebuilding".format(self.directory, meta.get("version")))
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return None
+        return meta
+
+    def load(self, entry: str) -> Optional[Arrays]:
+        meta = self._read_meta() if self.root else None
+        names = meta["entries"].get(entry) if meta else None
+        if names is None:
+            return None
+        try:
+            return {name: open_array(os.path.join(self.directory, "{}.{}.npy".format(entry, name))) for name in names}
+        except (OSError, ValueError):
+            return None
+
+    def save(self, entry: str, arrays: Arrays):
+        if not self.root:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Written aside and moved in place, other games on the same map may be reading
+        for name, array in arrays.items():
+            path = os.path.join(self.directory, "{}.{}.npy".format(entry, name))
+            with open(path + ".tmp", "wb") as array_file:
+                np.save(array_file, array)
+            os.replace(path + ".tmp", path)
+
+        meta = self._read_meta() or {"version": CACHE_VERSION, "map": self.game.game_info.map_name, "entries": {}}
+        meta["entries"][entry] = sorted(arrays)
+        with open(self._meta_path() + ".tmp", "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+        os.replace(self._meta_path() + ".tmp", self._meta_path())
+
+    def get(self, entry: str, build: Callable[[], Arrays]) -> Arrays:
+        """ The entry's arrays from disk, or from build when missing or unreadable, saving them for next time """
+        arrays = self.load(entry)
+        if arrays is not None:
+            self.hits += 1
+            return arrays
+
+        self.misses += 1
+        arrays = build()
+        try:
+            self.save(entry, arrays)
+        except OSError as error:
+            logger.warning("Could not save {} to the map cache: {}".format(entry, error))
+        return arrays
+
+    def ramps(self) -> Tuple[List[Ramp], Set[Point2]]:
+        """ The map's ramps and vision blockers, what the library works out on the first step """
+        info = self.game.game_info
+
+        def build() -> Arrays:
+            ramps, vision_blockers = info._find_ramps_and_vision_blockers()
+            points = [(point.x, point.y, group) for group, ramp in enumerate(ramps) for point in ramp.points]
+            return {
+                "points": np.array([(x, y) for x, y, _ in points], dtype=np.int32).reshape(-1, 2),
+                "groups": np.array([group for _, _, group in points], dtype=np.int32),
+                "vision_blockers": np.array(sorted(vision_blockers), dtype=np.int32).reshape(-1, 2),
+            }
+
+        arrays = self.get("ramps", build)
+        groups = {}  # type: Dict[int, Set[Point2]]
+        for (x, y), group in zip(arrays["points"].tolist(), arrays["groups"].tolist()):
+            groups.setdefault(group, set()).add(Point2((x, y)))
+        ramps = [Ramp(groups[group], info) for group in sorted(groups)]
+        return ramps, {Point2((x, y)) for x, y in arrays["vision_blockers"].tolist()}
+
+    def expansion_locations(self) -> Dict[Point2, List[Unit]]:
+        """ The library's expansion locations, with this game's resources matched up by position """
+        game = self.game
+
+        def build() -> Arrays:
+            locations = sc2.BotAI.expansion_locations.fget(game)
+            centres = list(locations)
+            resources = [(resource.position.x, resource.position.y, i)
+                         for i, centre in enumerate(centres) for resource in locations[centre]]
+            return {
+                "centres": np.array([(centre.x, centre.y) for centre in centres], dtype=np.float64).reshape(-1, 2),
+                "resources": np.array([(x, y) for x, y, _ in resources], dtype=np.float64).reshape(-1, 2),
+                "owners": np.array([i for _, _, i in resources], dtype=np.int32),
+            }
+
+        arrays = self.get("expansions", build)
+        by_position = {(resource.position.x, resource.position.y): resource for resource in game.state.resources}
+        locations = {Point2(centre): [] for centre in arrays["centres"].tolist()}  # type: Dict[Point2, List[Unit]]
+        centres = list(locations)
+        for (x, y), owner in zip(arrays["resources"].tolist(), arrays["owners"].tolist()):
+            resource = by_position.get((x, y))
+            if resource is None:
+                # Not the resources the analysis was made with, work it out for this game
+                logger.warning("Map cache resources do not match the game's, not using the cached expansions")
+                return sc2.BotAI.expansion_locations.fget(game)
+            locations[centres[owner]].append(resource)
+        return locations
@@ -0,0 +1,172 @@
+from typing import Dict, Optional, Set
+
+import sc2
+from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, PLANETARYFORTRESS, REFINERY, SCV
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+from sc2.unit import Unit
+
+from .unit_events import UnitEvents, CREATED, CONSTRUCTION_COMPLETED, DESTROYED
+
+TOWNHALLS = {COMMANDCENTER, ORBITALCOMMAND, PLANETARYFORTRESS}
+
+PATCH_WORKERS = 2
+REFINERY_WORKERS = 3
+
+
+class MiningManager:
+    """ Keeps every SCV assigned to a mineral patch or refinery of a finished base
+
+    Assignments and saturation are only changed by unit events: a worker
+    born or lost, a base or refinery finished or lost. Depleted patches are
+    looked for when the number of mineral fields changes. Orders are only
+    given to workers whose assignment changed, or who went idle, say after
+    building something.
+    """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+
+        self.ideal_workers = 0  # mining slots of every patch and refinery
+        self.workers = 0  # our SCVs, assigned or not
+
+        self._assignment = {}  # type: Dict[int, int]  # worker tag -> resource tag
+        self._miners = {}  # type: Dict[int, Set[int]]  # resource tag -> worker tags
+        self._slots = {}  # type: Dict[int, int]  # resource tag -> workers it takes
+        self._positions = {}  # type: Dict[int, Point2]  # resource tag -> where it is
+        self._townhall_of = {}  # type: Dict[int, int]  # mineral patch tag -> townhall tag
+        self._refineries = set()  # type: Set[int]
+        self._unassigned = set()  # type: Set[int]  # workers without a resource, waiting for a base
+        self._changed = set()  # type: Set[int]  # workers to send to their resource
+        self._mineral_fields = 0
+
+    def subscribe(self, events: UnitEvents):
+        events.subscribe(CREATED, self._created)
+        events.subscribe(CONSTRUCTION_COMPLETED, self._construction_completed)
+        events.subscribe(DESTROYED, self._destroyed)
+
+    def _created(self, unit: Unit):
+        if unit.type_id == SCV:
+            self.workers += 1
+            self._assign(unit.tag, unit.position)
+        elif unit.is_ready:
+            # The starting command center is there from the first step
+            self._construction_completed(unit)
+
+    def _construction_completed(self, unit: Unit):
+        if unit.type_id in TOWNHALLS:
+            self._add_base(unit)
+        elif unit.type_id == REFINERY:
+            self._add_refinery(unit)
+
+    def _destroyed(self, tag: int, unit_type: UnitTypeId, was_ready: bool):
+        if unit_type == SCV:
+            self.workers -= 1
+            self._unassign(tag)
+            self._unassigned.discard(tag)
+            self._changed.discard(tag)
+        elif unit_type in TOWNHALLS:
+            for patch in [patch for patch, townhall in self._townhall_of.items() if townhall == tag]:
+                self._remove_resource(patch)
+        elif tag in self._refineries:
+            self._remove_resource(tag)
+
+    def _add_base(self, townhall: Unit):
+        for patch in self.game.state.mineral_field.closer_than(10, townhall):
+            if patch.tag not in self._slots:
+                self._townhall_of[patch.tag] = townhall.tag
+                self._add_resource(patch.tag, patch.position, PATCH_WORKERS)
+        self._assign_waiting()
+
+    def _add_refinery(self, refinery: Unit):
+        self._refineries.add(refinery.tag)
+        self._add_resource(refinery.tag, refinery.position, REFINERY_WORKERS)
+        # Move the nearest mineral workers over, from the busiest patches first
+        patches = sorted((p for p in self._townhall_of if self._miners[p]), key=lambda p: (
+            -len(self._miners[p]), self._positions[p].distance_to_point2(refinery.position)))
+        for patch in patches[:REFINERY_WORKERS]:
+            worker = next(iter(self._miners[patch]))
+            self._unassign(worker)
+            self._give(worker, refinery.tag)
+        self._assign_waiting()
+
+    def _add_resource(self, tag: int, position: Point2, slots: int):
+        self._slots[tag] = slots
+        self._miners[tag] = set()
+        self._positions[tag] = position
+        self.ideal_workers += slots
+
+    def _remove_resource(self, tag: int):
+        self.ideal_workers -= self._slots.pop(tag)
+        position = self._positions.pop(tag)
+        self._townhall_of.pop(tag, None)
+        self._refineries.discard(tag)
+        for worker in self._miners.pop(tag):
+            del self._assignment[worker]
+            self._assign(worker, position)
+
+    def _assign(self, worker: int, near: Point2):
+        """ Fills free patches before refineries and the closest first, doubling up once all are taken """
+        if not self._slots:
+            self._unassigned.add(worker)
+            return
+        resource = min(self._slots, key=lambda r: (
+            len(self._miners[r]) >= self._slots[r], r in self._refineries, len(self._miners[r]),
+            self._positions[r].distance_to_point2(near)))
+        self._give(worker, resource)
+
+    def _assign_waiting(self):
+        waiting, self._unassigned = self._unassigned, set()
+        for worker in waiting:
+            self._assign(worker, self.game.start_location)
+
+    def _give(self, worker: int, resource: int):
+        self._assignment[worker] = resource
+        self._miners[resource].add(worker)
+        self._changed.add(worker)
+
+    def _unassign(self, worker: int):
+        resource = self._assignment.pop(worker, None)
+        if resource is not None:
+            self._miners[resource].discard(worker)
+
+    def resource_of(self, worker: int) -> Optional[int]:
+        return self._assignment.get(worker)
+
+    def saturation(self, resource: int) -> int:
+        return len(self._miners.get(resource, ()))
+
+    async def on_step(self, iteration):
+        self._remove_depleted()
+
+        snapshot = self.game.snapshot
+        for worker in snapshot.idle(SCV):
+            if worker.tag in self._assignment:
+                self._changed.add(worker.tag)
+        if not self._changed:
+            return
+
+        workers = {worker.tag: worker for worker in snapshot.of_type(SCV)}
+        targets = {patch.tag: patch for patch in self.game.state.mineral_field}
+        targets.update((refinery.tag, refinery) for refinery in snapshot.ready(REFINERY))
+        for tag in list(self._changed):
+            worker = workers.get(tag)
+            # Workers inside a refinery are out of sight, builders finish first
+            if worker is None or worker.is_constructing_scv:
+                continue
+            self._changed.discard(tag)
+            target = targets.get(self._assignment.get(tag))
+            if target is not None:
+                await self.game.do(worker.gather(target))
+
+    def _remove_depleted(self):
+        fields = self.game.state.mineral_field
+        if len(fields) != self._mineral_fields:
+            self._mineral_fields = len(fields)
+            remaining = {field.tag for field in fields}
+            for patch in [patch for patch in self._townhall_of if patch not in remaining]:
+                self._remove_resource(patch)
+
+        for refinery in self.game.snapshot.ready(REFINERY):
+            if refinery.tag in self._refineries and not refinery.vespene_contents:
+                self._remove_resource(refinery.tag)
@@ -0,0 +1,339 @@
+import os
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+
+import numpy as np
+import sc2
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.constants import geyser_ids, mineral_ids
+from sc2.game_state import Blip, Common, GameState
+from sc2.ids.upgrade_id import UpgradeId
+from sc2.position import Point2, Point3
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Per step columns, read from the player_common part of the observation
+COMMON_COLUMNS = [
+    ("minerals", np.int32), ("vespene", np.int32), ("food_cap", np.int16), ("food_used", np.int16),
+    ("food_army", np.int16), ("food_workers", np.int16), ("idle_worker_count", np.int16),
+    ("army_count", np.int16), ("warp_gate_count", np.int16), ("larva_count", np.int16),
+]
+
+# Per unit columns, named after the proto fields they hold
+UNIT_COLUMNS = [
+    ("tag", np.uint64), ("unit_type", np.uint32), ("alliance", np.uint8), ("owner", np.uint8),
+    ("display_type", np.uint8), ("cloak", np.uint8), ("facing", np.float32), ("radius", np.float32),
+    ("build_progress", np.float32), ("health", np.float32), ("health_max", np.float32),
+    ("shield", np.float32), ("shield_max", np.float32), ("energy", np.float32), ("energy_max", np.float32),
+    ("mineral_contents", np.int32), ("vespene_contents", np.int32), ("is_flying", np.bool_),
+    ("is_burrowed", np.bool_), ("is_powered", np.bool_), ("is_active", np.bool_), ("is_blip", np.bool_),
+    ("is_hallucination", np.bool_), ("weapon_cooldown", np.float32),
+    ("assigned_harvesters", np.int16), ("ideal_harvesters", np.int16), ("add_on_tag", np.uint64),
+    ("cargo_space_taken", np.int16), ("cargo_space_max", np.int16), ("engaged_target_tag", np.uint64),
+]
+
+# Per order columns, the order's target is a unit when target_tag is set and a position otherwise
+ORDER_COLUMNS = [
+    ("ability_id", np.uint32), ("target_tag", np.uint64), ("target_x", np.float32), ("target_y", np.float32),
+    ("has_target_pos", np.bool_), ("progress", np.float32),
+]
+
+# Variable length lists, stored flat with an offset per step or per unit
+LIST_COLUMNS = ["unit_start", "order_start", "buff_start", "dead_start", "upgrade_start"]
+
+UNIT_FIELDS = frozenset(name for name, _ in UNIT_COLUMNS)
+
+
+class ObservationRecorder:
+    """ Writes the observation the bot sees each step into columnar .npz chunks
+
+    The directory holds game.npz with the game info and data the bot started
+    with, and steps_<n>.npz files of chunk_steps steps each. Units, orders,
+    buffs, dead units and upgrades are flat columns with start offsets, so a
+    chunk is a handful of arrays however many units were on the map.
+    """
+
+    def __init__(self, game: sc2.BotAI, path: str, chunk_steps: int = 1000, compress: bool = True) -> None:
+        self.game = game
+        self.path = path
+        self.chunk_steps = chunk_steps
+        self.compress = compress
+        self.chunks = 0
+        self.steps = 0
+        self._started = False
+        self._clear()
+
+    def _clear(self) -> None:
+        self._loops = []  # type: List[int]
+        self._common = {name: [] for name, _ in COMMON_COLUMNS}  # type: Dict[str, list]
+        self._units = {name: [] for name, _ in UNIT_COLUMNS}  # type: Dict[str, list]
+        self._x, self._y, self._z = [], [], []
+        self._orders = {name: [] for name, _ in ORDER_COLUMNS}  # type: Dict[str, list]
+        self._buffs, self._dead, self._upgrades = [], [], []
+        self._starts = {name: [0] for name in LIST_COLUMNS}  # type: Dict[str, List[int]]
+
+    def record(self, state) -> None:
+        """ Appends the step's observation, writing a chunk once chunk_steps are held """
+        if not self._started:
+            self._write_game()
+            self._started = True
+
+        observation = state.observation
+        raw = observation.raw_data
+        self._loops.append(observation.game_loop)
+        common = observation.player_common
+        for name, _ in COMMON_COLUMNS:
+            self._common[name].append(getattr(common, name))
+
+        units, orders = self._units, self._orders
+        for unit in raw.units:
+            for name, _ in UNIT_COLUMNS:
+                units[name].append(getattr(unit, name))
+            self._x.append(unit.pos.x)
+            self._y.append(unit.pos.y)
+            self._z.append(unit.pos.z)
+            for order in unit.orders:
+                orders["ability_id"].append(order.ability_id)
+                orders["target_tag"].append(order.target_unit_tag)
+                has_pos = order.HasField("target_world_space_pos")
+                orders["target_x"].append(order.target_world_space_pos.x if has_pos else 0.0)
+                orders["target_y"].append(order.target_world_space_pos.y if has_pos else 0.0)
+                orders["has_target_pos"].append(has_pos)
+                orders["progress"].append(order.progress)
+            self._starts["order_start"].append(len(orders["ability_id"]))
+            self._buffs.extend(unit.buff_ids)
+            self._starts["buff_start"].append(len(self._buffs))
+        self._starts["unit_start"].append(len(units["tag"]))
+
+        self._dead.extend(raw.event.dead_units)
+        self._starts["dead_start"].append(len(self._dead))
+        self._upgrades.extend(raw.player.upgrade_ids)
+        self._starts["upgrade_start"].append(len(self._upgrades))
+
+        self.steps += 1
+        if len(self._loops) >= self.chunk_steps:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._loops:
+            return
+        columns = {"game_loop": np.array(self._loops, dtype=np.uint32),
+                   "x": np.array(self._x, dtype=np.float32),
+                   "y": np.array(self._y, dtype=np.float32),
+                   "z": np.array(self._z, dtype=np.float32),
+                   "buff_ids": np.array(self._buffs, dtype=np.uint16),
+                   "dead_units": np.array(self._dead, dtype=np.uint64),
+                   "upgrade_ids": np.array(self._upgrades, dtype=np.uint32)}
+        for group, values in ((COMMON_COLUMNS, self._common), (UNIT_COLUMNS, self._units),
+                              (ORDER_COLUMNS, self._orders)):
+            for name, dtype in group:
+                columns[name] = np.array(values[name], dtype=dtype)
+        for name, starts in self._starts.items():
+            columns[name] = np.array(starts, dtype=np.int64)
+
+        self._save("steps_{:05d}.npz".format(self.chunks), columns)
+        self.chunks += 1
+        self._clear()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _write_game(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        game_data = self.game._game_data
+        data = sc_pb.ResponseData()
+        data.abilities.extend(ability._proto for ability in game_data.abilities.values())
+        data.units.extend(unit._proto for unit in game_data.units.values())
+        data.upgrades.extend(upgrade._proto for upgrade in game_data.upgrades.values())
+        self._save("game.npz", {
+            "game_info": np.frombuffer(self.game.game_info._proto.SerializeToString(), dtype=np.uint8),
+            "game_data": np.frombuffer(data.SerializeToString(), dtype=np.uint8),
+            "player_id": np.array(self.game.player_id),
+        })
+
+    def _save(self, name: str, columns: Dict[str, np.ndarray]) -> None:
+        save = np.savez_compressed if self.compress else np.savez
+        save(os.path.join(self.path, name), **columns)
+
+
+class ObservationReader:
+    """ Streams a recording back as observation protos, one chunk in memory at a time """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with np.load(os.path.join(path, "game.npz")) as game:
+            self.game_info = sc_pb.ResponseGameInfo.FromString(game["game_info"].tobytes())
+            self.game_data = sc_pb.ResponseData.FromString(game["game_data"].tobytes())
+            self.player_id = int(game["player_id"])
+        self.chunks = sorted(name for name in os.listdir(path) if name.startswith("steps_"))
+
+    def __len__(self) -> int:
+        steps = 0
+        for name in self.chunks:
+            with np.load(os.path.join(self.path, name)) as chunk:
+                steps += len(chunk["game_loop"])
+        return steps
+
+    def _columns(self) -> Iterator[Dict[str, list]]:
+        for name in self.chunks:
+            with np.load(os.path.join(self.path, name)) as chunk:
+                # Plain lists index far faster than numpy scalars
+                yield {key: chunk[key].tolist() for key in chunk.files}
+
+    def __iter__(self) -> Iterator[sc_pb.ResponseObservation]:
+        for columns in self._columns():
+            for step in range(len(columns["game_loop"])):
+                yield self._observation(columns, step)
+
+    def states(self) -> Iterator[GameState]:
+        """ Streams the recording back as game states read straight from the columns, no protos are built """
+        # Whatever the recording leaves out (map state, score, effects) is the same empty value every step
+        template = GameState(sc_pb.ResponseObservation())
+        for columns in self._columns():
+            for step in range(len(columns["game_loop"])):
+                yield RecordedState(template, columns, step, self.player_id)
+
+    def _observation(self, columns: Dict[str, list], step: int) -> sc_pb.ResponseObservation:
+        response = sc_pb.ResponseObservation()
+        observation = response.observation
+        observation.game_loop = columns["game_loop"][step]
+        common = observation.player_common
+        common.player_id = self.player_id
+        for name, _ in COMMON_COLUMNS:
+            setattr(common, name, columns[name][step])
+
+        raw = observation.raw_data
+        dead_start = columns["dead_start"]
+        raw.event.dead_units.extend(columns["dead_units"][dead_start[step]:dead_start[step + 1]])
+        upgrade_start = columns["upgrade_start"]
+        raw.player.upgrade_ids.extend(columns["upgrade_ids"][upgrade_start[step]:upgrade_start[step + 1]])
+
+        unit_columns = [(name, columns[name]) for name, _ in UNIT_COLUMNS]
+        x, y, z = columns["x"], columns["y"], columns["z"]
+        order_start, buff_start, buff_ids = columns["order_start"], columns["buff_start"], columns["buff_ids"]
+        ability_id, target_tag, progress = columns["ability_id"], columns["target_tag"], columns["progress"]
+        target_x, target_y, has_target_pos = columns["target_x"], columns["target_y"], columns["has_target_pos"]
+
+        unit_start = columns["unit_start"]
+        for row in range(unit_start[step], unit_start[step + 1]):
+            unit = raw.units.add()
+            for name, values in unit_columns:
+                # Unset fields read as zero anyway, and setting proto fields is the slow part
+                if values[row]:
+                    setattr(unit, name, values[row])
+            unit.pos.x, unit.pos.y, unit.pos.z = x[row], y[row], z[row]
+            for i in range(order_start[row], order_start[row + 1]):
+                order = unit.orders.add(ability_id=ability_id[i], progress=progress[i])
+                if has_target_pos[i]:
+                    order.target_world_space_pos.x = target_x[i]
+                    order.target_world_space_pos.y = target_y[i]
+                elif target_tag[i]:
+                    order.target_unit_tag = target_tag[i]
+            unit.buff_ids.extend(buff_ids[buff_start[row]:buff_start[row + 1]])
+        return response
+
+
+class RecordedOrder:
+    __slots__ = ("ability_id", "target_unit_tag", "target_world_space_pos", "progress")
+
+    def __init__(self, ability_id: int, target_unit_tag: int, target_world_space_pos, progress: float) -> None:
+        self.ability_id = ability_id
+        self.target_unit_tag = target_unit_tag
+        self.target_world_space_pos = target_world_space_pos
+        self.progress = progress
+
+    def HasField(self, name: str) -> bool:
+        return getattr(self, name) is not None
+
+
+class RecordedUnit:
+    """ Stands in for a unit's proto, reading each field from the chunk's columns when it is asked for """
+    __slots__ = ("_columns", "_row")
+
+    # Fields the recording leaves out, which read as zero on a proto too
+    detect_range = radar_range = 0.0
+    is_selected = is_on_screen = False
+    attack_upgrade_level = armor_upgrade_level = shield_upgrade_level = 0
+    buff_duration_remain = buff_duration_max = 0
+    passengers = rally_targets = ()
+
+    def __init__(self, columns: Dict[str, list], row: int) -> None:
+        self._columns = columns
+        self._row = row
+
+    def __getattr__(self, name: str):
+        if name not in UNIT_FIELDS:
+            raise AttributeError(name)
+        return self._columns[name][self._row]
+
+    @property
+    def pos(self) -> Point3:
+        columns, row = self._columns, self._row
+        return Point3((columns["x"][row], columns["y"][row], columns["z"][row]))
+
+    @property
+    def orders(self) -> List[RecordedOrder]:
+        columns = self._columns
+        order_start = columns["order_start"]
+        ability_id, target_tag, progress = columns["ability_id"], columns["target_tag"], columns["progress"]
+        target_x, target_y, has_target_pos = columns["target_x"], columns["target_y"], columns["has_target_pos"]
+        return [RecordedOrder(ability_id[i], 0 if has_target_pos[i] else target_tag[i],
+                              Point2((target_x[i], target_y[i])) if has_target_pos[i] else None, progress[i])
+                for i in range(order_start[self._row], order_start[self._row + 1])]
+
+    @property
+    def buff_ids(self) -> List[int]:
+        buff_start = self._columns["buff_start"]
+        return self._columns["buff_ids"][buff_start[self._row]:buff_start[self._row + 1]]
+
+
+class RecordedState(GameState):
+    """ A GameState read from a chunk's columns, sharing the parts the recording leaves out with a template """
+
+    def __init__(self, template: GameState, columns: Dict[str, list], step: int, player_id: int) -> None:
+        # GameState's own __init__ reads a proto, the attributes it would set are filled here instead
+        self.__dict__.update(template.__dict__)
+        self.game_loop = columns["game_loop"][step]
+        self.common = Common(SimpleNamespace(player_id=player_id,
+                                             **{name: columns[name][step] for name, _ in COMMON_COLUMNS}))
+        dead_start, upgrade_start = columns["dead_start"], columns["upgrade_start"]
+        self.dead_units = set(columns["dead_units"][dead_start[step]:dead_start[step + 1]])
+        self.upgrades = {UpgradeId(upgrade)
+                         for upgrade in columns["upgrade_ids"][upgrade_start[step]:upgrade_start[step + 1]]}
+        start, stop = columns["unit_start"][step], columns["unit_start"][step + 1]
+        self.raw_units = [RecordedUnit(columns, row) for row in range(start, stop)]
+
+        self._blipUnits = []
+        self.own_units = Units([])
+        self.enemy_units = Units([])
+        self.mineral_field = Units([])
+        self.vespene_geyser = Units([])
+        self.resources = Units([])
+        self.destructables = Units([])
+        self.watchtowers = Units([])
+        self.units = Units([])
+        # Sorted as GameState sorts them, reading the columns rather than the units
+        for unit, is_blip, alliance, unit_type in zip(self.raw_units, columns["is_blip"][start:stop],
+                                                      columns["alliance"][start:stop],
+                                                      columns["unit_type"][start:stop]):
+            if is_blip:
+                self._blipUnits.append(unit)
+                continue
+            unit_obj = Unit(unit)
+            self.units.append(unit_obj)
+            if alliance == 3:
+                if unit_type == 149:
+                    self.watchtowers.append(unit_obj)
+                elif unit_type in mineral_ids:
+                    self.mineral_field.append(unit_obj)
+                    self.resources.append(unit_obj)
+                elif unit_type in geyser_ids:
+                    self.vespene_geyser.append(unit_obj)
+                    self.resources.append(unit_obj)
+                else:
+                    self.destructables.append(unit_obj)
+            elif alliance == 1:
+                self.own_units.append(unit_obj)
+            elif alliance == 4:
+                self.enemy_units.append(unit_obj)
+        self.blips = {Blip(unit) for unit in self._blipUnits}
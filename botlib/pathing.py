@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import sc2
+from sc2.position import Point2
+
+from .compute_pool import ComputePool
+
+# Distances are kept in half cells, so straight steps cost 2 and diagonal ones 3 (1.5 cells, near enough to root 2)
+STRAIGHT, DIAGONAL = 2, 3
+UNREACHABLE = np.iinfo(np.int32).max
+SEED_RADIUS = 6  # cells searched around a target inside a structure, such as a start location, for pathable ground
+
+FieldKey = Tuple[int, int]
+
+
+def field_key(target: Point2) -> FieldKey:
+    return (int(target.x), int(target.y))
+
+
+class DistanceField:
+    __slots__ = ("target", "version", "distances")
+
+    def __init__(self, target: Point2, version: int, distances: np.ndarray) -> None:
+        self.target = target
+        self.version = version
+        self.distances = distances  # [y + 1, x + 1] in half cells, the grid has a border of unpathable cells
+
+
+class PathingFields:
+    """ Ground distance fields towards targets on the map, such as expansions, the enemy main or our ramp
+
+    A field holds every cell's walking distance to its target, worked out
+    with a Dijkstra over the pathing grid where each distance bucket is
+    expanded at once with NumPy. Fields are kept for the most recently used
+    targets, and only worked out again when asked for after structures have
+    changed the pathing grid. With a compute pool a field which went out of
+    date is worked out again in the background, and the old one answers
+    until the new one is handed back.
+    """
+
+    def __init__(self, game: sc2.BotAI, size: int = 16, compute: Optional[ComputePool] = None) -> None:
+        self.game = game
+        self.size = size
+        self.compute = compute
+        self.computed = 0  # fields worked out, for benchmarks
+
+        self._fields = OrderedDict()  # type: Dict[FieldKey, DistanceField]
+        self._grid_data = None  # type: Optional[bytes]
+        self._grid_loop = -1
+        self._version = 0
+        self._pathable = None  # type: Optional[np.ndarray]
+        self._offsets = None  # type: Optional[Tuple[np.ndarray, np.ndarray]]  # flat index steps and their costs
+        self._refreshing = {}  # type: Dict[FieldKey, int]  # grid version of the fields being worked out in the pool
+
+    def _grid(self) -> np.ndarray:
+        """ The padded pathing grid, looked at again at most once a step """
+        loop = self.game.state.game_loop
+        if loop != self._grid_loop:
+            self._grid_loop = loop
+            grid = self.game.game_info.pathing_grid
+            data = grid._proto.data
+            if data != self._grid_data:
+                self._grid_data = data
+                self._version += 1
+                self._pathable = np.pad(grid.data_numpy != 0, 1, mode="constant")
+                width = self._pathable.shape[1]
+                steps = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+                self._offsets = (np.array([dy * width + dx for dx, dy in steps]),
+                                 np.array([DIAGONAL if dx and dy else STRAIGHT for dx, dy in steps], dtype=np.int32))
+        return self._pathable
+
+    def field(self, target: Point2) -> DistanceField:
+        pathable = self._grid()
+        key = field_key(target)
+        field = self._fields.get(key)
+        if field is not None and field.version == self._version:
+            self._fields.move_to_end(key)
+            return field
+
+        if field is not None and self.compute is not None:
+            # Keep walking the old field while the new one is worked out, unless the pool is full
+            if self._refreshing.get(key) != self._version or not self.compute.pending(("pathing", key)):
+                job = self.compute.submit(("pathing", key), compute_field, pathable, self._offsets, target,
+                                          on_done=partial(self._refreshed, key, target, self._version))
+                if job is not None and not job.done:
+                    self._refreshing[key] = self._version
+            field = self._fields[key]
+            self._fields.move_to_end(key)
+            return field
+
+        field = DistanceField(target, self._version, compute_field(pathable, self._offsets, target))
+        self._store(key, field)
+        return field
+
+    def _refreshed(self, key: FieldKey, target: Point2, version: int, distances: np.ndarray):
+        if self._refreshing.get(key) == version:
+            del self._refreshing[key]
+        field = self._fields.get(key)
+        if field is None or field.version < version:
+            self._store(key, DistanceField(target, version, distances))
+
+    def _store(self, key: FieldKey, field: DistanceField):
+        self.computed += 1
+        self._fields[key] = field
+        self._fields.move_to_end(key)
+        while len(self._fields) > self.size:
+            self._fields.popitem(last=False)
+
+    def distance(self, target: Point2, position: Point2) -> float:
+        """ Walking distance in cells from position to target, inf when it cannot be walked """
+        distances = self.field(target).distances
+        x, y = int(position.x) + 1, int(position.y) + 1
+        if not (0 <= y < distances.shape[0] and 0 <= x < distances.shape[1]):
+            return float("inf")
+        # Units standing next to a structure can be on a blocked cell, take the best cell around them
+        best = int(distances[y - 1:y + 2, x - 1:x + 2].min())
+        return float("inf") if best == UNREACHABLE else best / 2
+
+    def next_waypoint(self, target: Point2, position: Point2, lookahead: int = 8) -> Point2:
+        return self.waypoints(target, np.array([[position.x, position.y]]), lookahead)[0]
+
+    def waypoints(self, target: Point2, positions: np.ndarray, lookahead: int = 8) -> List[Point2]:
+        """ Where each position gets to after lookahead cells downhill on the field, the target once in reach """
+        distances = self.field(target).distances
+        height, width = distances.shape
+        xs = np.clip(positions[:, 0].astype(np.int32) + 1, 1, width - 2)
+        ys = np.clip(positions[:, 1].astype(np.int32) + 1, 1, height - 2)
+        steps = np.array([(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+        for _ in range(lookahead):
+            around = distances[ys[:, None] + steps[:, 1], xs[:, None] + steps[:, 0]]
+            best = around.argmin(axis=1)
+            xs = np.clip(xs + steps[best, 0], 1, width - 2)
+            ys = np.clip(ys + steps[best, 1], 1, height - 2)
+
+        reached = distances[ys, xs]
+        waypoints = []
+        for x, y, distance in zip(xs.tolist(), ys.tolist(), reached.tolist()):
+            if distance == UNREACHABLE or distance <= lookahead * STRAIGHT:
+                waypoints.append(target)
+            else:
+                waypoints.append(Point2((x - 0.5, y - 0.5)))
+        return waypoints
+
+
+def compute_field(pathable: np.ndarray, offsets: Tuple[np.ndarray, np.ndarray], target: Point2) -> np.ndarray:
+    """ Every cell's distance to the target over the padded grid, it reads nothing else so it can run in a worker """
+    flat_pathable = pathable.ravel()
+    distances = np.full(flat_pathable.shape, UNREACHABLE, dtype=np.int32)
+    width = pathable.shape[1]
+
+    # Start from the target's cell, or the pathable cells around it when it is blocked
+    x, y = int(target.x) + 1, int(target.y) + 1
+    if pathable[y, x]:
+        seeds, seed_distances = np.array([y * width + x]), np.array([0])
+    else:
+        ys, xs = np.nonzero(pathable[max(y - SEED_RADIUS, 0):y + SEED_RADIUS + 1,
+                                     max(x - SEED_RADIUS, 0):x + SEED_RADIUS + 1])
+        ys, xs = ys + max(y - SEED_RADIUS, 0), xs + max(x - SEED_RADIUS, 0)
+        seeds = ys * width + xs
+        seed_distances = np.round(np.hypot(xs + 0.5 - (target.x + 1), ys + 0.5 - (target.y + 1)) * 2)
+        seed_distances = seed_distances.astype(np.int32)
+    if not len(seeds):
+        return distances.reshape(pathable.shape)
+
+    buckets = {}  # type: Dict[int, List[np.ndarray]]
+    for seed, distance in zip(seeds.tolist(), seed_distances.tolist()):
+        distances[seed] = min(distances[seed], distance)
+        buckets.setdefault(distance, []).append(np.array([seed]))
+
+    # No step costs less than 2, so the cells of two buckets in a row can't shorten each other's distances
+    offsets, costs = offsets
+    current = min(buckets)
+    while buckets:
+        queued = buckets.pop(current, []) + buckets.pop(current + 1, [])
+        if not queued:
+            current += 2
+            continue
+        cells = np.unique(np.concatenate(queued))
+        # Cells reached more cheaply since they were queued are already done
+        base = distances[cells]
+        cells, base = cells[base <= current + 1], base[base <= current + 1]
+        neighbours = (cells[:, None] + offsets).ravel()
+        reached = (base[:, None] + costs).ravel()
+        better = flat_pathable[neighbours] & (distances[neighbours] > reached)
+        neighbours, reached = neighbours[better], reached[better]
+        if len(neighbours):
+            np.minimum.at(distances, neighbours, reached)
+            kept = distances[neighbours] == reached
+            neighbours, reached = neighbours[kept], reached[kept]
+            for distance in range(current + STRAIGHT, current + 1 + DIAGONAL + 1):
+                bucket = neighbours[reached == distance]
+                if len(bucket):
+                    buckets.setdefault(distance, []).append(bucket)
+        current += 2
+    return distances.reshape(pathable.shape)
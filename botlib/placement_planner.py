@@ -0,0 +1,275 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import sc2
+from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, PLANETARYFORTRESS, SUPPLYDEPOT, SUPPLYDEPOTLOWERED, \
+    BARRACKS, FACTORY, STARPORT, REFINERY, ENGINEERINGBAY, ARMORY, BUNKER, MISSILETURRET, SENSORTOWER, \
+    GHOSTACADEMY, FUSIONCORE
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+
+Footprint = Tuple[slice, slice]
+
+# Side of the square each structure covers on the placement grid
+STRUCTURE_SIZES = {
+    COMMANDCENTER: 5, ORBITALCOMMAND: 5, PLANETARYFORTRESS: 5,
+    SUPPLYDEPOT: 2, SUPPLYDEPOTLOWERED: 2, MISSILETURRET: 2, SENSORTOWER: 1,
+    BARRACKS: 3, FACTORY: 3, STARPORT: 3, REFINERY: 3, ENGINEERINGBAY: 3, ARMORY: 3, BUNKER: 3,
+    GHOSTACADEMY: 3, FUSIONCORE: 3,
+    UnitTypeId.BARRACKSTECHLAB: 2, UnitTypeId.BARRACKSREACTOR: 2, UnitTypeId.FACTORYTECHLAB: 2,
+    UnitTypeId.FACTORYREACTOR: 2, UnitTypeId.STARPORTTECHLAB: 2, UnitTypeId.STARPORTREACTOR: 2,
+}  # type: Dict[UnitTypeId, int]
+
+OUR_STRUCTURES = tuple(STRUCTURE_SIZES)
+
+# Structures which get an add-on to their right, and keep a lane free around them for units to leave
+PRODUCTION = {BARRACKS, FACTORY, STARPORT}
+
+RESERVATION_LOOPS = 60 * 22.4  # a reservation nothing was built on is given up after a minute
+
+
+def footprint(position: Point2, size: int) -> Footprint:
+    """ Grid rows and columns covered by a square structure centred on position """
+    x0 = int(round(position.x - size / 2))
+    y0 = int(round(position.y - size / 2))
+    return slice(y0, y0 + size), slice(x0, x0 + size)
+
+
+def grow(area: Footprint, margin: int) -> Footprint:
+    rows, cols = area
+    return (slice(max(rows.start - margin, 0), rows.stop + margin),
+            slice(max(cols.start - margin, 0), cols.stop + margin))
+
+
+def addon_position(position: Point2) -> Point2:
+    return Point2((position.x + 2.5, position.y - 0.5))
+
+
+class Reservation:
+    __slots__ = ("unit_type", "position", "cells", "lane", "expires")
+
+    def __init__(self, unit_type: UnitTypeId, position: Point2, cells: List[Footprint], lane: Optional[Footprint],
+                 expires: float) -> None:
+        self.unit_type = unit_type
+        self.position = position
+        self.cells = cells
+        self.lane = lane
+        self.expires = expires
+
+
+class PlacementPlanner:
+    """ Hands out structure locations from the placement grid, without asking the game
+
+    The main base's placeable cells are worked out once at the start. Cells
+    covered by structures, by reservations for structures we ordered and by
+    add-on space are counted in a grid, updated as structures appear and die.
+    Candidate spots are sorted by preference up front, so a location is the
+    next candidate whose cells are still free.
+    """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+
+        self.depot_wall = []  # type: List[Point2]
+        self.barracks_wall = None  # type: Optional[Point2]
+
+        self.placeable = None  # type: Optional[np.ndarray]  # [y, x], main base cells we may build on
+        self.taken = None  # type: Optional[np.ndarray]  # structures and reservations covering each cell
+        self.lanes = None  # type: Optional[np.ndarray]  # add-on space and exits around production
+
+        self._candidates = {}  # type: Dict[int, List[Point2]]  # footprint size -> spots, best first
+        self._cursor = {}  # type: Dict[int, int]
+        self._released = {}  # type: Dict[int, List[Point2]]  # spots freed again, tried first
+        self._structures = {}  # type: Dict[int, Reservation]  # structure tag -> the cells it covers
+        self._reservations = {}  # type: Dict[Tuple[float, float], Reservation]
+
+    def on_start(self):
+        game = self.game
+        ramp = game.main_base_ramp
+        placement = game.game_info.placement_grid.data_numpy != 0
+
+        # The ramp's wall positions are worked out by the library on every access, keep the usable ones
+        self.depot_wall = sorted(p for p in ramp.corner_depots if self._on_grid(p, 2, placement))
+        barracks_wall = ramp.barracks_in_middle
+        if barracks_wall and self._on_grid(barracks_wall, 3, placement):
+            self.barracks_wall = barracks_wall
+        self.taken = np.zeros(placement.shape, dtype=np.uint8)
+        self.lanes = np.zeros(placement.shape, dtype=np.uint8)
+
+        # The main base and its spots only depend on the map and where we start
+        start = game.start_location
+        analysis = game.map_cache.get("main-{}-{}".format(int(start.x), int(start.y)),
+                                      lambda: self._analyse(placement, ramp.top_center))
+        self.placeable = np.array(analysis["placeable"])
+        self._candidates = {
+            2: [Point2(spot) for spot in analysis["depot_spots"].tolist()],
+            3: [Point2(spot) for spot in analysis["production_spots"].tolist()],
+        }
+        self._cursor = {size: 0 for size in self._candidates}
+        self._released = {size: [] for size in self._candidates}
+
+    def _analyse(self, placement: np.ndarray, ramp_top: Point2) -> Dict[str, np.ndarray]:
+        game = self.game
+        self.placeable = self._main_base(placement, game.game_info.terrain_height.data_numpy)
+        self._block_mining(game.start_location)
+
+        # Depots go to the back of the main, production towards the ramp
+        back = game.start_location.towards(ramp_top, -8)
+        return {
+            "placeable": self.placeable,
+            "depot_spots": np.array(self._spots(2, back), dtype=np.float64).reshape(-1, 2),
+            "production_spots": np.array(self._spots(3, ramp_top), dtype=np.float64).reshape(-1, 2),
+        }
+
+    @staticmethod
+    def _on_grid(position: Point2, size: int, placement: np.ndarray) -> bool:
+        """ Whether the structure lines up with the grid cells and all of them are placeable """
+        corner = position.x - size / 2, position.y - size / 2
+        if corner[0] != int(corner[0]) or corner[1] != int(corner[1]) or min(corner) < 0:
+            return False
+        return bool(placement[footprint(position, size)].all())
+
+    def _main_base(self, placement: np.ndarray, height: np.ndarray) -> np.ndarray:
+        """ Placeable cells reachable from the start location without changing height """
+        start = self.game.start_location
+        x, y = int(start.x), int(start.y)
+        level = height[y, x]
+        rows, cols = placement.shape
+
+        region = np.zeros(placement.shape, dtype=bool)
+        region[y, x] = True
+        queue = deque([(x, y)])
+        while queue:
+            x, y = queue.popleft()
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < cols and 0 <= ny < rows and not region[ny, nx] \
+                        and placement[ny, nx] and height[ny, nx] == level:
+                    region[ny, nx] = True
+                    queue.append((nx, ny))
+        return region
+
+    def _block_mining(self, townhall: Point2) -> None:
+        """ Keeps the paths between the townhall and its minerals and geysers clear """
+        for resource in self.game.state.resources.closer_than(12, townhall):
+            steps = int(townhall.distance_to(resource.position) * 2)
+            for step in range(steps + 1):
+                point = townhall.towards(resource.position, step / 2)
+                self.placeable[grow(footprint(point, 1), 1)] = False
+
+    def _spots(self, size: int, anchor: Point2) -> List[Point2]:
+        offset = 0.5 if size % 2 else 0.0
+        ys, xs = np.nonzero(self.placeable)
+        spots = []
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            position = Point2((x + offset, y + offset))
+            rows, cols = footprint(position, size)
+            if rows.start >= 0 and cols.start >= 0 and self.placeable[rows, cols].all():
+                spots.append(position)
+        return sorted(spots, key=lambda p: p.distance_to_point2(anchor))
+
+    async def on_step(self, iteration):
+        self.update()
+
+    def update(self):
+        """ Covers new structures, frees destroyed ones and drops reservations nothing was built on """
+        game = self.game
+        seen = set()
+        for structures in (game.snapshot.of_type(OUR_STRUCTURES), game.known_enemy_structures):
+            for structure in structures:
+                # Lifted structures leave their spot free
+                if structure.is_flying:
+                    continue
+                seen.add(structure.tag)
+                if structure.tag not in self._structures:
+                    self._add_structure(structure)
+
+        for tag in [tag for tag in self._structures if tag not in seen]:
+            self._remove(self._structures.pop(tag))
+
+        loop = game.state.game_loop
+        for key in [key for key, r in self._reservations.items() if r.expires <= loop]:
+            self._remove(self._reservations.pop(key))
+
+    def _add_structure(self, structure) -> None:
+        # The structure takes over any reservation made for it
+        reservation = self._reservations.pop((structure.position.x, structure.position.y), None)
+        if reservation is None:
+            size = STRUCTURE_SIZES.get(structure.type_id) or max(int(round(structure.radius * 2)), 1)
+            reservation = self._cover(structure.type_id, structure.position, size)
+        self._structures[structure.tag] = reservation
+
+    def location(self, unit_type: UnitTypeId, preferred: List[Point2] = ()) -> Optional[Point2]:
+        """ Free spot for the structure, preferred spots first, None once the main base is full """
+        size = STRUCTURE_SIZES.get(unit_type)
+        if size not in self._candidates:
+            return None
+        for position in preferred:
+            if self.fits(unit_type, position, wall=True):
+                return position
+
+        released = self._released[size]
+        while released:
+            if self.fits(unit_type, released[-1]):
+                return released[-1]
+            released.pop()
+
+        candidates = self._candidates[size]
+        cursor = self._cursor[size]
+        while cursor < len(candidates):
+            position = candidates[cursor]
+            if self.fits(unit_type, position):
+                self._cursor[size] = cursor
+                return position
+            cursor += 1
+        self._cursor[size] = cursor
+        return None
+
+    def fits(self, unit_type: UnitTypeId, position: Point2, wall: bool = False) -> bool:
+        """ Wall spots only need their own cells free, others keep clear of add-ons and lanes """
+        size = STRUCTURE_SIZES[unit_type]
+        area = footprint(position, size)
+        if area[0].start < 0 or area[1].start < 0 or not self._free(area, self.taken):
+            return False
+        if wall:
+            return True
+        if not self.placeable[area].all() or not self._free(area, self.lanes):
+            return False
+        if unit_type in PRODUCTION:
+            addon = footprint(addon_position(position), 2)
+            return self._free(addon, self.taken) and self._free(addon, self.lanes) and \
+                self.placeable[addon].all() and self._free(grow(area, 1), self.taken)
+        return True
+
+    def reserve(self, unit_type: UnitTypeId, position: Point2) -> None:
+        """ Holds the spot until the structure appears, or a minute passes """
+        size = STRUCTURE_SIZES[unit_type]
+        if position in self._released.get(size, ()):
+            self._released[size].remove(position)
+        reservation = self._cover(unit_type, position, size)
+        reservation.expires = self.game.state.game_loop + RESERVATION_LOOPS
+        self._reservations[(position.x, position.y)] = reservation
+
+    def _cover(self, unit_type: UnitTypeId, position: Point2, size: int) -> Reservation:
+        cells = [footprint(position, size)]
+        lane = None
+        if unit_type in PRODUCTION:
+            cells.append(footprint(addon_position(position), 2))
+            lane = grow(cells[0], 1)
+            self.lanes[lane] += 1
+        for area in cells:
+            self.taken[area] += 1
+        return Reservation(unit_type, position, cells, lane, float("inf"))
+
+    def _remove(self, reservation: Reservation) -> None:
+        for area in reservation.cells:
+            self.taken[area] -= 1
+        if reservation.lane is not None:
+            self.lanes[reservation.lane] -= 1
+        size = STRUCTURE_SIZES.get(reservation.unit_type)
+        if size in self._released:
+            self._released[size].append(reservation.position)
+
+    @staticmethod
+    def _free(area: Footprint, grid: np.ndarray) -> bool:
+        return not grid[area].any()
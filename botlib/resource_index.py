@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional, Tuple
+
+import sc2
+from sc2.constants import REFINERY
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+from sc2.unit import Unit
+
+from .mining_manager import TOWNHALLS
+from .unit_events import UnitEvents, CREATED, CONSTRUCTION_COMPLETED, DESTROYED
+
+TOWNHALL_REACH = 6  # a townhall further than this from an expansion location is not on that base
+
+
+def position_key(position: Point2) -> Tuple[float, float]:
+    return (round(position.x, 1), round(position.y, 1))
+
+
+class Base:
+    __slots__ = ("position", "minerals", "geysers", "distances", "townhall", "ready", "refineries")
+
+    def __init__(self, position: Point2) -> None:
+        self.position = position
+        self.minerals = []  # type: List[int]  # closest to the base first
+        self.geysers = []  # type: List[int]
+        self.distances = {}  # type: Dict[int, float]  # resource tag -> distance from the base
+        self.townhall = None  # type: Optional[int]
+        self.ready = False
+        self.refineries = {}  # type: Dict[int, int]  # geyser tag -> refinery tag
+
+    @property
+    def free_geysers(self) -> List[int]:
+        return [geyser for geyser in self.geysers if geyser not in self.refineries]
+
+
+class ResourceIndex:
+    """ Every base's mineral patches and geysers, worked out once from the expansion locations
+
+    Townhalls and refineries are linked to their base by unit events, and
+    patches are dropped when the number of mineral fields changes, so the
+    questions asked every step are dictionary lookups.
+    """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+
+        self.bases = []  # type: List[Base]
+        self.ready_geysers = 0  # geysers at bases with a finished townhall
+
+        self._base_of = {}  # type: Dict[int, Base]  # resource and townhall tags -> base
+        self._geyser_at = {}  # type: Dict[Tuple[float, float], int]
+        self._mineral_fields = 0
+        self._units = None  # type: Optional[Dict[int, Unit]]  # this step's resources by tag
+
+    def subscribe(self, events: UnitEvents):
+        events.subscribe(CREATED, self._created)
+        events.subscribe(CONSTRUCTION_COMPLETED, self._construction_completed)
+        events.subscribe(DESTROYED, self._destroyed)
+
+    def on_start(self):
+        geysers = {geyser.tag for geyser in self.game.state.vespene_geyser}
+        for position, resources in self.game.expansion_locations.items():
+            base = Base(position)
+            for resource in sorted(resources, key=lambda r: r.distance_to(position)):
+                base.distances[resource.tag] = resource.distance_to(position)
+                if resource.tag in geysers:
+                    base.geysers.append(resource.tag)
+                    self._geyser_at[position_key(resource.position)] = resource.tag
+                else:
+                    base.minerals.append(resource.tag)
+                self._base_of[resource.tag] = base
+            self.bases.append(base)
+        self._mineral_fields = len(self.game.state.mineral_field)
+
+        # Our first units were seen before the bases were known
+        for unit in self.game.units.of_type(TOWNHALLS | {REFINERY}):
+            self._created(unit)
+
+    def update(self):
+        """ Forgets the last step's units and any patch mined out since """
+        self._units = None
+        if not self.bases:
+            return
+        fields = self.game.state.mineral_field
+        if len(fields) != self._mineral_fields:
+            self._mineral_fields = len(fields)
+            remaining = {field.tag for field in fields}
+            for base in self.bases:
+                base.minerals = [patch for patch in base.minerals if patch in remaining]
+
+    def _created(self, unit: Unit):
+        if not self.bases:
+            return
+        if unit.type_id in TOWNHALLS:
+            base = self.base_near(unit.position)
+            if base is not None and base.townhall is None:
+                base.townhall = unit.tag
+                self._base_of[unit.tag] = base
+                if unit.is_ready:
+                    self._construction_completed(unit)
+        elif unit.type_id == REFINERY:
+            geyser = self._geyser_at.get(position_key(unit.position))
+            if geyser is not None:
+                base = self._base_of[geyser]
+                base.refineries[geyser] = unit.tag
+                self._base_of[unit.tag] = base
+
+    def _construction_completed(self, unit: Unit):
+        base = self._base_of.get(unit.tag)
+        if base is not None and not base.ready:
+            base.ready = True
+            self.ready_geysers += len(base.geysers)
+
+    def _destroyed(self, tag: int, unit_type: UnitTypeId, was_ready: bool):
+        base = self._base_of.pop(tag, None)
+        if base is None:
+            return
+        if unit_type in TOWNHALLS:
+            base.townhall = None
+            if base.ready:
+                base.ready = False
+                self.ready_geysers -= len(base.geysers)
+        elif unit_type == REFINERY:
+            base.refineries = {g: r for g, r in base.refineries.items() if r != tag}
+
+    def base_near(self, position: Point2) -> Optional[Base]:
+        base = min(self.bases, key=lambda b: b.position.distance_to_point2(position), default=None)
+        if base is None or base.position.distance_to_point2(position) > TOWNHALL_REACH:
+            return None
+        return base
+
+    def base_of(self, tag: int) -> Optional[Base]:
+        """ The base of a townhall, mineral patch or geyser """
+        return self._base_of.get(tag)
+
+    @property
+    def ready_bases(self) -> List[Base]:
+        return [base for base in self.bases if base.ready]
+
+    def unit(self, tag: int) -> Optional[Unit]:
+        """ This step's mineral field or geyser with the tag """
+        if self._units is None:
+            self._units = {resource.tag: resource for resource in self.game.state.resources}
+        return self._units.get(tag)
+
+    def richest_patch(self, townhall: Unit) -> Optional[Unit]:
+        """ The patch of the townhall's base with the most minerals left """
+        base = self._base_of.get(townhall.tag)
+        if base is None:
+            return None
+        patches = [self.unit(patch) for patch in base.minerals]
+        return max((patch for patch in patches if patch is not None), key=lambda p: p.mineral_contents, default=None)
@@ -0,0 +1,85 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.units import Units
+
+Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    """ Proximity lookups over a set of units, rebuilt each step
+
+    Radius queries use a uniform grid, so they only visit the cells overlapping
+    the query instead of every indexed unit. Nearest-unit queries use the
+    positions as NumPy columns, which keeps the scan out of Python.
+    """
+
+    def __init__(self, units: Units, cell_size: float = 8.0) -> None:
+        self.units = units
+        self.cell_size = cell_size
+        self.max_radius = 0.0
+
+        self._cells = {}  # type: Dict[Cell, List[Tuple[float, float, Unit]]]
+        self._x = np.empty(len(units))
+        self._y = np.empty(len(units))
+        for i, unit in enumerate(units):
+            position = unit.position
+            x, y = position.x, position.y
+            self._x[i] = x
+            self._y[i] = y
+            self._cells.setdefault(self._cell(x, y), []).append((x, y, unit))
+            self.max_radius = max(self.max_radius, unit.radius)
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def closer_than(self, position: Point2, distance: float) -> Units:
+        """ Indexed units whose centre is closer than distance to the position """
+        x, y = position.x, position.y
+        limit = distance * distance
+        found = [unit for ux, uy, unit in self._candidates(x, y, distance)
+                 if (ux - x) ** 2 + (uy - y) ** 2 < limit]
+        return self.units.subgroup(found)
+
+    def any_closer_than(self, position: Point2, distance: float) -> bool:
+        """ Stops at the first indexed unit closer than distance """
+        x, y = position.x, position.y
+        limit = distance * distance
+        for ux, uy, _ in self._candidates(x, y, distance):
+            if (ux - x) ** 2 + (uy - y) ** 2 < limit:
+                return True
+        return False
+
+    def closest(self, position: Point2, k: int = 1, predicate: Optional[Callable[[Unit], bool]] = None) -> List[Unit]:
+        """ Up to k indexed units nearest to the position, closest first """
+        distances = (self._x - position.x) ** 2 + (self._y - position.y) ** 2
+        if predicate is not None:
+            allowed = np.fromiter((predicate(unit) for unit in self.units), dtype=bool, count=len(self.units))
+            distances[~allowed] = np.inf
+            k = min(k, int(allowed.sum()))
+        k = min(k, len(distances))
+        if k <= 0:
+            return []
+
+        nearest = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(k)
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [self.units[i] for i in nearest]
+
+    def closest_to(self, position: Point2, predicate: Optional[Callable[[Unit], bool]] = None) -> Optional[Unit]:
+        found = self.closest(position, 1, predicate)
+        return found[0] if found else None
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def _candidates(self, x: float, y: float, distance: float) -> Iterable[Tuple[float, float, Unit]]:
+        min_x, min_y = self._cell(x - distance, y - distance)
+        max_x, max_y = self._cell(x + distance, y + distance)
+        cells = self._cells
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                entries = cells.get((cx, cy))
+                if entries:
+                    yield from entries
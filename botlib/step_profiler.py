@@ -0,0 +1,233 @@
+import csv
+import json
+import logging
+import math
+import sys
+import time
+import tracemalloc
+from collections import deque
+from typing import Dict, List
+
+import sc2
+
+logger = logging.getLogger(__name__)
+
+RESET_PEAK = hasattr(tracemalloc, "reset_peak")  # Python 3.9, before it peaks are only seen between routines
+
+
+class Histogram:
+    """ Fixed number of logarithmic buckets, so recording never allocates """
+
+    def __init__(self, smallest: float = 1e-6, largest: float = 10.0, growth: float = 1.1) -> None:
+        self.smallest = smallest
+        self.log_growth = math.log(growth)
+        self.buckets = [0] * (int(math.log(largest / smallest) / self.log_growth) + 2)
+        self.count = 0
+        self.total = 0.0
+        self.largest = 0.0
+
+    def record(self, value: float) -> None:
+        if value <= self.smallest:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(value / self.smallest) / self.log_growth) + 1, len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += value
+        self.largest = max(self.largest, value)
+
+    def percentile(self, percent: float) -> float:
+        """ Upper edge of the bucket holding the percentile, accurate to the bucket growth """
+        if not self.count:
+            return 0.0
+        wanted = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= wanted:
+                return min(self.smallest * math.exp(bucket * self.log_growth), self.largest)
+        return self.largest
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class AllocationStats:
+    """ Memory a routine allocated while it ran, and what it left allocated """
+
+    def __init__(self) -> None:
+        self.allocated = Histogram(smallest=1.0, largest=1e10)  # bytes, peak above the start
+        self.retained = 0  # bytes still allocated on return, summed over calls
+        self.blocks = 0  # memory blocks still allocated on return, summed over calls
+
+    def summary(self) -> Dict:
+        return {
+            "mean_alloc_kb": self.allocated.mean / 1024,
+            "p99_alloc_kb": self.allocated.percentile(99) / 1024,
+            "max_alloc_kb": self.allocated.largest / 1024,
+            "retained_kb": self.retained / 1024,
+            "retained_blocks": self.blocks,
+        }
+
+
+class RoutineStats:
+    def __init__(self, name: str, allocations: bool = False) -> None:
+        self.name = name
+        self.wall_time = Histogram()
+        self.allocations = AllocationStats() if allocations else None
+        self.actions = 0
+        self.steps_over_budget = 0
+
+    def summary(self) -> Dict:
+        summary = {
+            "routine": self.name,
+            "calls": self.wall_time.count,
+            "actions": self.actions,
+            "total_ms": self.wall_time.total * 1000,
+            "mean_ms": self.wall_time.mean * 1000,
+            "p50_ms": self.wall_time.percentile(50) * 1000,
+            "p95_ms": self.wall_time.percentile(95) * 1000,
+            "p99_ms": self.wall_time.percentile(99) * 1000,
+            "max_ms": self.wall_time.largest * 1000,
+            "steps_over_budget": self.steps_over_budget,
+        }
+        if self.allocations:
+            summary.update(self.allocations.summary())
+        return summary
+
+
+class StepProfiler:
+    """ Opt-in timing of the step and the routines it calls
+
+    Nothing is wrapped until instrument is called, so a bot which never turns
+    profiling on runs exactly the same code as before. With allocations set,
+    tracemalloc also follows the memory each step and routine allocates,
+    which slows the bot down noticeably. Before Python 3.9 a routine's peak
+    is the most it held when it or a routine it called returned, so memory
+    freed before then goes unseen.
+    """
+
+    def __init__(self, game: sc2.BotAI, budget: float = 0.0446, slow_steps: int = 100,
+                 allocations: bool = False) -> None:
+        self.game = game
+        self.budget = budget  # seconds, one game step at realtime speed by default
+        self.allocations = allocations
+
+        self.routines = {}  # type: Dict[str, RoutineStats]
+        self.step = RoutineStats("step", allocations)
+        self.slow_steps = deque(maxlen=slow_steps)
+
+        self._step_routines = []  # type: List[tuple]
+        self._frames = []  # type: List[List[int]]
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def instrument(self, target, attribute: str, name: str = None) -> None:
+        """ Replaces the coroutine method on the target with a timed one """
+        method = getattr(target, attribute)
+        stats = self.routines.setdefault(name or attribute, RoutineStats(name or attribute, self.allocations))
+        profiler = self
+
+        async def timed(*args, **kwargs):
+            actions = profiler._actions_queued()
+            if stats.allocations:
+                profiler._enter()
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if stats.allocations:
+                    profiler._leave(stats.allocations)
+                stats.wall_time.record(elapsed)
+                stats.actions += profiler._actions_queued() - actions
+                profiler._step_routines.append((stats, elapsed))
+
+        setattr(target, attribute, timed)
+
+    def instrument_step(self, target, attribute: str = "on_step") -> None:
+        """ Times the whole step and checks it against the budget """
+        method = getattr(target, attribute)
+        profiler = self
+
+        async def timed_step(iteration, *args, **kwargs):
+            profiler._step_routines = []
+            actions = profiler._actions_queued()
+            if profiler.allocations:
+                profiler._enter()
+            start = time.perf_counter()
+            try:
+                return await method(iteration, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if profiler.allocations:
+                    profiler._leave(profiler.step.allocations)
+                profiler._end_step(iteration, elapsed, profiler._actions_queued() - actions)
+
+        setattr(target, attribute, timed_step)
+
+    def _enter(self) -> None:
+        """ Starts following allocations for a routine, nested in whatever is already followed """
+        current, peak = tracemalloc.get_traced_memory()
+        if self._frames:
+            # The peak is reset for the routine, the enclosing one keeps what it reached so far
+            self._frames[-1][1] = max(self._frames[-1][1], peak if RESET_PEAK else current)
+        if RESET_PEAK:
+            tracemalloc.reset_peak()
+        self._frames.append([current, current, sys.getallocatedblocks()])
+
+    def _leave(self, stats: AllocationStats) -> None:
+        start, peak, blocks = self._frames.pop()
+        current, traced_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, traced_peak if RESET_PEAK else current)
+        if self._frames:
+            self._frames[-1][1] = max(self._frames[-1][1], peak)
+        if RESET_PEAK:
+            tracemalloc.reset_peak()
+        stats.allocated.record(peak - start)
+        stats.retained += current - start
+        stats.blocks += sys.getallocatedblocks() - blocks
+
+    def _end_step(self, iteration: int, elapsed: float, actions: int) -> None:
+        self.step.wall_time.record(elapsed)
+        self.step.actions += actions
+        if elapsed <= self.budget:
+            return
+
+        self.step.steps_over_budget += 1
+        slowest = sorted(self._step_routines, key=lambda item: item[1], reverse=True)[:3]
+        if slowest:
+            slowest[0][0].steps_over_budget += 1
+        self.slow_steps.append({
+            "iteration": iteration,
+            "ms": elapsed * 1000,
+            "slowest": [(stats.name, seconds * 1000) for stats, seconds in slowest],
+        })
+        logger.warning("Step {} took {:.1f}ms, over the {:.1f}ms budget ({})".format(
+            iteration, elapsed * 1000, self.budget * 1000,
+            ", ".join("{} {:.1f}ms".format(stats.name, seconds * 1000) for stats, seconds in slowest)))
+
+    def _actions_queued(self) -> int:
+        action_buffer = getattr(self.game, "action_buffer", None)
+        return action_buffer.actions_queued if action_buffer else 0
+
+    def summary(self) -> List[Dict]:
+        routines = sorted(self.routines.values(), key=lambda stats: stats.wall_time.total, reverse=True)
+        return [self.step.summary()] + [stats.summary() for stats in routines]
+
+    def write_report(self, path: str) -> None:
+        """ Writes <path>.json with the summary and slowest steps, and <path>.csv with the summary """
+        rows = self.summary()
+        with open(path + ".json", "w") as report:
+            json.dump({
+                "budget_ms": self.budget * 1000,
+                "allocations": self.allocations,
+                "routines": rows,
+                "slow_steps": list(self.slow_steps),
+            }, report, indent=2)
+
+        with open(path + ".csv", "w", newline="") as report:
+            writer = csv.DictWriter(report, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .unit_events import UnitEvents
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower runs first. ALWAYS work is never deferred.
+ALWAYS = 0  # bookkeeping every other service reads, and micro
+BUILD = 1
+PRODUCTION = 2
+ECONOMY = 3
+SCOUTING = 4
+
+
+class Task:
+    __slots__ = ("name", "routine", "priority", "every", "order", "next_due", "triggered", "cost",
+                 "runs", "deferrals", "deferred_for", "longest_deferral")
+
+    def __init__(self, name: str, routine: Callable[[int], Awaitable], priority: int, every: Optional[int],
+                 order: int) -> None:
+        self.name = name
+        self.routine = routine
+        self.priority = priority
+        self.every = every  # steps between runs, None to only run on events
+        self.order = order
+        self.next_due = order % every if every else None  # spread tasks with the same cadence over the steps
+        self.triggered = False
+        self.cost = 0.0  # seconds, moving average of the task's runs
+
+        self.runs = 0
+        self.deferrals = 0  # steps the task was due but put off
+        self.deferred_for = 0
+        self.longest_deferral = 0
+
+    def due(self, iteration: int) -> bool:
+        return self.triggered or self.deferred_for > 0 or (self.every is not None and iteration >= self.next_due)
+
+    def summary(self) -> Dict:
+        return {
+            "task": self.name,
+            "priority": self.priority,
+            "every": self.every,
+            "runs": self.runs,
+            "mean_ms": self.cost * 1000,
+            "deferrals": self.deferrals,
+            "longest_deferral": self.longest_deferral,
+        }
+
+
+class StepScheduler:
+    """ Runs the bot's services by priority and cadence, inside a wall clock budget per step
+
+    Each task runs every few steps, when a unit event it listens for fires,
+    or both. Due tasks run most urgent first. Once the step's time is used
+    up, any task which would not fit in what is left is deferred to the next
+    step, unless it is ALWAYS work or has already waited max_deferral steps.
+    A cheaper task further down can still use the remaining time.
+    """
+
+    def __init__(self, events: UnitEvents, budget: float = 0.0446, max_deferral: int = 8) -> None:
+        self.events = events
+        self.budget = budget  # seconds, one game step at realtime speed by default
+        self.max_deferral = max_deferral
+
+        self.tasks = []  # type: List[Task]
+        self.started = 0.0  # perf_counter at the start of the last step
+        self.steps = 0
+        self.overruns = 0  # steps which went over the budget
+        self.overrun_by = 0.0  # seconds over the budget, summed over those steps
+
+    def add(self, name: str, routine: Callable[[int], Awaitable], priority: int, every: Optional[int] = 1,
+            on: Sequence[str] = ()) -> Task:
+        """ Schedules routine(iteration) every few steps, and on the step after any of the events """
+        task = Task(name, routine, priority, every, len(self.tasks))
+        for event in on:
+            self.events.subscribe(event, lambda *args, task=task: setattr(task, "triggered", True))
+        self.tasks.append(task)
+        self.tasks.sort(key=lambda t: (t.priority, t.order))
+        return task
+
+    def remaining(self) -> float:
+        """ Seconds left of the budget of the step that started last """
+        return self.budget - (time.perf_counter() - self.started)
+
+    async def run(self, iteration: int):
+        start = self.started = time.perf_counter()
+        deadline = start + self.budget
+        for task in self.tasks:
+            if not task.due(iteration):
+                continue
+
+            now = time.perf_counter()
+            if task.priority != ALWAYS and task.deferred_for < self.max_deferral and now + task.cost > deadline:
+                task.deferrals += 1
+                task.deferred_for += 1
+                task.longest_deferral = max(task.longest_deferral, task.deferred_for)
+                logger.debug("Step {}: deferred {}, {:.1f}ms left".format(
+                    iteration, task.name, max(deadline - now, 0) * 1000))
+                continue
+
+            task.triggered = False
+            task.deferred_for = 0
+            if task.every is not None:
+                task.next_due = iteration + task.every
+            await task.routine(iteration)
+            elapsed = time.perf_counter() - now
+            task.cost = elapsed if not task.runs else task.cost * 0.9 + elapsed * 0.1
+            task.runs += 1
+
+        self.steps += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > self.budget:
+            self.overruns += 1
+            self.overrun_by += elapsed - self.budget
+            logger.debug("Step {} took {:.1f}ms, over the {:.1f}ms budget".format(
+                iteration, elapsed * 1000, self.budget * 1000))
+
+    def summary(self) -> List[Dict]:
+        return [task.summary() for task in self.tasks]
+
+    def report(self) -> str:
+        lines = ["{} steps, {} over the {:.1f}ms budget by {:.1f}ms in total".format(
+            self.steps, self.overruns, self.budget * 1000, self.overrun_by * 1000)]
+        lines.append("{:<24} {:>8} {:>6} {:>8} {:>9} {:>9} {:>9}".format(
+            "task", "priority", "every", "runs", "mean ms", "deferred", "longest"))
+        for row in self.summary():
+            lines.append("{:<24} {:>8} {:>6} {:>8} {:>9.3f} {:>9} {:>9}".format(
+                row["task"], row["priority"], row["every"] or "event", row["runs"], row["mean_ms"],
+                row["deferrals"], row["longest_deferral"]))
+        return "\n".join(lines)
@@ -1,94 +1,165 @@
+import logging
 from abc import abstractmethod
+from collections import deque
+from typing import Deque, List, Optional, Tuple
 
 import sc2
 from sc2 import units
 from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, BARRACKS, REFINERY, \
     SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP, \
     FACTORY, STARPORT
+from sc2.data import ActionResult
 from sc2.ids.ability_id import AbilityId
 from sc2.ids.unit_typeid import UnitTypeId
 from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
+from .placement_planner import RESERVATION_LOOPS
+from .telemetry import BUILD
+from .unit_events import UnitEvents, CREATED, CONSTRUCTION_STARTED, CONSTRUCTION_COMPLETED, DESTROYED, MORPHED
+from .unit_snapshot import COMMAND_CENTERS, SUPPLY_DEPOTS
+
+ORDER_LOOPS = RESERVATION_LOOPS  # an order nothing was placed for stops counting as pending with its reservation
+
 
 class StructureBuilder:
-    """ Builds Strucutres with each tick, ensuring the total is never exceeded """
+    """ Builds Strucutres with each tick, ensuring the total is never exceeded
+
+    Totals are counted from unit events: known_total holds the structures
+    we have, under_construction the unfinished ones, and pending_total the
+    build orders whose structure has not been placed yet.
+    """
+
+    # Types which count towards the total, such as what the structure morphs into
+    counted_types = ()  # type: Tuple[UnitTypeId, ...]
 
     def __init__(self, game: sc2.BotAI, unit_type: UnitTypeId) -> None:
         self.unit_type = unit_type
         self.game = game
+        if not self.counted_types:
+            self.counted_types = (unit_type,)
 
-        self.pending_total = 0
         self.known_total = 0
+        self.under_construction = 0
+        self._orders = deque()  # type: Deque[Tuple[Optional[int], int]]  # ordered unit tag, game loop, oldest first
+
+    def subscribe(self, events: UnitEvents):
+        events.subscribe(CREATED, self._created)
+        events.subscribe(CONSTRUCTION_STARTED, self._construction_started)
+        events.subscribe(CONSTRUCTION_COMPLETED, self._construction_completed)
+        events.subscribe(DESTROYED, self._destroyed)
+        events.subscribe(MORPHED, self._morphed)
+
+    def _created(self, unit: Unit):
+        if unit.type_id in self.counted_types:
+            self.known_total += 1
+
+    def _construction_started(self, unit: Unit):
+        if unit.type_id in self.counted_types:
+            self.under_construction += 1
+        if unit.type_id == self.unit_type and self._orders:
+            self._orders.popleft()
+
+    def _construction_completed(self, unit: Unit):
+        if unit.type_id in self.counted_types:
+            self.under_construction -= 1
+
+    def _destroyed(self, tag: int, unit_type: UnitTypeId, was_ready: bool):
+        if unit_type in self.counted_types:
+            self.known_total -= 1
+            if not was_ready:
+                self.under_construction -= 1
+        # An order dies with the unit carrying it out
+        if any(ordered == tag for ordered, _ in self._orders):
+            self._orders = deque(order for order in self._orders if order[0] != tag)
+
+    def _morphed(self, unit: Unit, previous_type: UnitTypeId):
+        counted, was_counted = unit.type_id in self.counted_types, previous_type in self.counted_types
+        if counted and not was_counted:
+            self.known_total += 1
+            if unit.type_id == self.unit_type and self._orders:
+                self._orders.popleft()
+        elif was_counted and not counted:
+            self.known_total -= 1
 
-    async def on_step(self, iteration):
-        if not self.game.already_pending(self.unit_type):
-            # No pending strucutres, so we should know the exact count
-            self.pending_total = 0
-            self.known_total = self.calculate_known_total
-        elif self.pending_total:
-            # Currently building units, but we can see how many structures have been placed
-            current_total = self.game.units(self.unit_type).amount
-            amount_created = max(current_total - self.known_total, 0)
-            if amount_created:
-                self.known_total = current_total
-                self.pending_total = max(
-                    self.pending_total - amount_created, 0)
+    @property
+    def pending_total(self) -> int:
+        # Orders which never got placed, say the spot was blocked, are given up on after a while
+        expired = self.game.state.game_loop - ORDER_LOOPS
+        while self._orders and self._orders[0][1] <= expired:
+            self._orders.popleft()
+        return len(self._orders)
 
+    async def on_step(self, iteration):
         # Build a unit if we require one
         if self.should_build():
+            ordered = len(self._orders)
             err = await self.build_single()
             if err:
-                self.debug(iteration, "Failed to build {}".format(
-                    self.unit_type.name))
+                self.game.telemetry.record(logging.DEBUG, BUILD, "build_failed", self.unit_type, iteration=iteration)
                 return
 
-            # Mark structure as pending
-            self.pending_total += 1
+            # Mark structure as pending, the library's helpers do not say which unit took the order
+            if len(self._orders) == ordered:
+                self._orders.append((None, self.game.state.game_loop))
 
-            # Pring happy debug message
-            self.debug(iteration, "{unit_type}({total})".format(
-                unit_type=self.unit_type.name, total=self.estimated_total))
+            self.game.telemetry.record(logging.INFO, BUILD, "build_ordered", self.unit_type,
+                                       detail=self.estimated_total, iteration=iteration)
+
+    async def order(self, unit: Unit, action):
+        """ Issues the build order, remembering which unit carries it out """
+        err = await self.game.do(action)
+        if not err:
+            self._orders.append((unit.tag, self.game.state.game_loop))
+        return err
 
     # Build the single unit
     @abstractmethod
     async def build_single(self):
         pass
 
+    async def build_planned(self):
+        """ Builds on a spot from the placement planner, only asking the game once the planner has none """
+        planner = self.game.placement_planner
+        position = planner.location(self.unit_type, self.preferred_locations())
+        if position is None:
+            return await self.game.build(self.unit_type, near=self.next_location())
+
+        worker = self.game.select_build_worker(position)
+        if worker is None:
+            return ActionResult.Error
+        err = await self.order(worker, worker.build(self.unit_type, position))
+        if not err:
+            planner.reserve(self.unit_type, position)
+        return err
+
+    # Spots tried before the planner's own, such as the ramp wall
+    def preferred_locations(self) -> List[Point2]:
+        return []
+
     # Override to control build
     def should_build(self) -> bool:
         return self.game.can_afford(self.unit_type)
 
-    # Use the game logic to determine what we have build
-    @property
-    def calculate_known_total(self) -> int:
-        return self.game.units(self.unit_type).amount
-
     # We cannot always know how many units we have pending,
     # keeps a summary based on what it thinks it has built
     @property
     def estimated_total(self) -> int:
         return self.known_total + self.pending_total
 
-    def debug(self, iteration, message):
-        print(iteration, "{}/{}".format(self.game.supply_used,
-              self.game.supply_cap), message)
-
 
 class SupplyDepotBuilder(StructureBuilder):
     """ Builds Supply Depots as required """
 
+    counted_types = SUPPLY_DEPOTS
+
     def __init__(self, game: sc2.BotAI) -> None:
         super().__init__(game, SUPPLYDEPOT)
 
     @property
     def known_depots(self) -> Units:
-        return self.game.units.of_type([SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP])
-
-    @property
-    def calculate_known_total(self) -> int:
-        return self.known_depots.amount
+        return self.game.snapshot.of_type(SUPPLY_DEPOTS)
 
     def should_build(self) -> bool:
         return super().should_build() and \
@@ -97,28 +168,25 @@ class SupplyDepotBuilder(StructureBuilder):
             self.game.supply_cap < 200
 
     async def build_single(self):
-        return await self.game.build(self.unit_type, near=self.next_location())
+        return await self.build_planned()
+
+    def preferred_locations(self) -> List[Point2]:
+        # Urgently build supply depots (anti-cheese)
+        return self.game.placement_planner.depot_wall
 
     def next_location(self) -> Point2:
-        # Find all urgently required depot locations
-        depot_placement_positions = self.game.main_base_ramp.corner_depots
         depots = self.known_depots
-        if depots:
-            depot_placement_positions = {
-                d for d in depot_placement_positions if depots.closest_distance_to(d) > 1}
-
-        # Urgently build supply depots (anti-cheese)
-        if len(depot_placement_positions) > 0:
-            return depot_placement_positions.pop()
+        for position in self.game.placement_planner.depot_wall:
+            if not depots or depots.closest_distance_to(position) > 1:
+                return position
 
         # Build any other supply depots as needed
         map_center = self.game.game_info.map_center
-        return self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).random.position.towards(map_center, 8)
+        return self.game.snapshot.of_type(COMMAND_CENTERS).random.position.towards(map_center, 8)
 
     @property
     def pending_building(self) -> int:
-        # return self.pending_total + self.known_depots.not_ready.amount
-        return self.game.already_pending(SUPPLYDEPOT)
+        return self.pending_total + self.under_construction
 
     @property
     def threshold(self) -> int:
@@ -139,7 +207,7 @@ class QuotaStructureBuilder(StructureBuilder):
         return super().should_build() and self._target > self.estimated_total
 
     async def build_single(self):
-        return await self.game.build(self.unit_type, near=self.next_location())
+        return await self.build_planned()
 
     @abstractmethod
     def next_location(self) -> Point2:
@@ -155,13 +223,11 @@ class QuotaStructureBuilder(StructureBuilder):
 
 
 class CommandCenterBuilder(QuotaStructureBuilder):
+    counted_types = COMMAND_CENTERS
+
     def __init__(self, game: sc2.BotAI, target: int = 1) -> None:
         super().__init__(game, COMMANDCENTER, target=target)
 
-    @property
-    def calculate_known_total(self) -> int:
-        return self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).amount
-
     async def build_single(self):
         return await self.game.expand_now()
 
@@ -173,12 +239,12 @@ class OrbitalCommandBuilder(QuotaStructureBuilder):
     def should_build(self):
         return super().should_build() and \
             self.game.can_afford(AbilityId.UPGRADETOORBITAL_ORBITALCOMMAND) and \
-            self.game.units(COMMANDCENTER).ready.idle and \
-            self.game.units(BARRACKS).ready
+            self.game.snapshot.idle(COMMANDCENTER) and \
+            self.game.snapshot.ready(BARRACKS)
 
     async def build_single(self):
-        for cc in self.game.units(COMMANDCENTER).ready.idle:
-            return await self.game.do(cc(AbilityId.UPGRADETOORBITAL_ORBITALCOMMAND))
+        for cc in self.game.snapshot.idle(COMMANDCENTER):
+            return await self.order(cc, cc(AbilityId.UPGRADETOORBITAL_ORBITALCOMMAND))
 
         return True
 
@@ -189,18 +255,18 @@ class RefineryBuilder(QuotaStructureBuilder):
 
     async def build_single(self):
         # Build a refinery on the first vacant geyser
-        for cc in self.game.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).ready:
-            vespenes = self.game.state.vespene_geyser.closer_than(25.0, cc)
-            for vespene in vespenes:
-                if self.game.units(REFINERY).closer_than(distance=1, position=vespene.position):
-                    # Already building a refinery on this geyser
+        index = self.game.resource_index
+        for base in index.ready_bases:
+            for geyser in base.free_geysers:
+                vespene = index.unit(geyser)
+                if vespene is None:
                     continue
 
                 worker = self.game.select_build_worker(vespene.position)
                 if worker is None:
                     break
 
-                return await self.game.do(worker.build(REFINERY, vespene))
+                return await self.order(worker, worker.build(REFINERY, vespene))
 
         # No refinery built
         return True
@@ -211,13 +277,17 @@ class BarracksBuilder(QuotaStructureBuilder):
         super().__init__(game, BARRACKS)
 
     def should_build(self):
-        return super().should_build() and self.game.units.of_type([UnitTypeId.SUPPLYDEPOT, UnitTypeId.SUPPLYDEPOTLOWERED, UnitTypeId.SUPPLYDEPOTDROP]).ready
+        return super().should_build() and self.game.snapshot.ready(SUPPLY_DEPOTS)
+
+    def preferred_locations(self) -> List[Point2]:
+        # Wall off the base
+        wall = self.game.placement_planner.barracks_wall
+        return [wall] if wall and not self.known_total else []
 
     def next_location(self) -> Point2:
         if self.known_total:
-            return self.game.units(BARRACKS).first
-        # Wall off the base
-        return self.game.main_base_ramp.barracks_in_middle
+            return self.game.snapshot.of_type(BARRACKS).first
+        return self.game.placement_planner.barracks_wall or self.game.start_location
 
 
 class FactoryBuilder(QuotaStructureBuilder):
@@ -225,11 +295,11 @@ class FactoryBuilder(QuotaStructureBuilder):
         super().__init__(game, FACTORY)
 
     def should_build(self):
-        return super().should_build() and self.game.units(BARRACKS).ready
+        return super().should_build() and self.game.snapshot.ready(BARRACKS)
 
     def next_location(self) -> Point2:
         # Building near the most recently created Barracks
-        return self.game.units(BARRACKS).first
+        return self.game.snapshot.of_type(BARRACKS).first
 
 
 class StarportBuilder(QuotaStructureBuilder):
@@ -237,8 +307,8 @@ class StarportBuilder(QuotaStructureBuilder):
         super().__init__(game, STARPORT)
 
     def should_build(self):
-        return super().should_build() and self.game.units(FACTORY).ready
+        return super().should_build() and self.game.snapshot.ready(FACTORY)
 
     def next_location(self) -> Point2:
         # Building near the most recently created Factory
-        return self.game.units(FACTORY).first
+        return self.game.snapshot.of_type(FACTORY).first
@@ -0,0 +1,126 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sc2.unit import Unit
+from sc2.units import Units
+
+
+def assign_targets(army_xy: np.ndarray, army_radius: np.ndarray,
+                   army_ground_range: np.ndarray, army_air_range: np.ndarray,
+                   army_ground_dps: np.ndarray, army_air_dps: np.ndarray,
+                   enemy_xy: np.ndarray, enemy_radius: np.ndarray, enemy_flying: np.ndarray,
+                   enemy_hp: np.ndarray, enemy_dps: np.ndarray,
+                   committed_dps: Optional[np.ndarray] = None,
+                   bonus_distance: float = 0.0, kill_time: float = 1.5) -> np.ndarray:
+    """ Focus fire assignment for a whole army, returns the enemy index per army unit (-1 for none)
+
+    Enemies are taken lowest effective HP (health plus shields) first, with
+    the more dangerous one winning a tie. Each enemy gets just enough damage
+    to die within kill_time, preferring units already in weapon range, so
+    shots are not wasted on overkill. Units left over attack the highest
+    ranked enemy they can reach.
+    """
+    army_count, enemy_count = len(army_xy), len(enemy_xy)
+    targets = np.full(army_count, -1, dtype=np.int64)
+    if not army_count or not enemy_count:
+        return targets
+
+    # Edge to edge distance between every enemy and unit pair in one go (enemy rows, army columns)
+    gap = np.subtract.outer(enemy_xy[:, 0], army_xy[:, 0])
+    dy = np.subtract.outer(enemy_xy[:, 1], army_xy[:, 1])
+    gap *= gap
+    dy *= dy
+    gap += dy
+    np.sqrt(gap, out=gap)
+    gap -= np.add.outer(enemy_radius, army_radius)
+
+    # Weapon range and damage against each enemy, depending on whether it flies
+    flying = enemy_flying[:, None]
+    weapon_range = np.where(flying, army_air_range[None, :], army_ground_range[None, :])
+    dps = np.where(flying, army_air_dps[None, :], army_ground_dps[None, :])
+    travel = gap - weapon_range
+    in_reach = (weapon_range > 0) & (travel <= bonus_distance)
+
+    order = np.lexsort((-enemy_dps, enemy_hp))
+
+    needed = enemy_hp / kill_time
+    if committed_dps is not None:
+        needed = needed - committed_dps
+
+    free = np.ones(army_count, dtype=bool)
+    free_count = army_count
+    for enemy in order:
+        if not free_count:
+            break
+        if needed[enemy] <= 0:
+            continue
+        candidates = np.flatnonzero(free & in_reach[enemy])
+        if not len(candidates):
+            continue
+        # Units already in range first, then those with the least distance to close
+        candidates = candidates[np.argsort(travel[enemy, candidates], kind="stable")]
+        total = np.cumsum(dps[enemy, candidates])
+        taken = candidates[:int(np.searchsorted(total, needed[enemy])) + 1]
+        targets[taken] = enemy
+        free[taken] = False
+        free_count -= len(taken)
+
+    # Spare units join in on the highest ranked enemy they can reach
+    spare = np.flatnonzero(free & in_reach.any(axis=0))
+    if len(spare):
+        rank = np.empty(enemy_count, dtype=np.int64)
+        rank[order] = np.arange(enemy_count)
+        ranked = np.where(in_reach[:, spare], rank[:, None], enemy_count)
+        targets[spare] = order[ranked.argmin(axis=0)]
+
+    return targets
+
+
+class FocusFire:
+    """ Builds the arrays for assign_targets from Units, and groups the result into orders """
+
+    def __init__(self, kill_time: float = 1.5) -> None:
+        self.kill_time = kill_time
+
+    def plan(self, army: Units, enemies: Units, bonus_distance: float = 0.0,
+             busy: Optional[Units] = None) -> Tuple[List[Tuple[Unit, List[Unit]]], List[Unit]]:
+        """ Returns (target, attackers) pairs and the units left without a target
+
+        Units in busy already have orders, the damage they are putting on their
+        target counts towards it so idle units are not sent to overkill it.
+        """
+        if not army or not enemies:
+            return [], list(army)
+
+        enemy_rows = {enemy.tag: i for i, enemy in enumerate(enemies)}
+        committed = np.zeros(len(enemies))
+        for unit in busy or ():
+            row = enemy_rows.get(unit.order_target)
+            if row is not None:
+                committed[row] += unit.air_dps if enemies[row].is_flying else unit.ground_dps
+
+        targets = assign_targets(
+            army_xy=np.array([(u.position.x, u.position.y) for u in army]),
+            army_radius=np.array([u.radius for u in army]),
+            army_ground_range=np.array([u.ground_range for u in army]),
+            army_air_range=np.array([u.air_range for u in army]),
+            army_ground_dps=np.array([u.ground_dps for u in army]),
+            army_air_dps=np.array([u.air_dps for u in army]),
+            enemy_xy=np.array([(e.position.x, e.position.y) for e in enemies]),
+            enemy_radius=np.array([e.radius for e in enemies]),
+            enemy_flying=np.array([e.is_flying for e in enemies], dtype=bool),
+            enemy_hp=np.array([e.health + e.shield for e in enemies], dtype=float),
+            enemy_dps=np.array([max(e.ground_dps, e.air_dps) for e in enemies], dtype=float),
+            committed_dps=committed,
+            bonus_distance=bonus_distance,
+            kill_time=self.kill_time)
+
+        groups = {}  # type: Dict[int, List[Unit]]
+        unassigned = []
+        for unit, target in zip(army, targets):
+            if target < 0:
+                unassigned.append(unit)
+            else:
+                groups.setdefault(int(target), []).append(unit)
+
+        return [(enemies[target], units) for target, units in groups.items()], unassigned
@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import sc2
+from sc2.ids.unit_typeid import UnitTypeId
+
+logger = logging.getLogger(__name__)
+
+# Categories of events, any string will do
+BUILD = "build"
+REPAIR = "repair"
+ARMY = "army"
+
+
+class Telemetry:
+    """ Structured events from inside the step, kept in a ring buffer and written out by a background thread
+
+    Recording an event copies a few values into a preallocated slot, the
+    formatting and file writes happen on the writer thread. Until start is
+    called, and for an event below the level or outside the categories,
+    record returns before reading anything. When the writer falls capacity
+    events behind the oldest are dropped and counted.
+    """
+
+    def __init__(self, game: sc2.BotAI, capacity: int = 4096, level: int = logging.INFO,
+                 categories: Optional[Iterable[str]] = None) -> None:
+        self.game = game
+        self.level = level
+        self.categories = set(categories) if categories is not None else None
+        self.dropped = 0
+
+        self._slots = [None] * capacity  # type: List[Optional[tuple]]
+        self._written = 0  # events recorded since the start, the next slot is _written % capacity
+        self._read = 0  # events handed to the writer
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer = None  # type: Optional[threading.Thread]
+        self._file = None
+
+    def enabled(self, level: int, category: str) -> bool:
+        """ Whether an event would be written, check it first when working out its detail costs something """
+        return (self._writer is not None and level >= self.level
+                and (self.categories is None or category in self.categories))
+
+    def record(self, level: int, category: str, event: str, unit_type: Optional[UnitTypeId] = None,
+               detail=None, iteration: Optional[int] = None):
+        if not self.enabled(level, category):
+            return
+        game = self.game
+        entry = (game.state.game_loop if game.state else 0, iteration, game.supply_used, game.supply_cap,
+                 level, category, event, unit_type, detail)
+        with self._lock:
+            capacity = len(self._slots)
+            self._slots[self._written % capacity] = entry
+            self._written += 1
+            if self._written - self._read > capacity:
+                self.dropped += self._written - self._read - capacity
+                self._read = self._written - capacity
+
+    def _take(self) -> List[tuple]:
+        with self._lock:
+            capacity = len(self._slots)
+            entries = [self._slots[i % capacity] for i in range(self._read, self._written)]
+            self._read = self._written
+        return entries
+
+    def recent(self) -> List[Dict]:
+        """ The events still in the buffer, oldest first, without taking them from the writer """
+        with self._lock:
+            capacity = len(self._slots)
+            entries = [self._slots[i % capacity] for i in range(max(self._read, self._written - capacity),
+                                                                self._written)]
+        return [as_dict(entry) for entry in entries]
+
+    def start(self, path: str, interval: float = 0.5):
+        """ Appends the events to path as JSON lines from a background thread, every interval seconds """
+        self._file = open(path, "a")
+        self._stopping = False
+        self._wake.clear()
+        self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="telemetry", daemon=True)
+        self._writer.start()
+
+    def _write_loop(self, interval: float):
+        while not self._stopping:
+            self._wake.wait(interval)
+            self._drain()
+
+    def _drain(self):
+        entries = self._take()
+        if entries:
+            self._file.write("".join(json.dumps(as_dict(entry)) + "\n" for entry in entries))
+            self._file.flush()
+
+    def close(self):
+        """ Writes what is left and stops the writer """
+        if self._writer is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._writer.join()
+        self._writer = None
+        self._drain()
+        self._file.close()
+        if self.dropped:
+            logger.warning("Telemetry dropped {} events, the writer fell behind".format(self.dropped))
+
+
+def as_dict(entry: tuple) -> Dict:
+    loop, iteration, supply_used, supply_cap, level, category, event, unit_type, detail = entry
+    record = {
+        "loop": loop,
+        "iteration": iteration,
+        "supply": "{}/{}".format(supply_used, supply_cap),
+        "level": logging.getLevelName(level),
+        "category": category,
+        "event": event,
+    }
+    if unit_type is not None:
+        record["unit_type"] = unit_type.name
+    if detail is not None:
+        record["detail"] = detail
+    return record
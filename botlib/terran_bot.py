@@ -1,54 +1,225 @@
+import logging
+from typing import Optional, Sequence
+
 import sc2
-from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, SCV
+from sc2.constants import SCV
 from sc2.constants import SUPPLYDEPOT, SUPPLYDEPOTLOWERED, MORPH_SUPPLYDEPOT_LOWER, MORPH_SUPPLYDEPOT_RAISE
+from sc2.data import ActionResult
 from sc2.ids.ability_id import AbilityId
 from sc2.ids.unit_typeid import UnitTypeId
 
+from .action_buffer import ActionBuffer
 from .build_info import BuildInfo
+from .command_filter import CommandFilter
+from .compute_pool import ComputePool
 from .building_constructor import BuildingConstructor
+from .construction_tracker import ConstructionTracker
+from .enemy_memory import EnemyMemory, positions_of
+from .gc_tuning import GcTuner
+from .map_cache import MapCache
+from .mining_manager import MiningManager
+from .observation_recorder import ObservationRecorder
+from .pathing import PathingFields
+from .placement_planner import PlacementPlanner
+from .resource_index import ResourceIndex
+from .spatial_index import SpatialIndex
+from .step_profiler import StepProfiler
+from .step_scheduler import StepScheduler, ALWAYS, BUILD, ECONOMY
+from .telemetry import Telemetry
+from .unit_events import UnitEvents
+from .unit_snapshot import UnitSnapshot, COMMAND_CENTERS
+
+logger = logging.getLogger(__name__)
+
+DEPOT_MEMORY_LOOPS = 45  # depots stay up for two seconds after the last enemy nearby was seen
 
 
 class TerranBot(sc2.BotAI):
+    # Methods timed when profiling is enabled, subclasses add their own
+    profiled_routines = ["raise_lower_depots", "flush_actions"]
+
     def __init__(self):
         super().__init__()
+        self.snapshot = None
+        self.enemy_index = None
+        self.army_index = None
+        self.action_buffer = ActionBuffer(self)
+        self.command_filter = CommandFilter(self)
+        self.unit_events = UnitEvents()
         self.build_info = BuildInfo(self)
         self.building_constructor = BuildingConstructor(self)
+        self.construction_tracker = ConstructionTracker(self)
+        self.placement_planner = PlacementPlanner(self)
+        self.mining_manager = MiningManager(self)
+        self.resource_index = ResourceIndex(self)
+        self.compute = ComputePool(self)
+        self.pathing = PathingFields(self, compute=self.compute)
+        self.enemy_memory = EnemyMemory(self)
+        self.map_cache = MapCache(self)
+        self.scheduler = StepScheduler(self.unit_events)
+        self.telemetry = Telemetry(self)
+        self.profiler = None
+        self.profile_report = None
+        self.gc_tuner = None
+        self.recorder = None
+
+        self.build_info.subscribe(self.unit_events)
+        self.building_constructor.subscribe(self.unit_events)
+        self.mining_manager.subscribe(self.unit_events)
+        self.resource_index.subscribe(self.unit_events)
+
+        # Bookkeeping the other services read comes first and is never deferred
+        self.schedule_service("placement_planner", self.placement_planner, ALWAYS)
+        self.schedule_service("construction_tracker", self.construction_tracker, ALWAYS)
+        self.schedule("raise_lower_depots", ALWAYS)
+        self.schedule_service("building_constructor", self.building_constructor, BUILD)
+        self.schedule_service("mining_manager", self.mining_manager, ECONOMY)
+
+    def _prepare_first_step(self):
+        if self.townhalls:
+            self._game_info.player_start_location = self.townhalls.first.position
+        # What the library works out from the map every game, read back when an earlier game saved it
+        self._game_info.map_ramps, self._game_info.vision_blockers = self.map_cache.ramps()
+        self._cache_expansion_locations = self.map_cache.expansion_locations()
+
+    def on_start(self):
+        self.resource_index.on_start()
+        self.placement_planner.on_start()
+        if self.gc_tuner:
+            self.gc_tuner.freeze()
+
+    def _prepare_step(self, *args, **kwargs):
+        super()._prepare_step(*args, **kwargs)
+        # Index our units once, so every service can share the same lookups
+        self.snapshot = UnitSnapshot(self)
+        self.resource_index.update()
+        # Background work finished since last step is handed to whoever asked for it
+        self.compute.poll()
+        # Subscribers see what changed since last step before any service runs
+        self.unit_events.update(self.units, self.state.dead_units)
+        self.enemy_memory.update(self.state.dead_units)
+        self.enemy_index = SpatialIndex(self.known_enemy_units.not_structure.visible)
+        self.army_index = SpatialIndex(self.units.not_structure.exclude_type({SCV, UnitTypeId.MULE}))
 
     async def on_step(self, iteration: int):
-        await self.raise_lower_depots()
+        if self.recorder:
+            self.recorder.record(self.state)
+
+        await self.scheduler.run(iteration)
+
+        # Submit everything queued this step in a single request
+        await self.flush_actions()
+
+    def schedule(self, routine: str, priority: int, every: Optional[int] = 1, on: Sequence[str] = ()):
+        """ Runs the coroutine method of that name through the scheduler, looked up on every call """
+        self.scheduler.add(routine, lambda iteration: getattr(self, routine)(), priority, every, on)
+
+    def schedule_service(self, name: str, service, priority: int, every: Optional[int] = 1, on: Sequence[str] = ()):
+        """ Runs the service's on_step through the scheduler """
+        self.scheduler.add(name, lambda iteration: service.on_step(iteration), priority, every, on)
 
-        await self.building_constructor.on_step(iteration)
+    def on_end(self, game_result):
+        logger.info("Step scheduler: {}".format(self.scheduler.report()))
+        logger.info("Command filter: {}".format(self.command_filter.report()))
+        if self.compute.submitted:
+            logger.info("Compute pool: {}".format(self.compute.report()))
+        self.compute.close()
+        if self.profiler and self.profile_report:
+            self.profiler.write_report(self.profile_report)
+        if self.recorder:
+            self.recorder.close()
+        self.telemetry.close()
+        if self.gc_tuner:
+            logger.info("Garbage collection: {}".format(self.gc_tuner.report()))
+            self.gc_tuner.stop()
+
+    def enable_profiling(self, budget: float = 0.0446, report_path: str = "step_profile", allocations: bool = False):
+        """ Times each step and routine, reporting to report_path.json/.csv when the game ends
+
+        With allocations set, the memory each one allocates is reported too.
+        """
+        self.profiler = StepProfiler(self, budget, allocations=allocations)
+        self.profile_report = report_path
+
+        self.profiler.instrument_step(self)
+        for routine in self.profiled_routines:
+            self.profiler.instrument(self, routine)
+        self.profiler.instrument(self.placement_planner, "on_step", "placement_planner")
+        self.profiler.instrument(self.construction_tracker, "on_step", "construction_tracker")
+        self.profiler.instrument(self.building_constructor, "on_step", "building_constructor")
+        self.profiler.instrument(self.mining_manager, "on_step", "mining_manager")
+        for unit_type, builder in self.building_constructor.builders.items():
+            self.profiler.instrument(builder, "on_step", "builder.{}".format(unit_type.name))
+
+    def enable_recording(self, path: str = "recording", chunk_steps: int = 1000):
+        """ Saves every step's observation under path, to replay with botlib.headless.run_replay """
+        self.recorder = ObservationRecorder(self, path, chunk_steps)
+
+    def enable_telemetry(self, path: str = "telemetry.jsonl", level: int = logging.INFO):
+        """ Appends the bot's events at level and above to path as JSON lines, written off the game loop """
+        self.telemetry.level = level
+        self.telemetry.start(path)
+
+    def enable_gc_tuning(self, freeze: bool = True, idle: bool = True):
+        """ Freezes what is alive at the start of the game and collects garbage after the steps, see GcTuner """
+        self.gc_tuner = GcTuner(self, freeze, idle)
+        self.gc_tuner.start()
+
+    def enable_compute_pool(self, workers: int = 2, processes: bool = False, max_pending: int = 8):
+        """ Moves heavy work such as pathing fields off the game loop, see ComputePool """
+        self.compute.workers = workers
+        self.compute.processes = processes
+        self.compute.max_pending = max_pending
+
+    def collect_garbage(self):
+        """ Spends what is left of the step's budget on garbage collection, call once the step is done """
+        if self.gc_tuner:
+            self.gc_tuner.collect(self.scheduler.remaining())
+
+    async def do(self, action):
+        """ Queues the action instead of sending it, on_step flushes the queue once the step is done """
+        if not self.can_afford(action):
+            return ActionResult.Error
+        # Repeating what a unit is already doing only costs requests and APM
+        if not self.command_filter.admit(action):
+            return None
+
+        self.action_buffer.queue(action)
+
+    async def flush_actions(self):
+        self.command_filter.forget()
+        return await self.action_buffer.flush()
 
     def set_build_target(self, unit_type: UnitTypeId, target: int):
         self.building_constructor.set_build_target(unit_type, target)
 
     async def train_workers(self):
         workers_wanted = self.build_info.workers_wanted
-        for cc in self.units.of_type([COMMANDCENTER, ORBITALCOMMAND]).ready.idle:
+        for cc in self.snapshot.idle(COMMAND_CENTERS):
             if workers_wanted > 0 and self.can_afford(SCV):
                 workers_wanted -= 1
                 await self.do(cc.train(SCV))
 
     async def call_down_mules(self):
         # manage orbital energy and drop mules
-        for oc in self.units(UnitTypeId.ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
-            mfs = self.state.mineral_field.closer_than(10, oc)
-            if mfs:
-                mf = max(mfs, key=lambda x: x.mineral_contents)
+        for oc in self.snapshot.of_type(UnitTypeId.ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
+            mf = self.resource_index.richest_patch(oc)
+            if mf:
                 await self.do(oc(AbilityId.CALLDOWNMULE_CALLDOWNMULE, mf))
 
     async def raise_lower_depots(self):
-        # Raise depos when enemies are nearby
-        for depo in self.units(SUPPLYDEPOT).ready:
-            for unit in self.known_enemy_units.not_structure.visible:
-                if unit.position.to2.distance_to(depo.position.to2) < 15:
-                    break
-            else:
-                await self.do(depo(MORPH_SUPPLYDEPOT_LOWER))
-
-        # Lower depos when no enemies are nearby
-        for depo in self.units(SUPPLYDEPOTLOWERED).ready:
-            for unit in self.known_enemy_units.not_structure.visible:
-                if unit.position.to2.distance_to(depo.position.to2) < 10:
+        # Lower depots when no enemies were seen nearby lately
+        depots = self.snapshot.ready(SUPPLYDEPOT)
+        if depots:
+            threatened = self.enemy_memory.threatened(positions_of(depots), 15, DEPOT_MEMORY_LOOPS)
+            for depo, threat in zip(depots, threatened):
+                if not threat:
+                    await self.do(depo(MORPH_SUPPLYDEPOT_LOWER))
+
+        # Raise depots when enemies are nearby
+        depots = self.snapshot.ready(SUPPLYDEPOTLOWERED)
+        if depots:
+            threatened = self.enemy_memory.threatened(positions_of(depots), 10, DEPOT_MEMORY_LOOPS)
+            for depo, threat in zip(depots, threatened):
+                if threat:
                     await self.do(depo(MORPH_SUPPLYDEPOT_RAISE))
-                    break
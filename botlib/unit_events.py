@@ -0,0 +1,74 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+
+# Handlers of each event are called with:
+CREATED = "created"  # unit, for every new unit whether finished or not
+CONSTRUCTION_STARTED = "construction_started"  # unit, for new units which are not finished yet
+CONSTRUCTION_COMPLETED = "construction_completed"  # unit, once a unit seen unfinished is finished
+DESTROYED = "destroyed"  # tag, unit type and whether it was finished
+MORPHED = "morphed"  # unit and its previous type
+HEALTH_CHANGED = "health_changed"  # unit and its health last step, when it lost or gained health
+
+EVENTS = (CREATED, CONSTRUCTION_STARTED, CONSTRUCTION_COMPLETED, DESTROYED, MORPHED, HEALTH_CHANGED)
+
+
+class UnitEvents:
+    """ Raises lifecycle events for our units from the difference with last step's units
+
+    The type, state and health of every unit are kept by tag, so a step is a
+    single pass over our units. Units which drop out of the observation without
+    dying, such as SCVs inside a refinery or units loaded into a transport,
+    are kept until they come back. Structures never hide, so one which is
+    gone has been destroyed or cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._handlers = {event: [] for event in EVENTS}  # type: Dict[str, List[Callable]]
+        # tag -> type, finished, structure, health
+        self._known = {}  # type: Dict[int, Tuple[UnitTypeId, bool, bool, float]]
+
+    def subscribe(self, event: str, handler: Callable) -> None:
+        self._handlers[event].append(handler)
+
+    def emit(self, event: str, *args) -> None:
+        for handler in self._handlers[event]:
+            handler(*args)
+
+    def update(self, units: Iterable[Unit], dead_tags: Iterable[int] = ()) -> None:
+        """ Raises the events between the last update and these units, dead_tags are the step's deaths """
+        previous = self._known
+        known = {}
+        carried_over = 0
+        for unit in units:
+            tag, unit_type, ready, health = unit.tag, unit.type_id, unit.is_ready, unit.health
+            known[tag] = (unit_type, ready, unit.is_structure, health)
+            last = previous.get(tag)
+            if last is None:
+                self.emit(CREATED, unit)
+                if not ready:
+                    self.emit(CONSTRUCTION_STARTED, unit)
+                continue
+            carried_over += 1
+            if last[0] != unit_type:
+                self.emit(MORPHED, unit, last[0])
+            if ready and not last[1]:
+                self.emit(CONSTRUCTION_COMPLETED, unit)
+            if health != last[3]:
+                self.emit(HEALTH_CHANGED, unit, last[3])
+
+        # Only look for missing units when some of last step's are not back
+        if carried_over < len(previous):
+            dead = set(dead_tags)
+            for tag, last in previous.items():
+                if tag in known:
+                    continue
+                if tag in dead or last[2]:
+                    self.emit(DESTROYED, tag, last[0], last[1])
+                else:
+                    known[tag] = last
+        self._known = known
+
+    def __len__(self) -> int:
+        return len(self._known)
@@ -0,0 +1,98 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import sc2
+from sc2.constants import COMMANDCENTER, ORBITALCOMMAND, \
+    SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Type groups which are treated as a single structure by the build logic
+COMMAND_CENTERS = (COMMANDCENTER, ORBITALCOMMAND)
+SUPPLY_DEPOTS = (SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP)
+
+UnitTypes = Union[UnitTypeId, Iterable[UnitTypeId]]
+
+
+class UnitSnapshot:
+    """ Indexed view of our units, built once at the start of each step """
+
+    def __init__(self, game: sc2.BotAI) -> None:
+        self.game = game
+        self.units = game.units
+
+        self._by_tag = {}  # type: Dict[int, Unit]
+        self._all = defaultdict(list)  # type: Dict[UnitTypeId, List[Unit]]
+        self._ready = defaultdict(list)  # type: Dict[UnitTypeId, List[Unit]]
+        self._idle = defaultdict(list)  # type: Dict[UnitTypeId, List[Unit]]
+        self._not_ready = defaultdict(list)  # type: Dict[UnitTypeId, List[Unit]]
+        self._orders = Counter()  # type: Counter
+
+        # Single pass over our units, everything else is a lookup
+        for unit in self.units:
+            self._by_tag[unit.tag] = unit
+            type_id = unit.type_id
+            self._all[type_id].append(unit)
+            if unit.is_ready:
+                self._ready[type_id].append(unit)
+                if unit.is_idle:
+                    self._idle[type_id].append(unit)
+            else:
+                self._not_ready[type_id].append(unit)
+            for order in unit.orders:
+                self._orders[order.ability.id] += 1
+
+        self._selections = {}  # type: Dict[Tuple, Units]
+        self._pending = {}  # type: Dict[UnitTypeId, int]
+
+    def by_tag(self, tag: int) -> Optional[Unit]:
+        return self._by_tag.get(tag)
+
+    def of_type(self, unit_types: UnitTypes) -> Units:
+        """ All units of the type (or type group) """
+        return self._select("all", self._all, unit_types)
+
+    def ready(self, unit_types: UnitTypes) -> Units:
+        """ Completed units of the type (or type group) """
+        return self._select("ready", self._ready, unit_types)
+
+    def idle(self, unit_types: UnitTypes) -> Units:
+        """ Completed units of the type (or type group) without any orders """
+        return self._select("idle", self._idle, unit_types)
+
+    def not_ready(self, unit_types: UnitTypes) -> Units:
+        """ Units of the type (or type group) still under construction """
+        return self._select("not_ready", self._not_ready, unit_types)
+
+    @property
+    def under_construction(self) -> Units:
+        """ All of our units still under construction """
+        return self._select("not_ready", self._not_ready, tuple(self._not_ready))
+
+    def amount(self, unit_types: UnitTypes) -> int:
+        return sum(len(self._all[t]) for t in self._types(unit_types))
+
+    def pending(self, unit_type: UnitTypeId) -> int:
+        """ Memoized equivalent of BotAI.already_pending """
+        if unit_type not in self._pending:
+            ability = self.game._game_data.units[unit_type.value].creation_ability
+            self._pending[unit_type] = len(self._not_ready[unit_type]) + self._orders[ability.id]
+        return self._pending[unit_type]
+
+    def _select(self, name: str, index: Dict[UnitTypeId, List[Unit]], unit_types: UnitTypes) -> Units:
+        types = self._types(unit_types)
+        key = (name, types)
+        if key not in self._selections:
+            if len(types) == 1:
+                selected = index[types[0]]
+            else:
+                selected = [u for t in types for u in index[t]]
+            self._selections[key] = self.units.subgroup(selected)
+        return self._selections[key]
+
+    @staticmethod
+    def _types(unit_types: UnitTypes) -> Tuple[UnitTypeId, ...]:
+        if isinstance(unit_types, UnitTypeId):
+            return (unit_types,)
+        return tuple(unit_types)
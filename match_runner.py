@@ -0,0 +1,238 @@
+""" Plays AlphaBot over a matrix of maps, opponent races, difficulties and seeds, several games at a time
+
+Every finished game is appended to RESULTS as a JSON line, so a run which was
+interrupted carries on where it stopped when started again with the same
+RESULTS. The aggregate report is printed and written to RESULTS.summary.json.
+
+    python3 match_runner.py --maps Simple64 --races Protoss Zerg --difficulties Easy Medium \\
+        --seeds 1 2 3 --jobs 4 --results matches.jsonl
+
+With --launcher headless the games are played against botlib.headless instead
+of StarCraft II, to try out the runner anywhere. Another launcher can be
+given as module:function, called with the match and the options like the
+ones below and returning the game's result fields.
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List
+
+from botlib.step_profiler import Histogram
+
+LOOPS_PER_SECOND = 22.4
+
+# Enemy army size standing in for each difficulty when playing headless
+HEADLESS_ENEMIES = {
+    "VeryEasy": 8, "Easy": 16, "Medium": 24, "MediumHard": 32, "Hard": 40, "Harder": 50, "VeryHard": 60,
+    "CheatVision": 70, "CheatMoney": 80, "CheatInsane": 90,
+}
+
+WINNERS = {"Victory": "bot", "Defeat": "computer"}
+
+
+class Match:
+    def __init__(self, map_name: str, race: str, difficulty: str, seed: int) -> None:
+        self.map_name = map_name
+        self.race = race
+        self.difficulty = difficulty
+        self.seed = seed
+
+    @property
+    def key(self) -> str:
+        return "{}/{}/{}/{}".format(self.map_name, self.race, self.difficulty, self.seed)
+
+    def as_dict(self) -> Dict:
+        return OrderedDict([("key", self.key), ("map", self.map_name), ("race", self.race),
+                            ("difficulty", self.difficulty), ("seed", self.seed)])
+
+
+def step_stats(latency: Histogram) -> Dict:
+    return {
+        "steps": latency.count,
+        "mean_ms": latency.mean * 1000,
+        "p95_ms": latency.percentile(95) * 1000,
+        "p99_ms": latency.percentile(99) * 1000,
+        "max_ms": latency.largest * 1000,
+    }
+
+
+def launch_sc2(match: Match, options: Dict) -> Dict:
+    """ Plays the match in StarCraft II, timing the bot's steps with the profiler """
+    from sc2 import run_game, maps, Race, Difficulty
+    from sc2.player import Bot, Computer
+    from alpha_bot import AlphaBot
+    from botlib.step_profiler import StepProfiler
+
+    random.seed(match.seed)
+    bot = AlphaBot(options["build_order"])
+    bot.profiler = StepProfiler(bot)
+    bot.profiler.instrument_step(bot)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run_game(maps.get(match.map_name), [
+            Bot(Race.Terran, bot),
+            Computer(Race[match.race], Difficulty[match.difficulty])
+        ], realtime=False, game_time_limit=options["game_time_limit"], random_seed=match.seed)
+
+    outcome = {"result": result.name if result else None,
+               "duration": bot.state.game_loop / LOOPS_PER_SECOND if bot.state else 0.0}
+    outcome.update(step_stats(bot.profiler.step.wall_time))
+    return outcome
+
+
+def launch_headless(match: Match, options: Dict) -> Dict:
+    """ Plays the bot against the headless harness, the difficulty sets the enemy army's size
+
+    The synthetic map and its Protoss army are the same whatever the match's
+    map and race, which only vary the seed. The game is won by wiping out the
+    enemy, lost with our last structure, and a tie once max_steps are played.
+    """
+    from alpha_bot import AlphaBot
+    from botlib.headless import Scenario, run_headless
+
+    seed = zlib.crc32(match.key.encode())
+    scenario = Scenario(units=options["units"], enemies=HEADLESS_ENEMIES[match.difficulty],
+                        steps=options["max_steps"], seed=seed, reinforce=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = run_headless(AlphaBot(options["build_order"]), scenario)
+
+    outcome = {"result": report.result.name if report.result else None,
+               "duration": report.server.world.loop / LOOPS_PER_SECOND}
+    outcome.update(step_stats(report.server.step_latency))
+    return outcome
+
+
+LAUNCHERS = {"sc2": launch_sc2, "headless": launch_headless}  # type: Dict[str, Callable[[Match, Dict], Dict]]
+
+
+def resolve_launcher(name: str) -> Callable[[Match, Dict], Dict]:
+    if name in LAUNCHERS:
+        return LAUNCHERS[name]
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def play(job) -> Dict:
+    """ Runs in a worker process, a failing game is reported rather than stopping the run """
+    launcher, match, options = job
+    # Only problems, the bots log every step's decisions
+    logging.getLogger().setLevel(logging.WARNING)
+    record = match.as_dict()
+    start = time.perf_counter()
+    try:
+        record.update(resolve_launcher(launcher)(match, options))
+        record["winner"] = WINNERS.get(record.get("result"))
+    except Exception as error:
+        record["error"] = "{}: {}".format(type(error).__name__, error)
+    record["wall_time"] = time.perf_counter() - start
+    return record
+
+
+def load_results(path: str) -> List[Dict]:
+    """ Games recorded by earlier runs, a line cut short by an interruption is ignored """
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path) as results:
+        for line in results:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def aggregate(records: Iterable[Dict]) -> Dict:
+    """ Win, loss and tie counts with mean game length and step times, per map, race and difficulty and overall """
+    groups = OrderedDict()  # type: Dict[str, List[Dict]]
+    for record in records:
+        groups.setdefault("{map}/{race}/{difficulty}".format(**record), []).append(record)
+        groups.setdefault("all", []).append(record)
+
+    report = OrderedDict()
+    for name, games in groups.items():
+        played = [game for game in games if "error" not in game]
+        steps = sum(game["steps"] for game in played)
+        report[name] = OrderedDict([
+            ("games", len(games)),
+            ("wins", sum(1 for game in played if game["winner"] == "bot")),
+            ("losses", sum(1 for game in played if game["winner"] == "computer")),
+            ("ties", sum(1 for game in played if game["winner"] is None)),
+            ("errors", len(games) - len(played)),
+            ("win_rate", sum(1 for game in played if game["winner"] == "bot") / len(played) if played else 0.0),
+            ("mean_duration", sum(game["duration"] for game in played) / len(played) if played else 0.0),
+            ("mean_step_ms", sum(game["mean_ms"] * game["steps"] for game in played) / steps if steps else 0.0),
+            ("worst_p99_ms", max((game["p99_ms"] for game in played), default=0.0)),
+            ("max_step_ms", max((game["max_ms"] for game in played), default=0.0)),
+        ])
+    if "all" in report:
+        report.move_to_end("all")
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print("{:<36} {:>5} {:>5} {:>5} {:>5} {:>6} {:>6} {:>9} {:>8} {:>9}".format(
+        "matches", "games", "wins", "loss", "ties", "errors", "win %", "mean min", "step ms", "p99 ms"))
+    for name, row in report.items():
+        print("{:<36} {:>5} {:>5} {:>5} {:>5} {:>6} {:>6.1f} {:>9.1f} {:>8.2f} {:>9.2f}".format(
+            name, row["games"], row["wins"], row["losses"], row["ties"], row["errors"], row["win_rate"] * 100,
+            row["mean_duration"] / 60, row["mean_step_ms"], row["worst_p99_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", nargs="+", default=["Simple64"])
+    parser.add_argument("--races", nargs="+", default=["Protoss"])
+    parser.add_argument("--difficulties", nargs="+", default=["Easy"], choices=list(HEADLESS_ENEMIES))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="games played at the same time")
+    parser.add_argument("--results", metavar="RESULTS", default="matches.jsonl",
+                        help="one JSON line per game, games already in it are not played again")
+    parser.add_argument("--launcher", default="sc2", help="sc2, headless or module:function")
+    parser.add_argument("--build-order", metavar="FILE", help="defaults to build_orders/alpha_bot.txt")
+    parser.add_argument("--game-time-limit", type=float, default=30 * 60, help="game seconds before a tie")
+    parser.add_argument("--units", type=int, default=30, help="headless only, our units at the start")
+    parser.add_argument("--max-steps", type=int, default=3000, help="headless only, steps before a tie")
+    args = parser.parse_args()
+
+    from alpha_bot import BUILD_ORDER
+    options = {"build_order": args.build_order or BUILD_ORDER, "game_time_limit": args.game_time_limit,
+               "units": args.units, "max_steps": args.max_steps}
+    matches = [Match(map_name, race, difficulty, seed) for map_name in args.maps for race in args.races
+               for difficulty in args.difficulties for seed in args.seeds]
+    resolve_launcher(args.launcher)  # fail before starting any workers
+
+    # Games which ended in an error are played again
+    played = {record["key"]: record for record in load_results(args.results) if "error" not in record}
+    remaining = [match for match in matches if match.key not in played]
+    print("{} games, {} already played, {} to go on {} processes".format(
+        len(matches), len(matches) - len(remaining), len(remaining), args.jobs))
+
+    jobs = [(args.launcher, match, options) for match in remaining]
+    # A fresh process per game, the library keeps global state between games
+    with multiprocessing.Pool(args.jobs, maxtasksperchild=1) as pool, open(args.results, "a") as results:
+        for count, record in enumerate(pool.imap_unordered(play, jobs), start=1):
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            played[record["key"]] = record
+            outcome = record.get("error") or "{} in {:.1f} min, {:.2f}ms a step".format(
+                record["result"], record["duration"] / 60, record["mean_ms"])
+            print("[{}/{}] {:<36} {}".format(count, len(jobs), record["key"], outcome))
+
+    report = aggregate(played[match.key] for match in matches if match.key in played)
+    with open(args.results + ".summary.json", "w") as summary:
+        json.dump(report, summary, indent=2)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
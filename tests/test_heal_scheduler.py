@@ -0,0 +1,124 @@
+import numpy as np
+from sc2.constants import MARINE, MEDIVAC
+from sc2.position import Point2
+
+from botlib.heal_scheduler import HealScheduler, nearest_pairs
+from botlib.unit_events import UnitEvents
+
+
+class StandInUnit:
+    """ Just what UnitEvents and HealScheduler read from a unit """
+
+    def __init__(self, tag: int, type_id, x: float, y: float, health: float = 45, health_max: float = 45,
+                 energy: float = 50) -> None:
+        self.tag = tag
+        self.type_id = type_id
+        self.position = Point2((x, y))
+        self.health = health
+        self.health_max = health_max
+        self.energy = energy
+        self.is_idle = True
+        self.is_ready = True
+        self.is_structure = False
+
+
+class Game:
+    """ Feeds the synthetic units through UnitEvents, as TerranBot does at the start of a step """
+
+    def __init__(self, *units: StandInUnit) -> None:
+        self.units = {unit.tag: unit for unit in units}
+        self.events = UnitEvents()
+        self.scheduler = HealScheduler(None)
+        self.scheduler.subscribe(self.events)
+        self.lookups = 0
+
+    def lookup(self, tag: int):
+        self.lookups += 1
+        return self.units.get(tag)
+
+    def step(self, dead=()):
+        for tag in dead:
+            del self.units[tag]
+        self.events.update(list(self.units.values()), dead)
+        self.lookups = 0
+        orders = self.scheduler.reconcile(self.lookup)
+        for medivac, marine in orders:
+            medivac.is_idle = False
+        return [(medivac.tag, marine.tag) for medivac, marine in orders]
+
+
+def test_nearest_pairs_takes_the_shortest_distances_first():
+    healers = np.array([[0.0, 0.0], [10.0, 0.0]])
+    patients = np.array([[9.0, 0.0], [1.0, 0.0], [50.0, 0.0]])
+    assert sorted(nearest_pairs(healers, patients)) == [(0, 1), (1, 0)]
+
+
+def test_nearest_pairs_uses_each_unit_once():
+    healers = np.array([[0.0, 0.0], [0.5, 0.0]])
+    patients = np.array([[0.0, 1.0]])
+    assert nearest_pairs(healers, patients) == [(0, 0)]
+    assert nearest_pairs(healers, np.empty((0, 2))) == []
+    assert nearest_pairs(np.empty((0, 2)), patients) == []
+
+
+def test_injured_marine_gets_the_closest_medivac():
+    game = Game(StandInUnit(1, MARINE, 0, 0), StandInUnit(2, MARINE, 20, 0),
+                StandInUnit(10, MEDIVAC, 18, 0), StandInUnit(11, MEDIVAC, 40, 0))
+    assert game.step() == []
+
+    game.units[2].health = 30
+    assert game.step() == [(10, 2)]
+    assert game.scheduler.assignments == {2: 10}
+
+
+def test_quiet_step_only_looks_at_the_pairs():
+    game = Game(*[StandInUnit(tag, MARINE, tag, 0) for tag in range(1, 51)], StandInUnit(100, MEDIVAC, 0, 5))
+    game.step()
+    game.units[7].health = 20
+    assert game.step() == [(100, 7)]
+
+    # Nothing changed, only the medivac and marine of the pair are looked up
+    assert game.step() == []
+    assert game.lookups == 2
+
+
+def test_healed_marine_frees_its_medivac():
+    game = Game(StandInUnit(1, MARINE, 0, 0, health=10), StandInUnit(2, MARINE, 30, 0),
+                StandInUnit(10, MEDIVAC, 1, 0))
+    assert game.step() == [(10, 1)]
+
+    game.units[1].health = 45
+    game.units[2].health = 40
+    game.units[10].is_idle = True
+    assert game.step() == [(10, 2)]
+    assert game.scheduler.assignments == {2: 10}
+
+
+def test_dead_or_tired_medivac_is_replaced():
+    game = Game(StandInUnit(1, MARINE, 0, 0, health=10), StandInUnit(10, MEDIVAC, 1, 0),
+                StandInUnit(11, MEDIVAC, 5, 0), StandInUnit(12, MEDIVAC, 9, 0))
+    assert game.step() == [(10, 1)]
+
+    game.units[11].is_idle = False  # busy elsewhere, not available
+    assert game.step(dead=[10]) == [(12, 1)]
+
+    game.units[12].energy = 2
+    game.units[11].is_idle = True
+    assert game.step() == [(11, 1)]
+
+
+def test_medivac_dropping_the_heal_is_released_after_its_order_shows():
+    game = Game(StandInUnit(1, MARINE, 0, 0, health=10), StandInUnit(10, MEDIVAC, 1, 0))
+    assert game.step() == [(10, 1)]
+
+    # Still idle on the next step means the heal order was dropped, so it is given again
+    game.units[10].is_idle = True
+    assert game.step() == []
+    assert game.step() == [(10, 1)]
+
+
+def test_dead_marine_releases_its_medivac():
+    game = Game(StandInUnit(1, MARINE, 0, 0, health=10), StandInUnit(10, MEDIVAC, 1, 0))
+    game.step()
+    game.step(dead=[1])
+    assert game.scheduler.assignments == {}
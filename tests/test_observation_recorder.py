@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.game_state import GameState
+
+from botlib.observation_recorder import UNIT_COLUMNS, COMMON_COLUMNS, ObservationReader, ObservationRecorder
+
+MINERAL_FIELD = 341
+MARINE = 48
+ZEALOT = 73
+
+
+def observation(game_loop: int) -> sc_pb.ResponseObservation:
+    """ A step with a few of our units, enemies and resources, some with orders, buffs and a blip """
+    response = sc_pb.ResponseObservation()
+    response.observation.game_loop = game_loop
+    common = response.observation.player_common
+    common.minerals, common.vespene, common.food_cap, common.food_used = 50 + game_loop, 8, 23, 14 + game_loop
+    raw = response.observation.raw_data
+    for tag, unit_type, alliance in ((1, MARINE, 1), (2, MARINE, 1), (3, ZEALOT, 4), (4, MINERAL_FIELD, 3),
+                                     (5, ZEALOT, 4)):
+        unit = raw.units.add(tag=tag + 100 * game_loop, unit_type=unit_type, alliance=alliance, health=45 - tag,
+                             health_max=45, facing=0.25 * tag, display_type=1, mineral_contents=1800 * (tag == 4))
+        unit.pos.x, unit.pos.y, unit.pos.z = 10.5 + tag, 20.25 - tag, 11.0
+        unit.is_blip = tag == 5
+    raw.units[0].orders.add(ability_id=23, target_unit_tag=raw.units[2].tag, progress=0.5)
+    order = raw.units[1].orders.add(ability_id=16)
+    order.target_world_space_pos.x, order.target_world_space_pos.y = 30.5, 40.5
+    raw.units[1].orders.add(ability_id=18)
+    raw.units[1].buff_ids.extend([24, 27])
+    raw.event.dead_units.extend([7 + game_loop])
+    raw.player.upgrade_ids.extend([2] if game_loop else [])
+    return response
+
+
+def record(path: str, steps: int, chunk_steps: int):
+    game = SimpleNamespace(
+        _game_data=SimpleNamespace(abilities={}, units={}, upgrades={}),
+        game_info=SimpleNamespace(_proto=sc_pb.ResponseGameInfo()), player_id=1)
+    recorder = ObservationRecorder(game, path, chunk_steps)
+    for step in range(steps):
+        recorder.record(GameState(observation(step)))
+    recorder.close()
+
+
+def fields(unit) -> tuple:
+    """ Everything the recording keeps of a unit, read the way the library reads its proto """
+    orders = tuple((order.ability_id, order.target_unit_tag, order.progress,
+                    (order.target_world_space_pos.x, order.target_world_space_pos.y)
+                    if order.HasField("target_world_space_pos") else None) for order in unit.orders)
+    return (tuple(getattr(unit, name) for name, _ in UNIT_COLUMNS), (unit.pos.x, unit.pos.y, unit.pos.z), orders,
+            tuple(unit.buff_ids))
+
+
+def tags(units) -> list:
+    return [unit.tag for unit in units]
+
+
+def test_states_match_the_protos_they_stand_in_for(tmp_path):
+    record(str(tmp_path), steps=5, chunk_steps=2)
+    reader = ObservationReader(str(tmp_path))
+    pairs = list(zip((GameState(response) for response in reader), reader.states()))
+    assert len(pairs) == 5
+
+    for expected, state in pairs:
+        assert state.game_loop == expected.game_loop
+        for name, _ in COMMON_COLUMNS:
+            assert getattr(state.common, name) == getattr(expected.common, name)
+        assert state.dead_units == expected.dead_units
+        assert state.upgrades == expected.upgrades
+        for group in ("units", "own_units", "enemy_units", "mineral_field", "resources", "destructables"):
+            assert tags(getattr(state, group)) == tags(getattr(expected, group)), group
+        assert [fields(unit._proto) for unit in state.units] == [fields(unit._proto) for unit in expected.units]
+        assert {blip.position for blip in state.blips} == {blip.position for blip in expected.blips}